@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Fan-out benchmark of the requests and asyncio API engines
+
+Runs three fleet-wide operations against a MockPrismCentral over HTTP:
+
+    list   listing --vms VMs, --length VMs per page
+    get    GETting the specs of --gets VMs
+    tasks  waiting for --tasks tasks taking --task-duration seconds each
+
+once per engine and --concurrency value:
+
+    python hacking/benchmarks/bench_async.py --vms 10000 --concurrency 10 50 200
+
+The requests engine uses iter_entities for list and a thread per request
+in flight for get and tasks (task_poll per task). The asyncio engine uses
+list_all_entities, get_vms, and task_poll per task (tasks) as well as
+wait_for_tasks polling through tasks list queries (tasks-batched). Every run
+gets a fresh client in its own process so that the mock server doesn't share
+the interpreter with it. Reports wall seconds, requests and retries per run.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import MockPrismCentral, ensure_collection_importable, http_client
+
+SCENARIOS = ("list", "get", "tasks", "tasks-batched")
+
+
+def requests_run(client, scenario, items, length, concurrency):
+    """Run a scenario on the requests engine"""
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import (
+        iter_entities,
+        task_poll
+    )
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_vms import get_vm
+
+    if scenario == "list":
+        return len(list(iter_entities("vms", {"length": length}, client)))
+    operation = get_vm if scenario == "get" else task_poll
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return len(list(executor.map(lambda item: operation(item, client), items)))
+
+
+async def asyncio_run(client, scenario, items, length):
+    """Run a scenario on the asyncio engine"""
+    import asyncio
+
+    if scenario == "list":
+        return len(await client.list_all_entities("vms", {"length": length}))
+    if scenario == "get":
+        return len(await client.get_vms(items))
+    if scenario == "tasks":
+        return len(await asyncio.gather(*[client.task_poll(task_uuid) for task_uuid in items]))
+    return len([task async for task in client.wait_for_tasks(items)])
+
+
+def worker(job):
+    """Run one scenario in a fresh process and return its report"""
+    url, engine, scenario, items, length, concurrency = job
+    ensure_collection_importable()
+    client = http_client(url, retries=10, retry_backoff=0.05, pool_maxsize=concurrency,
+                         task_poll_interval=0.5, task_poll_max_interval=2)
+    start = time.time()
+    if engine == "asyncio":
+        from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_async import (
+            import_aiohttp,
+            run_async
+        )
+        import_aiohttp()
+        start = time.time()
+        count = run_async(client, lambda async_client: asyncio_run(async_client, scenario, items, length))
+    else:
+        count = requests_run(client, scenario, items, length, concurrency)
+    return {"seconds": time.time() - start, "count": count, "retries": client.retry_stats["retries"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vms", type=int, default=5000)
+    parser.add_argument("--length", type=int, default=100, help="VMs per list page")
+    parser.add_argument("--gets", type=int, default=1000)
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--task-duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200],
+                        help="pool_maxsize, the threads or coroutines with a request in flight")
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the reports to this file")
+    args = parser.parse_args()
+
+    ensure_collection_importable()
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_async import import_aiohttp
+    engines = ["requests", "asyncio"] if import_aiohttp() else ["requests"]
+    if len(engines) == 1:
+        print("aiohttp is not installed, only the requests engine is run")
+
+    mock = MockPrismCentral(vms=args.vms, images=0, task_duration=args.task_duration, latency=args.latency,
+                            error_rate=args.error_rate, error_codes=(503,), seed=args.seed)
+    url = mock.start()
+    vm_uuids = sorted(mock.entities["vms"])[:args.gets]
+    reports = []
+    print("{0:<14} {1:<9} {2:>11} {3:>9} {4:>9} {5:>8} {6:>8}".format(
+        "scenario", "engine", "concurrency", "items", "seconds", "requests", "retries"))
+    try:
+        for scenario in args.scenario:
+            for concurrency in args.concurrency:
+                for engine in engines:
+                    if scenario == "tasks-batched" and engine != "asyncio":
+                        continue
+                    items = vm_uuids
+                    if scenario.startswith("tasks"):
+                        with mock.lock:
+                            items = [mock.create_task("kBench", "vm", vm_uuid)
+                                     for vm_uuid in vm_uuids[:1] * args.tasks]
+                    calls = sum(mock.calls.values())
+                    # A fresh process per run, so no engine reuses connections or imports of another
+                    with multiprocessing.get_context("spawn").Pool(1) as pool:
+                        report = pool.apply(worker, ((url, engine, scenario, items, args.length, concurrency),))
+                    report.update(scenario=scenario, engine=engine, concurrency=concurrency,
+                                  requests=sum(mock.calls.values()) - calls)
+                    reports.append(report)
+                    print("{scenario:<14} {engine:<9} {concurrency:>11} {count:>9} {seconds:>9.2f} "
+                          "{requests:>8} {retries:>8}".format(**report))
+    finally:
+        mock.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
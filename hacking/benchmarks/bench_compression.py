@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Response compression benchmark of a large VM listing
+
+Lists --vms VMs, --length VMs per page, from a MockPrismCentral over HTTP
+with and without compression, once per --bandwidth value and engine:
+
+    python hacking/benchmarks/bench_compression.py --vms 10000 --bandwidth 1 10 100
+
+The mock limits the response bytes per second to the bandwidth given in
+Mbit/s, 0 means unlimited, and gzips responses of clients accepting it.
+Every run gets a fresh client in its own process. Reports the wall seconds,
+the response bytes received and after decompression, and the compression
+ratio, all taken from api_stats.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+
+from common import MockPrismCentral, ensure_collection_importable, http_client
+
+
+def worker(job):
+    """List all VMs in a fresh process and return the report"""
+    url, engine, compression, length, pool_maxsize = job
+    ensure_collection_importable()
+    client = http_client(url, api_stats=True, compression=compression, pool_maxsize=pool_maxsize)
+    if engine == "asyncio":
+        from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_async import (
+            NutanixAsyncClient,
+            import_aiohttp,
+            run_async
+        )
+        import_aiohttp()
+        start = time.time()
+        count = len(run_async(client, NutanixAsyncClient.list_all_entities, "vms", {"length": length}))
+    else:
+        from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import iter_entities
+        start = time.time()
+        count = sum(1 for entity in iter_entities("vms", {"length": length}, client))
+    seconds = time.time() - start
+    summary = client.api_stats.summary()
+    return {"seconds": seconds, "count": count, "response_bytes": summary["response_bytes"],
+            "response_wire_bytes": summary["response_wire_bytes"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vms", type=int, default=10000)
+    parser.add_argument("--length", type=int, default=500, help="VMs per list page")
+    parser.add_argument("--bandwidth", type=float, nargs="+", default=[1, 10, 100, 0],
+                        help="Mbit/s of the link to the PC, 0 is unlimited")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--engine", nargs="+", choices=["requests", "asyncio"], default=["requests"])
+    parser.add_argument("--pool-maxsize", type=int, default=10)
+    parser.add_argument("--json", help="write the reports to this file")
+    args = parser.parse_args()
+
+    ensure_collection_importable()
+    mock = MockPrismCentral(vms=args.vms, images=0, latency=args.latency, max_length=max(args.length, 500))
+    url = mock.start()
+    reports = []
+    print("{0:>10} {1:<9} {2:<11} {3:>9} {4:>12} {5:>12} {6:>6}".format(
+        "Mbit/s", "engine", "compression", "seconds", "wire MB", "decoded MB", "ratio"))
+    try:
+        for bandwidth in args.bandwidth:
+            mock.bandwidth = bandwidth * 1000000 / 8
+            for engine in args.engine:
+                for compression in (False, True):
+                    with multiprocessing.get_context("spawn").Pool(1) as pool:
+                        report = pool.apply(worker, ((url, engine, compression, args.length, args.pool_maxsize),))
+                    report.update(bandwidth=bandwidth, engine=engine, compression=compression)
+                    reports.append(report)
+                    print("{0:>10} {engine:<9} {1:<11} {seconds:>9.2f} {2:>12.2f} {3:>12.2f} {4:>6.1f}".format(
+                        bandwidth or "unlimited", "on" if compression else "off",
+                        report["response_wire_bytes"] / 1e6, report["response_bytes"] / 1e6,
+                        report["response_bytes"] / float(max(report["response_wire_bytes"], 1)), **report))
+    finally:
+        mock.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
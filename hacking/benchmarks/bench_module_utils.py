@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Micro-benchmarks of the per task hot paths
+
+Measures wall time (best of --repeat runs) and peak traced memory of
+has_changed, set_payload_keys, create_vm_spec, update_vm_spec, the
+inventory plugin's _build_inventory and the decoding of VM list responses
+(json, orjson if installed, and streamed one entity at a time) on synthetic
+fixtures, along with the API calls they send to the in-process mock.
+
+Peak memory and API calls don't depend on the machine, they are compared
+with bench_module_utils.json, which is committed. Wall times are compared
+with bench_module_utils_timings.json, which is not:
+
+    python hacking/benchmarks/bench_module_utils.py                    # compare
+    python hacking/benchmarks/bench_module_utils.py --update-baseline  # record
+
+The run fails when the baseline is missing or lacks a benchmark, when a
+benchmark sends more API calls than recorded, or when it uses more memory
+or, if timings were recorded, is slower than recorded by more than the
+tolerance.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import collections
+import copy
+import gc
+import importlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from common import (
+    MockPrismCentral,
+    ensure_collection_importable,
+    in_process_client,
+    load_baseline,
+    save_baseline,
+    vm_params,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_module_utils.json")
+TIMINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_module_utils_timings.json")
+# Absolute slack in KiB on top of the relative memory tolerance, small peaks vary across Python versions
+MEMORY_SLACK = 16
+SPEC_SIZES = (1, 4, 16, 64)
+LIST_SIZES = (500, 5000, 50000)
+
+
+def measure(func, make_args, repeat, mock=None):
+    """
+    This routine helps to measure a function call
+    Args:
+        func(func): function to measure
+        make_args(func): callable returning a fresh args tuple, not timed
+        repeat(int): number of timed runs
+        mock(obj): MockPrismCentral the function sends its API calls to, if any
+    Returns:
+        (dict): best wall time in seconds, peak traced memory in KiB and API calls of a run
+    """
+    best = None
+    for run in range(repeat):
+        args = make_args()
+        gc.collect()
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    args = make_args()
+    gc.collect()
+    calls = sum(mock.calls.values()) if mock is not None else 0
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    calls = sum(mock.calls.values()) - calls if mock is not None else 0
+    return {"seconds": best, "peak_kib": peak / 1024.0, "api_calls": calls}
+
+
+def spec_benchmarks(repeat):
+    """Yield (name, func, make_args, repeat, mock) of the nutanix_vm spec helpers for 1 to 64 disks and nics"""
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_vms import (
+        has_changed,
+        set_payload_keys,
+    )
+    from ansible_collections.nutanix.nutanix.plugins.modules import nutanix_vm
+
+    mock = MockPrismCentral(vms=0, images=64, subnets=64, storage_containers=2)
+    for size in SPEC_SIZES:
+        params = vm_params(mock, disks=size, nics=size)
+        uuid_params = vm_params(mock, disks=size, nics=size, by_name=False)
+        client = in_process_client(mock)
+        new_spec, error = nutanix_vm.create_vm_spec(copy.deepcopy(uuid_params), copy.deepcopy(nutanix_vm.VM_PAYLOAD), client)
+        if error:
+            raise RuntimeError(error)
+        current = {"metadata": {"kind": "vm", "uuid": mock.new_uuid(), "spec_version": 1, "entity_version": "2"},
+                   "spec": copy.deepcopy(new_spec["spec"])}
+        changed_params = dict(uuid_params, memory=uuid_params["memory"] * 2)
+
+        yield ("set_payload_keys[disks={0}]".format(size),
+               lambda disks: [set_payload_keys(disk, nutanix_vm.DISK_PAYLOAD, {}) for disk in disks],
+               lambda: (copy.deepcopy(uuid_params["disk_list"]),), repeat, None)
+
+        yield ("has_changed[disks={0}]".format(size),
+               has_changed, lambda: (new_spec["spec"], copy.deepcopy(current["spec"])), repeat, None)
+
+        yield ("create_vm_spec[uuids,disks={0}]".format(size),
+               nutanix_vm.create_vm_spec,
+               lambda: (copy.deepcopy(uuid_params), copy.deepcopy(nutanix_vm.VM_PAYLOAD), client), repeat, mock)
+
+        # Name resolution goes through the in-process mock, a fresh client per run keeps the per run index empty
+        yield ("create_vm_spec[names,disks={0}]".format(size),
+               nutanix_vm.create_vm_spec,
+               lambda: (copy.deepcopy(params), copy.deepcopy(nutanix_vm.VM_PAYLOAD), in_process_client(mock)), repeat,
+               mock)
+
+        yield ("update_vm_spec[disks={0}]".format(size),
+               nutanix_vm.update_vm_spec,
+               lambda: (copy.deepcopy(changed_params), copy.deepcopy(current), client), repeat, mock)
+
+
+def inventory_benchmarks(repeat, sizes):
+    """Yield (name, func, make_args, repeat, mock) of the inventory plugin building hosts from list responses"""
+    from ansible.inventory.data import InventoryData
+    from ansible_collections.nutanix.nutanix.plugins.inventory.nutanix_vm_inventory import InventoryModule
+
+    for size in sizes:
+        mock = MockPrismCentral(vms=size, images=0, max_length=size)
+        vm_list = mock.list("vms", {"length": size})
+
+        def build(plugin):
+            plugin._build_inventory()
+
+        def make_plugin():
+            plugin = InventoryModule()
+            plugin.inventory = InventoryData()
+            plugin.api_engine = "requests"
+            plugin.pagination = "offset"
+            entities = copy.deepcopy(vm_list["entities"])
+            plugin._get_vm_list = lambda: iter(entities)
+            return (plugin,)
+
+        yield "build_inventory[vms={0}]".format(size), build, make_plugin, max(1, repeat // 2), None
+
+
+def decode_benchmarks(repeat, sizes):
+    """Yield (name, func, make_args, repeat, mock) of decoding VM list responses whole and streamed"""
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_json import chunk_size, iter_json_items
+
+    decoders = [("json", json.loads)]
+    try:
+        decoders.append(("orjson", importlib.import_module("orjson").loads))
+    except ImportError:
+        pass
+
+    for size in sizes:
+        mock = MockPrismCentral(vms=size, images=0, max_length=size)
+        body = json.dumps(mock.list("vms", {"length": size})).encode("utf-8")
+
+        def make_chunks():
+            return ([body[offset:offset + chunk_size] for offset in range(0, len(body), chunk_size)],)
+
+        for name, loads in decoders:
+            yield ("decode_list[{0},vms={1}]".format(name, size),
+                   lambda body, loads=loads: collections.deque(loads(body)["entities"], maxlen=0),
+                   lambda: (body,), max(1, repeat // 2), None)
+
+        # The entities are dropped as they come, as the inventory plugin and iter_entities do
+        yield ("decode_list[stream,vms={0}]".format(size),
+               lambda chunks: collections.deque(iter_json_items(chunks, "entities"), maxlen=0),
+               make_chunks, max(1, repeat // 2), None)
+
+
+def compare(name, measured, baseline, timings, tolerance, memory_tolerance):
+    """Return a list of regression messages of a benchmark"""
+    expected = baseline.get(name)
+    if expected is None:
+        return ["{0}: not in the baseline, run with --update-baseline".format(name)]
+    regressions = []
+    if measured["api_calls"] > expected["api_calls"]:
+        regressions.append("{0}: {1} API calls > baseline {2}".format(name, measured["api_calls"], expected["api_calls"]))
+    if measured["peak_kib"] > expected["peak_kib"] * (1 + memory_tolerance) + MEMORY_SLACK:
+        regressions.append("{0}: {1:.1f}KiB > baseline {2:.1f}KiB".format(
+            name, measured["peak_kib"], expected["peak_kib"]))
+    expected = timings.get(name)
+    if expected and measured["seconds"] > expected["seconds"] * (1 + tolerance):
+        regressions.append("{0}: {1:.6f}s > recorded {2:.6f}s".format(name, measured["seconds"], expected["seconds"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark, the best is kept")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed relative peak memory growth")
+    parser.add_argument("--list-sizes", type=int, nargs="+", default=list(LIST_SIZES))
+    parser.add_argument("--filter", default="", help="only run benchmarks containing this string")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="peak memory and API calls per benchmark")
+    parser.add_argument("--timings", default=TIMINGS_PATH, help="wall times per benchmark on this machine")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    ensure_collection_importable()
+    baseline = load_baseline(args.baseline)
+    if not baseline and not args.update_baseline:
+        print("No baseline found at {0}, run with --update-baseline to record one".format(args.baseline))
+        return 1
+    timings = load_baseline(args.timings)
+    results, regressions = {}, []
+
+    benchmarks = [spec_benchmarks(args.repeat), inventory_benchmarks(args.repeat, args.list_sizes),
+                  decode_benchmarks(args.repeat, args.list_sizes)]
+    print("{0:<40} {1:>12} {2:>12} {3:>9}".format("benchmark", "seconds", "peak KiB", "API calls"))
+    for group in benchmarks:
+        for name, func, make_args, repeat, mock in group:
+            if args.filter not in name:
+                continue
+            measured = results[name] = measure(func, make_args, repeat, mock)
+            print("{0:<40} {1[seconds]:>12.6f} {1[peak_kib]:>12.1f} {1[api_calls]:>9}".format(name, measured))
+            regressions.extend(compare(name, measured, baseline, timings, args.tolerance, args.memory_tolerance))
+
+    if args.update_baseline:
+        baseline.update((name, {"peak_kib": round(measured["peak_kib"], 1), "api_calls": measured["api_calls"]})
+                        for name, measured in results.items())
+        save_baseline(args.baseline, baseline)
+        timings.update((name, {"seconds": measured["seconds"]}) for name, measured in results.items())
+        save_baseline(args.timings, timings)
+        print("Baseline written to {0}, timings to {1}".format(args.baseline, args.timings))
+        return 0
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
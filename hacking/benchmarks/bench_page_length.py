@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Fixed versus adaptive page length benchmark of a large VM listing
+
+Lists --vms VMs from a MockPrismCentral over HTTP once per fixed --length
+value, then --runs times with adaptive paging starting from the first
+--length value:
+
+    python hacking/benchmarks/bench_page_length.py --vms 10000 --length 50 250 500 --runs 3
+
+The mock adds --latency seconds to every response and --entity-latency
+seconds per VM returned. Every run gets a fresh client in its own process,
+the adaptive runs share a page length cache in a temporary directory like
+consecutive module runs on a controller. Reports wall seconds, requests and
+the page length the run ended with.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from common import MockPrismCentral, ensure_collection_importable, http_client
+
+
+def worker(job):
+    """List all VMs in a fresh process and return the report"""
+    url, home, length, adaptive, target_seconds = job
+    # The page length cache lives under ~/.ansible/tmp
+    os.environ["HOME"] = home
+    ensure_collection_importable()
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import iter_entities
+
+    client = http_client(url, adaptive_paging=adaptive, page_target_seconds=target_seconds)
+    start = time.time()
+    count = sum(1 for entity in iter_entities("vms", {"length": length}, client))
+    tuner = client.page_tuners.get("vms")
+    return {"seconds": time.time() - start, "count": count,
+            "page_length": tuner.page_length if tuner is not None else length}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vms", type=int, default=10000)
+    parser.add_argument("--length", type=int, nargs="+", default=[50, 250, 500], help="fixed VMs per list page")
+    parser.add_argument("--runs", type=int, default=3, help="consecutive adaptive runs")
+    parser.add_argument("--target-seconds", type=float, default=1.0, help="page_target_seconds of adaptive runs")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--entity-latency", type=float, default=0.002, help="seconds added per VM returned")
+    parser.add_argument("--json", help="write the reports to this file")
+    args = parser.parse_args()
+
+    ensure_collection_importable()
+    mock = MockPrismCentral(vms=args.vms, images=0, latency=args.latency, entity_latency=args.entity_latency)
+    url = mock.start()
+    home = tempfile.mkdtemp(prefix="nutanix-bench-home-")
+    jobs = [("fixed", length, False) for length in args.length] + \
+        [("adaptive", args.length[0], True)] * args.runs
+    reports = []
+    print("{0:<9} {1:>6} {2:>9} {3:>8} {4:>11}".format("paging", "start", "seconds", "requests", "page_length"))
+    try:
+        for paging, length, adaptive in jobs:
+            calls = sum(mock.calls.values())
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                report = pool.apply(worker, ((url, home, length, adaptive, args.target_seconds),))
+            report.update(paging=paging, start=length, requests=sum(mock.calls.values()) - calls)
+            reports.append(report)
+            print("{paging:<9} {start:>6} {seconds:>9.2f} {requests:>8} {page_length:>11}".format(**report))
+    finally:
+        mock.stop()
+        shutil.rmtree(home, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Offset versus keyset pagination benchmark of a large VM listing
+
+Lists --vms VMs, --length VMs per page, from a MockPrismCentral over HTTP
+with offset pagination and with keyset pagination once per --splits value:
+
+    python hacking/benchmarks/bench_pagination.py --vms 20000 --splits 1 4 8 --churn 20
+
+The mock adds --scan-latency seconds per entity skipped by the offset of a
+list request, like PC walking past the earlier pages of a deep offset. With
+--churn, as many VMs per second are deleted and created while the listing
+runs. Every run gets a fresh client in its own process. Reports wall
+seconds, requests, duplicated VMs and missed VMs, those that existed for the
+whole run but were not listed.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+
+from common import MockPrismCentral, ensure_collection_importable, http_client
+
+
+def worker(job):
+    """List all VMs in a fresh process and return their uuids"""
+    url, pagination, splits, length = job
+    ensure_collection_importable()
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import iter_entities
+
+    client = http_client(url, pagination=pagination, pagination_splits=splits)
+    start = time.time()
+    vm_uuids = [entity["metadata"]["uuid"] for entity in iter_entities("vms", {"length": length}, client)]
+    return {"seconds": time.time() - start, "vm_uuids": vm_uuids}
+
+
+def churn(mock, rate, seconds):
+    """Delete and create rate VMs per second during seconds"""
+    interval = 1.0 / rate
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        with mock.lock:
+            vm_uuid = mock.random.choice(list(mock.entities["vms"]))
+            spec = mock.entities["vms"].pop(vm_uuid)["spec"]
+            mock.add_vm(spec)
+        time.sleep(interval)
+
+
+def run(mock, url, pagination, splits, args):
+    """
+    This routine helps to list all VMs once, churning VMs meanwhile
+    Returns:
+        (dict): seconds, requests, duplicated and missed VMs
+    """
+    before = set(mock.entities["vms"])
+    calls = sum(mock.calls.values())
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        result = pool.apply_async(worker, ((url, pagination, splits, args.length),))
+        while not result.ready():
+            if args.churn:
+                churn(mock, args.churn, 0.2)
+            else:
+                result.wait(0.2)
+        report = result.get()
+    with mock.lock:
+        after = set(mock.entities["vms"])
+        requests = sum(mock.calls.values()) - calls
+    listed = report.pop("vm_uuids")
+    report.update(pagination=pagination, splits=splits, requests=requests, vms=len(listed),
+                  duplicated=len(listed) - len(set(listed)), missed=len((before & after) - set(listed)))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vms", type=int, default=20000)
+    parser.add_argument("--length", type=int, default=500, help="VMs per list page")
+    parser.add_argument("--splits", type=int, nargs="+", default=[1, 4, 8],
+                        help="uuid ranges scanned in parallel with keyset pagination")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument("--scan-latency", type=float, default=0.0001,
+                        help="seconds added to list responses per entity skipped by the offset")
+    parser.add_argument("--churn", type=float, default=0, help="VMs deleted and created per second")
+    parser.add_argument("--json", help="write the reports to this file")
+    args = parser.parse_args()
+
+    ensure_collection_importable()
+    mock = MockPrismCentral(vms=args.vms, images=0, latency=args.latency, scan_latency=args.scan_latency,
+                            max_length=max(args.length, 500))
+    url = mock.start()
+    reports = []
+    print("{0:<10} {1:>6} {2:>9} {3:>8} {4:>7} {5:>10} {6:>7}".format(
+        "pagination", "splits", "seconds", "requests", "vms", "duplicated", "missed"))
+    try:
+        for pagination, splits in [("offset", 1)] + [("keyset", splits) for splits in args.splits]:
+            report = run(mock, url, pagination, splits, args)
+            reports.append(report)
+            print("{pagination:<10} {splits:>6} {seconds:>9.2f} {requests:>8} {vms:>7} {duplicated:>10} "
+                  "{missed:>7}".format(**report))
+    finally:
+        mock.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
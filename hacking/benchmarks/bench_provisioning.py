@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+End-to-end provisioning throughput benchmark
+
+Creates, updates, powers off and deletes --vms VMs through the nutanix_vm
+entry points against a MockPrismCentral, once per --forks value. Each fork
+is a worker process and every operation gets a fresh client, like a module
+run in an Ansible fork:
+
+    python hacking/benchmarks/bench_provisioning.py --vms 1000 --forks 5 20 50
+
+Mock task and IP delays are simulated seconds and every client gets a
+simulated clock injected. Over HTTP --speedup runs the clock faster than
+wall time so that realistic delays finish in minutes; in-process the clock
+only advances when the code sleeps, so a run takes milliseconds per VM and
+--schedule can dump every sleep. All reported times are simulated seconds.
+Reports VMs per minute, API calls per VM, per operation latencies and the
+time slept in task_poll, in the IP wait loop of _create and in retry backoff.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import copy
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+
+from common import (
+    BenchModule,
+    BenchModuleExit,
+    MockPrismCentral,
+    create_client,
+    ensure_collection_importable,
+    in_process_client,
+    load_baseline,
+    save_baseline,
+    vm_params,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_provisioning.json")
+LIFECYCLE = ("create", "update", "poweroff", "delete")
+
+
+class ScaledClock(object):
+    """
+    NutanixClock running speedup times faster than wall time from an epoch
+
+    Worker processes share the epoch with the mock server, so task and IP
+    delays line up across processes. Simulated sleep seconds are summed per
+    reason.
+    """
+
+    def __init__(self, epoch, speedup):
+        self.epoch = epoch
+        self.speedup = speedup
+        self.slept = Counter()
+
+    def time(self):
+        return self.epoch + (time.time() - self.epoch) * self.speedup
+
+    def sleep(self, seconds, reason=None):
+        self.slept[reason] += seconds
+        time.sleep(seconds / self.speedup)
+
+    def get_slept(self):
+        return dict(self.slept)
+
+
+def lifecycle_params(base_params, name):
+    """
+    This routine helps to build the module params of each lifecycle operation of a VM
+    Args:
+        base_params(dict): nutanix_vm params of the VM to create
+        name(str): VM name
+    Returns:
+        (list): (operation, params) tuples in LIFECYCLE order
+    """
+    create = dict(base_params, name=name)
+    return [
+        ("create", create),
+        ("update", dict(create, memory=create["memory"] * 2)),
+        ("poweroff", dict(create, memory=create["memory"] * 2, state="poweroff")),
+        ("delete", dict(create, state="absent")),
+    ]
+
+
+def run_vms(names, base_params, make_client, clock):
+    """
+    This routine helps to run the lifecycle of VMs one after the other
+    Args:
+        names(list): VM names
+        base_params(dict): nutanix_vm params of the VM to create
+        make_client(func): callable returning a client for module params
+        clock(obj): clock injected into the clients
+    Returns:
+        (dict): durations and API calls per operation, sleep seconds and failures
+    """
+    from ansible_collections.nutanix.nutanix.plugins.modules import nutanix_vm
+
+    durations = dict((operation, []) for operation in LIFECYCLE)
+    calls = Counter()
+    failures = []
+    run_start = clock.time()
+    for name in names:
+        for operation, params in lifecycle_params(base_params, name):
+            # Module code updates its params in place, every module run starts from fresh ones
+            client = make_client(copy.deepcopy(params))
+            start = clock.time()
+            try:
+                result = nutanix_vm.entry_point(client.module, client)
+            except BenchModuleExit as err:
+                result = err.result
+            durations[operation].append(clock.time() - start)
+            calls[operation] += len(client.api_stats.records)
+            if result.get("failed"):
+                failures.append("{0} {1}: {2}".format(operation, name, result.get("msg")))
+                break
+    return {"durations": durations, "calls": dict(calls), "slept": clock.get_slept(), "failures": failures,
+            "start": run_start, "end": clock.time()}
+
+
+def http_worker(args):
+    """Worker process driving a share of the VMs against the mock HTTP server"""
+    url, names, base_params, epoch, speedup = args
+    clock = ScaledClock(epoch, speedup)
+
+    def make_client(params):
+        client = create_client(BenchModule(api_stats=True, **params), clock=clock)
+        client.api_base = "{0}/api/nutanix".format(url)
+        return client
+
+    return run_vms(names, base_params, make_client, clock)
+
+
+def run(args, forks):
+    """
+    This routine helps to run the benchmark for one fork count
+    Args:
+        args(obj): parsed arguments
+        forks(int): number of worker processes
+    Returns:
+        (dict): aggregated report
+    """
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_clock import NutanixSimulatedClock
+
+    epoch = time.time()
+    if args.transport == "in-process":
+        clock = NutanixSimulatedClock(epoch)
+    else:
+        clock = ScaledClock(epoch, args.speedup)
+    mock = MockPrismCentral(
+        vms=args.existing_vms, images=args.images, task_duration=args.task_duration,
+        ip_delay=args.ip_delay, latency=args.latency, error_rate=args.error_rate,
+        seed=args.seed, clock=clock.time, sleep=clock.sleep)
+    base_params = vm_params(mock, disks=args.disks, nics=args.nics,
+                            task_poll_interval=args.task_poll_interval,
+                            task_poll_max_interval=args.task_poll_max_interval)
+    names = ["bench-{0}-{1:05d}".format(forks, index) for index in range(args.vms)]
+
+    if args.transport == "in-process":
+        reports = [run_vms(names, base_params,
+                           lambda params: in_process_client(mock, clock=clock, api_stats=True, **params), clock)]
+        if args.schedule:
+            with open(args.schedule, "w") as f:
+                json.dump([{"time": start - epoch, "seconds": seconds, "reason": reason}
+                           for start, seconds, reason in clock.sleeps], f)
+    else:
+        url = mock.start()
+        shares = [(url, names[index::forks], base_params, epoch, args.speedup) for index in range(forks)]
+        pool = multiprocessing.get_context("spawn").Pool(forks)
+        try:
+            reports = pool.map(http_worker, shares)
+        finally:
+            pool.close()
+            pool.join()
+            mock.stop()
+    return summarize(reports, forks, len(names))
+
+
+def summarize(reports, forks, vms):
+    """Aggregate the worker reports of a run, worker start up is not part of the elapsed time"""
+    elapsed = max(report["end"] for report in reports) - min(report["start"] for report in reports)
+    durations = dict((operation, []) for operation in LIFECYCLE)
+    calls, slept, failures = Counter(), Counter(), []
+    for report in reports:
+        for operation in LIFECYCLE:
+            durations[operation].extend(report["durations"][operation])
+        calls.update(report["calls"])
+        slept.update(report["slept"])
+        failures.extend(report["failures"])
+
+    operations = {}
+    for operation in LIFECYCLE:
+        values = sorted(durations[operation])
+        operations[operation] = {
+            "calls_per_vm": calls[operation] / max(len(values), 1),
+            "p50_seconds": values[len(values) // 2] if values else 0,
+            "p95_seconds": values[min(int(len(values) * 0.95), len(values) - 1)] if values else 0,
+        }
+    return {
+        "forks": forks,
+        "vms": vms,
+        "elapsed_seconds": elapsed,
+        "vms_per_minute": vms * 60.0 / elapsed if elapsed else 0,
+        "calls_per_vm": sum(calls.values()) / float(vms),
+        "task_poll_sleep_per_vm": slept["task_poll"] / vms,
+        "ip_wait_sleep_per_vm": slept["ip_wait"] / vms,
+        "retry_sleep_per_vm": slept["retry"] / vms,
+        "operations": operations,
+        "failures": failures,
+    }
+
+
+def print_report(report):
+    print("forks={forks}: {vms} VMs in {elapsed_seconds:.0f}s, {vms_per_minute:.1f} VMs/min, "
+          "{calls_per_vm:.1f} API calls/VM".format(**report))
+    print("  sleep per VM: task_poll {task_poll_sleep_per_vm:.1f}s, ip wait {ip_wait_sleep_per_vm:.1f}s, "
+          "retry {retry_sleep_per_vm:.1f}s".format(**report))
+    for operation in LIFECYCLE:
+        print("  {0:<10} {1:>6.1f} calls/VM  p50 {2:>7.1f}s  p95 {3:>7.1f}s".format(
+            operation, report["operations"][operation]["calls_per_vm"],
+            report["operations"][operation]["p50_seconds"], report["operations"][operation]["p95_seconds"]))
+    for failure in report["failures"][:5]:
+        print("  FAILED " + failure)
+
+
+def compare(report, baseline, tolerance):
+    """Return a list of regression messages of a run"""
+    expected = baseline.get("forks={0}".format(report["forks"]))
+    if not expected:
+        return []
+    regressions = []
+    if report["vms_per_minute"] < expected["vms_per_minute"] * (1 - tolerance):
+        regressions.append("forks={0}: {1:.1f} VMs/min < baseline {2:.1f}".format(
+            report["forks"], report["vms_per_minute"], expected["vms_per_minute"]))
+    if report["calls_per_vm"] > expected["calls_per_vm"] * (1 + tolerance):
+        regressions.append("forks={0}: {1:.1f} API calls/VM > baseline {2:.1f}".format(
+            report["forks"], report["calls_per_vm"], expected["calls_per_vm"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vms", type=int, default=1000, help="VMs to provision per fork count")
+    parser.add_argument("--forks", type=int, nargs="+", default=[5, 20, 50])
+    parser.add_argument("--transport", choices=["http", "in-process"], default="http",
+                        help="in-process skips HTTP and only supports a single fork")
+    parser.add_argument("--speedup", type=float, default=50, help="simulated seconds per wall second over HTTP")
+    parser.add_argument("--task-duration", type=float, default=5, help="simulated seconds per PC task")
+    parser.add_argument("--ip-delay", type=float, default=30, help="simulated seconds until a VM reports an IP")
+    parser.add_argument("--latency", type=float, default=0, help="simulated seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--existing-vms", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--disks", type=int, default=2)
+    parser.add_argument("--nics", type=int, default=1)
+    parser.add_argument("--task-poll-interval", type=float, default=0.5)
+    parser.add_argument("--task-poll-max-interval", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the reports to this file")
+    parser.add_argument("--schedule", help="write every in-process sleep as (time, seconds, reason) to this file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative throughput regression")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.transport == "in-process" and args.forks != [1]:
+        parser.error("--transport in-process requires --forks 1")
+
+    ensure_collection_importable()
+    baseline = load_baseline(args.baseline)
+    reports, regressions = [], []
+    for forks in args.forks:
+        report = run(args, forks)
+        print_report(report)
+        reports.append(report)
+        regressions.extend(compare(report, baseline, args.tolerance))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    if args.update_baseline:
+        for report in reports:
+            baseline["forks={0}".format(report["forks"])] = {
+                "vms_per_minute": report["vms_per_minute"], "calls_per_vm": report["calls_per_vm"]}
+        save_baseline(args.baseline, baseline)
+        print("Baseline written to {0}".format(args.baseline))
+        return 0
+    if any(report["failures"] for report in reports):
+        return 1
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
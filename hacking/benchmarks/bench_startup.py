@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Cold start budget of the modules
+
+Every module is started --runs times in a fresh interpreter, like an
+AnsiballZ payload, and three phases are timed:
+
+    import    importing the module and the module_utils it ships
+    validate  main() up to the client, mostly AnsibleModule argument validation
+    client    creating the NutanixApiClient, which imports requests
+
+ansible.module_utils.basic is imported before the clock starts since every
+module pays for it. Heavy libraries such as requests must not be imported
+before the client is created, the run fails if one is loaded by then. The module_utils a module ships are found by scanning
+imports like AnsiballZ does and compared with bench_startup.json, which is
+committed. Timings depend on the machine, their medians are compared with
+bench_startup_timings.json, which is not:
+
+    python hacking/benchmarks/bench_startup.py                    # compare
+    python hacking/benchmarks/bench_startup.py --update-baseline  # record
+    python hacking/benchmarks/bench_startup.py --shipped-only     # CI
+
+The run fails when the baseline is missing, when a module ships
+module_utils that aren't recorded, when a module imports a heavy library
+before its client, or when a phase is slower than its recorded timing by
+more than the tolerance. Only the last depends on the machine.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_startup.json")
+TIMINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_startup_timings.json")
+MODULE_UTILS_PREFIX = "ansible_collections.nutanix.nutanix.plugins.module_utils."
+PHASES = ("import", "validate", "client")
+# Libraries that only the code paths needing them may import
+HEAVY_MODULES = ("requests", "urllib3", "aiohttp")
+# Absolute slack in seconds on top of the relative tolerance, phases of a few ms are noisy
+SLACK = 0.005
+
+
+def module_args():
+    """Return module name : module args of realistic tasks"""
+    from common import MockPrismCentral, image_params, vm_params
+
+    mock = MockPrismCentral(vms=0, images=4, subnets=4)
+    connection = dict((key, value) for key, value in vm_params(mock).items()
+                      if key.startswith("pc_") or key == "validate_certs")
+    modules = {
+        "nutanix_vm": vm_params(mock, disks=4, nics=2),
+        "nutanix_vm_info": connection,
+        "nutanix_image": dict(connection, **image_params("bench-image")),
+        "nutanix_image_info": connection,
+    }
+    # Unset options are left out like in a task, mutually exclusive options count when passed as None
+    return dict((name, dict((key, value) for key, value in params.items() if value is not None))
+                for name, params in modules.items())
+
+
+def shipped_module_utils(module_name):
+    """
+    This routine helps to list the collection module_utils shipped with a module
+    Like AnsiballZ, imports anywhere in a file are followed recursively.
+    Args:
+        module_name(str): module name
+    Returns:
+        (dict): module_utils name : file size in bytes
+    """
+    from common import COLLECTION_DIR
+
+    shipped = {}
+    pending = [os.path.join(COLLECTION_DIR, "plugins", "modules", module_name + ".py")]
+    while pending:
+        with open(pending.pop()) as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            names = []
+            if isinstance(node, ast.ImportFrom) and node.module:
+                names = [node.module]
+            elif isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            for name in names:
+                if not name.startswith(MODULE_UTILS_PREFIX):
+                    continue
+                util = name[len(MODULE_UTILS_PREFIX):]
+                if util not in shipped:
+                    path = os.path.join(COLLECTION_DIR, "plugins", "module_utils", util + ".py")
+                    shipped[util] = os.path.getsize(path)
+                    pending.append(path)
+    return shipped
+
+
+def child(root, module_name):
+    """Time the start up phases of a module in this interpreter and print them as JSON"""
+    import time
+    sys.path.insert(0, root)
+    import importlib
+    try:
+        from ansible.module_utils.testing import patch_module_args
+    except ImportError:
+        # ansible-core before 2.19 reads the args from basic._ANSIBLE_ARGS
+        import contextlib
+        from ansible.module_utils import basic
+
+        @contextlib.contextmanager
+        def patch_module_args(args):
+            basic._ANSIBLE_ARGS = json.dumps({"ANSIBLE_MODULE_ARGS": args}).encode("utf-8")
+            yield
+
+    args = json.loads(sys.stdin.read())
+
+    start = time.perf_counter()
+    module = importlib.import_module("ansible_collections.nutanix.nutanix.plugins.modules." + module_name)
+    imported = time.perf_counter()
+
+    class ClientCreated(Exception):
+        def __init__(self, ansible_module):
+            super(ClientCreated, self).__init__()
+            self.ansible_module = ansible_module
+
+    def stop_at_client(ansible_module, *args, **kwargs):
+        raise ClientCreated(ansible_module)
+
+    client_class = module.NutanixApiClient
+    module.NutanixApiClient = stop_at_client
+    with patch_module_args(args):
+        try:
+            module.main()
+        except ClientCreated as created:
+            ansible_module = created.ansible_module
+        except SystemExit:
+            raise RuntimeError("{0} exited during argument validation".format(module_name))
+    validated = time.perf_counter()
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    client_class(ansible_module)
+    created = time.perf_counter()
+    print(json.dumps({"import": imported - start, "validate": validated - imported, "client": created - validated,
+                      "heavy_imports": heavy}))
+
+
+def run(root, module_name, args, runs):
+    """
+    This routine helps to time the start up phases of a module over cold runs
+    Returns:
+        (dict): median seconds per phase, heavy libraries imported before the client
+    """
+    samples = dict((phase, []) for phase in PHASES)
+    heavy = set()
+    for index in range(runs):
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", module_name, "--root", root],
+            input=json.dumps(args), capture_output=True, universal_newlines=True)
+        if process.returncode:
+            raise RuntimeError("{0} start up failed:\n{1}{2}".format(module_name, process.stdout, process.stderr))
+        measured = json.loads(process.stdout.strip().splitlines()[-1])
+        for phase in PHASES:
+            samples[phase].append(measured[phase])
+        heavy.update(measured["heavy_imports"])
+    result = dict((phase, sorted(values)[len(values) // 2]) for phase, values in samples.items())
+    result["heavy_imports"] = sorted(heavy)
+    return result
+
+
+def compare(module_name, measured, baseline, timings, tolerance):
+    """Return a list of regression messages of a module"""
+    expected = baseline.get(module_name)
+    if expected is None:
+        return ["{0}: not in the baseline, run with --update-baseline".format(module_name)]
+    regressions = []
+    extra = sorted(set(measured["module_utils"]) - set(expected["module_utils"]))
+    if extra:
+        regressions.append("{0}: ships new module_utils {1}".format(module_name, ", ".join(extra)))
+    if measured.get("heavy_imports"):
+        regressions.append("{0}: imports {1} before creating the client".format(
+            module_name, ", ".join(measured["heavy_imports"])))
+    expected = timings.get(module_name)
+    if not expected or "import" not in measured:
+        return regressions
+    for phase in PHASES:
+        allowed = expected[phase] * (1 + tolerance) + SLACK
+        if measured[phase] > allowed:
+            regressions.append("{0}: {1} {2:.4f}s > recorded {3:.4f}s".format(
+                module_name, phase, measured[phase], expected[phase]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7, help="cold runs per module, the median is kept")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown per phase")
+    parser.add_argument("--filter", default="", help="only run modules containing this string")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="module_utils shipped per module")
+    parser.add_argument("--timings", default=TIMINGS_PATH, help="median seconds per phase on this machine")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--shipped-only", action="store_true",
+                        help="only compare the shipped module_utils, without starting the modules")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--root", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.root, args.child)
+        return 0
+
+    # Imported here so that the timed child interpreters don't preload what common imports
+    from common import ensure_collection_importable, load_baseline, save_baseline
+
+    root = ensure_collection_importable()
+    baseline = load_baseline(args.baseline)
+    if not baseline and not args.update_baseline:
+        print("No baseline found at {0}, run with --update-baseline to record one".format(args.baseline))
+        return 1
+    timings = load_baseline(args.timings)
+    results, regressions = {}, []
+    print("{0:<20} {1:>10} {2:>10} {3:>10} {4:>10}  {5}".format(
+        "module", "import s", "validate s", "client s", "total s", "module_utils shipped"))
+    for module_name, params in sorted(module_args().items()):
+        if args.filter not in module_name:
+            continue
+        measured = {} if args.shipped_only else run(root, module_name, params, args.runs)
+        shipped = shipped_module_utils(module_name)
+        measured["module_utils"] = sorted(shipped)
+        results[module_name] = measured
+        if args.shipped_only:
+            print("{0:<20} {1:>10} {1:>10} {1:>10} {1:>10}  {2} ({3:.1f} KiB)".format(
+                module_name, "-", ", ".join(measured["module_utils"]), sum(shipped.values()) / 1024.0))
+        else:
+            print("{0:<20} {1[import]:>10.4f} {1[validate]:>10.4f} {1[client]:>10.4f} {2:>10.4f}  {3} ({4:.1f} KiB)".format(
+                module_name, measured, sum(measured[phase] for phase in PHASES),
+                ", ".join(measured["module_utils"]), sum(shipped.values()) / 1024.0))
+        regressions.extend(compare(module_name, measured, baseline, timings, args.tolerance))
+
+    if args.update_baseline:
+        baseline.update((module_name, {"module_utils": measured["module_utils"]})
+                        for module_name, measured in results.items())
+        save_baseline(args.baseline, baseline)
+        print("Baseline written to {0}".format(args.baseline))
+        if not args.shipped_only:
+            timings.update((module_name, dict((phase, measured[phase]) for phase in PHASES))
+                           for module_name, measured in results.items())
+            save_baseline(args.timings, timings)
+            print("Timings written to {0}".format(args.timings))
+        return 0
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
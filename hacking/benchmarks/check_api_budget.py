@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+API call budgets of canonical module scenarios
+
+Runs each scenario against an in-process MockPrismCentral whose tasks finish
+immediately, counts the HTTP calls per endpoint and checks them against
+api_budgets.json:
+
+    python hacking/benchmarks/check_api_budget.py            # check
+    python hacking/benchmarks/check_api_budget.py --update   # rewrite budgets
+
+The check fails when a scenario calls an endpoint more often than its budget
+or calls an endpoint that has no budget. Counts below budget are reported so
+the budget can be tightened.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import copy
+import os
+import sys
+import tempfile
+
+from common import (
+    BenchModuleExit,
+    InProcessSession,
+    MockPrismCentral,
+    ensure_collection_importable,
+    image_params,
+    in_process_client,
+    load_baseline,
+    save_baseline,
+    vm_params,
+)
+
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api_budgets.json")
+INVENTORY_CONFIG = """plugin: nutanix.nutanix.nutanix_vm_inventory
+pc_hostname: 127.0.0.1
+pc_username: admin
+pc_password: nutanix/4u
+validate_certs: false
+session_cache: false
+"""
+
+
+def run_vm(mock, params):
+    """Run nutanix_vm with params, raises RuntimeError if it fails"""
+    from ansible_collections.nutanix.nutanix.plugins.modules import nutanix_vm
+
+    client = in_process_client(mock, **copy.deepcopy(params))
+    try:
+        result = nutanix_vm.entry_point(client.module, client)
+    except BenchModuleExit as err:
+        result = err.result
+    if result.get("failed"):
+        raise RuntimeError(result.get("msg"))
+    return result
+
+
+def run_image(mock, params):
+    """Run nutanix_image with params, raises RuntimeError if it fails"""
+    from ansible_collections.nutanix.nutanix.plugins.modules import nutanix_image
+
+    client = in_process_client(mock, **copy.deepcopy(params))
+    operation = nutanix_image._create if params["state"] == "present" else nutanix_image._delete
+    try:
+        result = operation(client.module, client, dict(changed=False, ansible_facts=dict()))
+    except BenchModuleExit as err:
+        result = err.result
+    if result.get("failed"):
+        raise RuntimeError(result.get("msg"))
+    return result
+
+
+def scenario_vm_create(mock):
+    params = vm_params(mock, disks=2, nics=1, name="budget-vm")
+    return lambda: run_vm(mock, params)
+
+
+def scenario_vm_create_idempotent(mock):
+    params = vm_params(mock, disks=2, nics=1, name="budget-vm")
+    run_vm(mock, params)
+    return lambda: run_vm(mock, params)
+
+
+def scenario_vm_update(mock):
+    params = vm_params(mock, disks=2, nics=1, name="budget-vm")
+    run_vm(mock, params)
+    return lambda: run_vm(mock, dict(params, memory=params["memory"] * 2))
+
+
+def scenario_vm_update_restart(mock):
+    # Shrinking a powered on VM powers it off before the update
+    params = vm_params(mock, disks=2, nics=1, name="budget-vm")
+    run_vm(mock, params)
+    return lambda: run_vm(mock, dict(params, memory=params["memory"] // 2))
+
+
+def scenario_vm_poweroff(mock):
+    params = vm_params(mock, disks=2, nics=1, name="budget-vm")
+    run_vm(mock, params)
+    return lambda: run_vm(mock, dict(params, state="poweroff"))
+
+
+def scenario_vm_poweron(mock):
+    params = vm_params(mock, disks=2, nics=1, name="budget-vm")
+    run_vm(mock, params)
+    run_vm(mock, dict(params, state="poweroff"))
+    return lambda: run_vm(mock, dict(params, state="poweron"))
+
+
+def scenario_vm_delete(mock):
+    params = vm_params(mock, disks=2, nics=1, name="budget-vm")
+    run_vm(mock, params)
+    return lambda: run_vm(mock, dict(params, state="absent"))
+
+
+def scenario_image_create(mock):
+    return lambda: run_image(mock, image_params("budget-image"))
+
+
+def scenario_image_create_idempotent(mock):
+    run_image(mock, image_params("budget-image"))
+    return lambda: run_image(mock, image_params("budget-image"))
+
+
+def scenario_image_update(mock):
+    run_image(mock, image_params("budget-image"))
+    return lambda: run_image(mock, image_params("budget-image", image_description="updated"))
+
+
+def scenario_image_delete(mock):
+    run_image(mock, image_params("budget-image"))
+    return lambda: run_image(mock, image_params("budget-image", state="absent"))
+
+
+def scenario_inventory_parse(mock):
+    from ansible.inventory.data import InventoryData
+    from ansible.parsing.dataloader import DataLoader
+    from ansible.plugins.loader import inventory_loader
+
+    path = os.path.join(tempfile.mkdtemp(prefix="nutanix-budget-"), "nutanix.yml")
+    with open(path, "w") as f:
+        f.write(INVENTORY_CONFIG)
+
+    def parse():
+        plugin = inventory_loader.get("nutanix.nutanix.nutanix_vm_inventory")
+        plugin.session = InProcessSession(mock)
+        plugin.parse(InventoryData(), DataLoader(), path, cache=False)
+    return parse
+
+
+SCENARIOS = (
+    ("vm_create", scenario_vm_create),
+    ("vm_create_idempotent", scenario_vm_create_idempotent),
+    ("vm_update", scenario_vm_update),
+    ("vm_update_restart", scenario_vm_update_restart),
+    ("vm_poweroff", scenario_vm_poweroff),
+    ("vm_poweron", scenario_vm_poweron),
+    ("vm_delete", scenario_vm_delete),
+    ("image_create", scenario_image_create),
+    ("image_create_idempotent", scenario_image_create_idempotent),
+    ("image_update", scenario_image_update),
+    ("image_delete", scenario_image_delete),
+    ("inventory_parse", scenario_inventory_parse),
+)
+
+
+def count_calls(scenario):
+    """
+    This routine helps to count the HTTP calls of a scenario
+    Args:
+        scenario(func): callable doing the setup and returning the measured callable
+    Returns:
+        (dict): "METHOD endpoint" : number of calls
+    """
+    mock = MockPrismCentral(vms=50, images=10, task_duration=0, ip_delay=0, seed=0)
+    run = scenario(mock)
+    mock.calls.clear()
+    run()
+    return dict(mock.calls)
+
+
+def check(name, counts, budget):
+    """Return (over budget messages, under budget messages) of a scenario"""
+    over, under = [], []
+    for endpoint in sorted(set(counts) | set(budget)):
+        count, allowed = counts.get(endpoint, 0), budget.get(endpoint)
+        if allowed is None:
+            over.append("{0}: {1} called {2} times, no budget".format(name, endpoint, count))
+        elif count > allowed:
+            over.append("{0}: {1} called {2} times, budget {3}".format(name, endpoint, count, allowed))
+        elif count < allowed:
+            under.append("{0}: {1} called {2} times, budget {3}".format(name, endpoint, count, allowed))
+    return over, under
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budgets", default=BUDGETS_PATH)
+    parser.add_argument("--update", action="store_true", help="write the measured counts as budgets")
+    parser.add_argument("--filter", default="", help="only run scenarios containing this string")
+    args = parser.parse_args()
+
+    root = ensure_collection_importable()
+    from ansible.plugins.loader import init_plugin_loader
+    init_plugin_loader([root])
+
+    budgets = load_baseline(args.budgets)
+    over, under = [], []
+    for name, scenario in SCENARIOS:
+        if args.filter not in name:
+            continue
+        counts = count_calls(scenario)
+        print("{0:<26} {1:>3} calls  {2}".format(
+            name, sum(counts.values()), ", ".join("{0} x{1}".format(endpoint, count)
+                                                  for endpoint, count in sorted(counts.items()))))
+        if args.update:
+            budgets[name] = counts
+            continue
+        scenario_over, scenario_under = check(name, counts, budgets.get(name, {}))
+        over.extend(scenario_over)
+        under.extend(scenario_under)
+
+    if args.update:
+        save_baseline(args.budgets, budgets)
+        print("Budgets written to {0}".format(args.budgets))
+        return 0
+    if under:
+        print("\nBelow budget, consider tightening with --update:\n  " + "\n  ".join(under))
+    if over:
+        print("\nOver budget:\n  " + "\n  ".join(over))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
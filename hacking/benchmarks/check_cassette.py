@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Cassette record and replay check
+
+Records nutanix_vm runs creating, updating and powering off a VM against the
+mock HTTP server into a cassette, stops the server and replays the runs from
+the cassette:
+
+    python hacking/benchmarks/check_cassette.py
+
+The check fails when the cassette holds the username, the password or a
+session id handed out by the mock, when a recorded JSON body isn't valid
+JSON, when a replayed run returns another result than its recording, or
+when a replayed run contacts the server.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from common import (
+    BenchModule,
+    BenchModuleExit,
+    MockPrismCentral,
+    create_client,
+    ensure_collection_importable,
+    http_client,
+    vm_params,
+)
+
+USERNAME = "cassette-user"
+PASSWORD = "cassette/Secret-42"
+
+
+def run_vm(client):
+    """Run nutanix_vm and return its result without the client statistics"""
+    from ansible_collections.nutanix.nutanix.plugins.modules import nutanix_vm
+
+    try:
+        result = nutanix_vm.entry_point(client.module, client)
+    except BenchModuleExit as err:
+        result = err.result
+    return dict((key, value) for key, value in result.items() if not key.startswith("api_"))
+
+
+def check_cassette(path, mock):
+    """Return the failures of the recorded cassette file"""
+    with open(path) as f:
+        content = f.read()
+    errors = []
+    for name, value in [("username", USERNAME), ("password", PASSWORD)] + \
+            [("session id", token) for token in sorted(mock.sessions)]:
+        if value in content:
+            errors.append("cassette holds the {0} {1}".format(name, value))
+    if not mock.sessions:
+        errors.append("no session was handed out while recording")
+    for line in content.splitlines():
+        interaction = json.loads(line)
+        for key in ("request", "response"):
+            try:
+                if interaction[key]:
+                    json.loads(interaction[key])
+            except ValueError:
+                errors.append("{0} {1}: {2} body isn't JSON".format(
+                    interaction["method"], interaction["endpoint"], key))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vms", type=int, default=20, help="VMs in the mock before the runs")
+    parser.add_argument("--keep", action="store_true", help="keep the cassette file and print its path")
+    args = parser.parse_args()
+
+    ensure_collection_importable()
+    mock = MockPrismCentral(vms=args.vms, images=2, task_duration=0, ip_delay=0,
+                            username=USERNAME, password=PASSWORD)
+    url = mock.start()
+    directory = tempfile.mkdtemp(prefix="nutanix-cassette-")
+    path = os.path.join(directory, "cassette.jsonl")
+    params = vm_params(mock, disks=2, nics=1, name="cassette-vm", pc_username=USERNAME, pc_password=PASSWORD,
+                       cassette_path=path, cassette_mode="record")
+    steps = [
+        ("create", params),
+        ("update", dict(params, memory=params["memory"] * 2)),
+        ("poweroff", dict(params, memory=params["memory"] * 2, state="poweroff")),
+    ]
+
+    errors = []
+    try:
+        recorded = [run_vm(http_client(url, **copy.deepcopy(step_params))) for name, step_params in steps]
+        for (name, step_params), result in zip(steps, recorded):
+            if result.get("failed") or not result.get("changed"):
+                errors.append("{0}: recorded run didn't change the VM: {1}".format(name, result.get("msg")))
+        errors.extend(check_cassette(path, mock))
+    finally:
+        mock.stop()
+
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_cassette import scrubbed
+
+    calls = sum(mock.calls.values())
+    for (name, step_params), result in zip(steps, recorded):
+        # The replay client keeps the pc_hostname API base, nothing listens there
+        client = create_client(BenchModule(**dict(copy.deepcopy(step_params), cassette_mode="replay")))
+        replayed = run_vm(client)
+        # Replayed responses hold the scrubbed username, e.g. as VM owner
+        result = json.loads(json.dumps(result).replace(USERNAME, scrubbed))
+        if replayed != result:
+            errors.append("{0}: replayed result {1} differs from recorded {2}".format(name, replayed, result))
+    if sum(mock.calls.values()) != calls:
+        errors.append("replayed runs sent {0} requests to the server".format(sum(mock.calls.values()) - calls))
+
+    print("{0} runs recorded and replayed: {1}".format(len(steps), "FAILED" if errors else "ok"))
+    for error in errors[:10]:
+        print("  " + error)
+    if args.keep:
+        print("cassette kept as {0}".format(path))
+    else:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
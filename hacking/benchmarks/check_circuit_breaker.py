@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Shared circuit breaker check
+
+Runs clients sharing one circuit breaker state file, like the forks of a
+playbook run, against the mock HTTP server:
+
+    python hacking/benchmarks/check_circuit_breaker.py --clients 6 --threshold 5
+
+Scenarios:
+
+    throttled   two concurrent 429s with Retry-After per client, then 200s:
+                every client succeeds and the breaker stays closed
+    tripped     --threshold 503s to a single client: the request that opens
+                the breaker still succeeds on its retries
+    shared      a client opens the breaker, one created earlier then fails
+                fast without sending its request
+    reset       a client fails once, one created earlier succeeds and resets
+                the shared failure count
+
+The check fails when a scenario doesn't end as described.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+from common import BenchModuleExit, MockPrismCentral, ensure_collection_importable, http_client
+
+
+def get_vm(client, vm_uuid):
+    """Return None if the VM was read, else the failure message"""
+    try:
+        client.request("v3/vms/{0}".format(vm_uuid), "GET", None).json()
+    except BenchModuleExit as err:
+        return err.result["msg"]
+    return None
+
+
+def get_vm_concurrently(clients, vm_uuid):
+    """Get the VM from all clients at once and return their failure messages"""
+    barrier = threading.Barrier(len(clients))
+    results = [None] * len(clients)
+
+    def worker(index):
+        barrier.wait()
+        results[index] = get_vm(clients[index], vm_uuid)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(len(clients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run(name, mock, url, args):
+    """
+    This routine helps to run one scenario with a fresh breaker state file
+    Returns:
+        (list): failures of the scenario
+    """
+    # The breaker state lives under ~/.ansible/tmp
+    home = tempfile.mkdtemp(prefix="nutanix-breaker-home-")
+    os.environ["HOME"] = home
+    vm_uuid = sorted(mock.entities["vms"])[0]
+    errors = []
+
+    def new_client(**params):
+        return http_client(url, circuit_breaker_threshold=args.threshold, retry_backoff=0.01, **params)
+
+    try:
+        if name == "throttled":
+            clients = [new_client() for index in range(args.clients)]
+            mock.queue_faults(429, 2 * args.clients, {"Retry-After": "0.1"})
+            for index, msg in enumerate(get_vm_concurrently(clients, vm_uuid)):
+                if msg is not None:
+                    errors.append("client {0}: {1}".format(index, msg))
+        elif name == "tripped":
+            client = new_client(retries=args.threshold)
+            mock.queue_faults(503, args.threshold)
+            msg = get_vm(client, vm_uuid)
+            if msg is not None:
+                errors.append("tripping request: {0}".format(msg))
+        elif name == "shared":
+            waiting = new_client()
+            client = new_client(retries=args.threshold - 1)
+            mock.queue_faults(503, args.threshold)
+            if get_vm(client, vm_uuid) is None:
+                errors.append("request failing {0} times succeeded".format(args.threshold))
+            calls = sum(mock.calls.values())
+            msg = get_vm(waiting, vm_uuid)
+            if msg is None or not msg.startswith("Request not sent"):
+                errors.append("client created earlier didn't fail fast: {0}".format(msg))
+            if sum(mock.calls.values()) != calls:
+                errors.append("client created earlier sent its request to an open breaker")
+        elif name == "reset":
+            waiting = new_client()
+            client = new_client(retries=0)
+            mock.queue_faults(503, 1)
+            get_vm(client, vm_uuid)
+            msg = get_vm(waiting, vm_uuid)
+            if msg is not None:
+                errors.append("client created earlier: {0}".format(msg))
+            state = waiting.circuit_breaker._read()
+            if state["failures"] or state["open_until"]:
+                errors.append("shared state not reset: {0}".format(state))
+
+        clients = [new_client() for index in range(args.clients)]
+        if name != "shared":
+            for index, msg in enumerate(get_vm_concurrently(clients, vm_uuid)):
+                if msg is not None:
+                    errors.append("client {0} after the scenario: {1}".format(index, msg))
+    finally:
+        mock.queued_faults.clear()
+        shutil.rmtree(home, ignore_errors=True)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=6, help="clients sharing the breaker state")
+    parser.add_argument("--threshold", type=int, default=5, help="circuit_breaker_threshold of the clients")
+    parser.add_argument("--scenario", nargs="+", default=["throttled", "tripped", "shared", "reset"],
+                        choices=["throttled", "tripped", "shared", "reset"])
+    args = parser.parse_args()
+
+    ensure_collection_importable()
+    mock = MockPrismCentral(vms=10, images=0)
+    url = mock.start()
+    failed = False
+    try:
+        for name in args.scenario:
+            errors = run(name, mock, url, args)
+            failed = failed or bool(errors)
+            print("{0}: {1}".format(name, "FAILED" if errors else "ok"))
+            for error in errors[:10]:
+                print("  " + error)
+    finally:
+        mock.stop()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Tasks list batching check of wait_for_tasks
+
+Waits on --tasks tasks of an in-process MockPrismCentral on a simulated
+clock, with task completions spread over several polling rounds:
+
+    python hacking/benchmarks/check_task_batching.py --tasks 1 100 101 250 500
+
+The check fails when a polling round with N tasks still pending sends other
+than ceil(N / task_list_batch) v3/tasks/list calls, when a task is fetched on
+its own, or when a task isn't reported exactly once with its status.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import sys
+
+from common import MockPrismCentral, ensure_collection_importable, in_process_client
+
+LIST_CALL = "POST v3/tasks/list"
+GET_CALL = "GET v3/tasks/{uuid}"
+
+
+def run(count, args):
+    """
+    This routine helps to wait on count tasks and check the calls of every polling round
+    Args:
+        count(int): number of tasks
+        args(obj): parsed arguments
+    Returns:
+        (tuple): (number of polling rounds, list of failures)
+    """
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import (
+        task_list_batch,
+        wait_for_tasks
+    )
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_clock import NutanixSimulatedClock
+
+    # (list calls so far, tasks reported so far) at the end of every polling round
+    rounds = []
+    reported = {}
+
+    class RoundClock(NutanixSimulatedClock):
+        def sleep(self, seconds, reason=None):
+            if reason == "task_poll":
+                rounds.append((mock.calls[LIST_CALL], len(reported)))
+            super(RoundClock, self).sleep(seconds, reason)
+
+    clock = RoundClock()
+    mock = MockPrismCentral(vms=0, images=0, task_duration=args.task_duration,
+                            task_failure_rate=0.1, seed=count, clock=clock.time, sleep=clock.sleep)
+    # Tasks created earlier finish earlier, so fewer are pending every round
+    task_uuids = []
+    for index in range(count):
+        clock.now = args.task_duration * index / count
+        task_uuids.append(mock.create_task("noop", "vm", mock.new_uuid()))
+    clock.now = args.task_duration
+    client = in_process_client(mock, clock=clock, task_poll_interval=args.task_poll_interval,
+                               task_poll_max_interval=args.task_poll_interval)
+
+    mock.calls.clear()
+    for task_uuid, error in wait_for_tasks(task_uuids, client):
+        reported[task_uuid] = error
+    rounds.append((mock.calls[LIST_CALL], len(reported)))
+
+    errors = []
+    previous_calls, previous_reported = 0, 0
+    for index, (calls, done) in enumerate(rounds):
+        pending = count - previous_reported
+        expected = (pending + task_list_batch - 1) // task_list_batch
+        if calls - previous_calls != expected:
+            errors.append("round {0}: {1} tasks pending, {2} tasks list calls, expected {3}".format(
+                index + 1, pending, calls - previous_calls, expected))
+        previous_calls, previous_reported = calls, done
+    if mock.calls[GET_CALL]:
+        errors.append("{0} tasks fetched on their own".format(mock.calls[GET_CALL]))
+    if sorted(reported) != sorted(task_uuids):
+        errors.append("{0} of {1} tasks reported".format(len(reported), count))
+    for task_uuid, error in reported.items():
+        if (error is not None) != mock.tasks[task_uuid]["_fails"]:
+            errors.append("task {0}: wrong status {1}".format(task_uuid, error))
+    return len(rounds), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, nargs="+", default=[1, 100, 101, 250, 500],
+                        help="number of tasks to wait on, per run")
+    parser.add_argument("--task-duration", type=float, default=20.0, help="simulated seconds a task takes")
+    parser.add_argument("--task-poll-interval", type=float, default=2.0)
+    args = parser.parse_args()
+
+    ensure_collection_importable()
+    failed = False
+    for count in args.tasks:
+        rounds, errors = run(count, args)
+        failed = failed or bool(errors)
+        print("{0:>5} tasks: {1:>2} rounds  {2}".format(count, rounds, "FAILED" if errors else "ok"))
+        for error in errors[:10]:
+            print("  " + error)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
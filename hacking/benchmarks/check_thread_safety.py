@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Shared NutanixApiClient stress check
+
+Sends --requests VM list and get requests per thread from --threads threads
+through one client to the mock HTTP server, which fails a share of them
+with a retryable 503 and drops all sessions a few times during the run:
+
+    python hacking/benchmarks/check_thread_safety.py --threads 16 --pool-maxsize 4 16
+
+The check fails when a thread gets an error or a wrong entity, or when the
+client statistics don't add up: every recorded error must have been retried
+exactly once and every request must be counted. Requests per second are
+reported per pool size.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+from common import MockPrismCentral, ensure_collection_importable, http_client
+
+
+def worker(client, vm_uuids, index, requests, errors):
+    """Alternate list and get requests, checking that every response is the one asked for"""
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import list_entities
+
+    try:
+        for count in range(requests):
+            if count % 2:
+                vm_uuid = vm_uuids[(index * requests + count) % len(vm_uuids)]
+                vm = client.request("v3/vms/{0}".format(vm_uuid), "GET", None).json()
+                if vm["metadata"]["uuid"] != vm_uuid:
+                    errors.append("thread {0} got {1} for {2}".format(index, vm["metadata"]["uuid"], vm_uuid))
+            else:
+                offset = (index * 7 + count) % 50 * 20
+                page = list_entities("vms", {"offset": offset, "length": 20}, client)
+                if page["metadata"]["offset"] != offset:
+                    errors.append("thread {0} got offset {1} for {2}".format(index, page["metadata"]["offset"], offset))
+    except BaseException as err:
+        errors.append("thread {0}: {1!r}".format(index, err))
+
+
+def run(args, pool_maxsize):
+    """
+    This routine helps to run the check for one pool size
+    Returns:
+        (dict): requests per second and consistency errors
+    """
+    mock = MockPrismCentral(vms=1000, images=0, error_rate=args.error_rate, error_codes=(503,),
+                            latency=args.latency, seed=args.seed)
+    url = mock.start()
+    client = http_client(url, api_stats=True, retries=10, retry_backoff=0.001,
+                         pool_maxsize=pool_maxsize, pool_block=args.pool_block)
+    vm_uuids = sorted(mock.entities["vms"])
+    errors = []
+    threads = [threading.Thread(target=worker, args=(client, vm_uuids, index, args.requests, errors))
+               for index in range(args.threads)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    # Expire all sessions a few times while the threads run
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.05)
+        with mock.lock:
+            mock.sessions.clear()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    mock.stop()
+
+    summary = client.api_stats.summary()
+    failed_attempts = sum(endpoint["errors"] for endpoint in summary["endpoints"].values())
+    expected = args.threads * args.requests
+    if summary["calls"] != expected + failed_attempts:
+        errors.append("{0} requests recorded, expected {1} plus {2} failed attempts".format(
+            summary["calls"], expected, failed_attempts))
+    if client.retry_stats["retries"] != failed_attempts:
+        errors.append("{0} retries counted for {1} failed attempts".format(
+            client.retry_stats["retries"], failed_attempts))
+    return {
+        "pool_maxsize": pool_maxsize,
+        "requests_per_second": expected / elapsed,
+        "retries": client.retry_stats["retries"],
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=100, help="requests per thread")
+    parser.add_argument("--pool-maxsize", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--pool-block", action="store_true", help="wait for a pooled connection instead of opening more")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the reports to this file")
+    args = parser.parse_args()
+
+    ensure_collection_importable()
+    reports = []
+    for pool_maxsize in args.pool_maxsize:
+        report = run(args, pool_maxsize)
+        reports.append(report)
+        print("pool_maxsize={pool_maxsize}: {requests_per_second:.0f} requests/s, {retries} retries".format(**report))
+        for error in report["errors"][:10]:
+            print("  FAILED " + error)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    return 1 if any(report["errors"] for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
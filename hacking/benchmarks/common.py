@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Shared helpers of the benchmark scripts"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import os
+import sys
+import tempfile
+
+HACKING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLLECTION_DIR = os.path.dirname(HACKING_DIR)
+sys.path.insert(0, HACKING_DIR)
+
+from mock_prism_central import MockApiError, MockPrismCentral  # noqa: E402
+
+DEFAULT_PARAMS = dict(
+    pc_hostname="127.0.0.1",
+    pc_username="admin",
+    pc_password="nutanix/4u",
+    pc_port="9440",
+    validate_certs=False,
+    session_cache=False,
+    name_cache=False,
+    retries=3,
+    retry_backoff=0.01,
+    circuit_breaker_threshold=0,
+    task_poll_interval=0.5,
+    task_poll_max_interval=10,
+)
+
+
+def ensure_collection_importable():
+    """
+    Make ansible_collections.nutanix.nutanix importable from this checkout
+    The checkout is linked into a temporary ansible_collections tree unless it
+    already lives in one.
+    Returns:
+        (str): directory holding the ansible_collections tree
+    """
+    parts = COLLECTION_DIR.split(os.sep)
+    if parts[-3:-2] == ["ansible_collections"]:
+        root = os.sep.join(parts[:-3])
+    else:
+        root = tempfile.mkdtemp(prefix="nutanix-bench-")
+        namespace_dir = os.path.join(root, "ansible_collections", "nutanix")
+        os.makedirs(namespace_dir)
+        os.symlink(COLLECTION_DIR, os.path.join(namespace_dir, "nutanix"))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    return root
+
+
+class BenchModuleExit(Exception):
+    """Raised instead of exiting the process by BenchModule"""
+
+    def __init__(self, result):
+        super(BenchModuleExit, self).__init__(result.get("msg"))
+        self.result = result
+
+
+class BenchModule(object):
+    """Minimal AnsibleModule stand-in used to drive module code in-process"""
+
+    def __init__(self, **params):
+        self.params = dict(DEFAULT_PARAMS, **params)
+        self.check_mode = False
+        self.warnings = []
+
+    def warn(self, warning):
+        self.warnings.append(warning)
+
+    def fail_json(self, msg=None, **kwargs):
+        raise BenchModuleExit(dict(kwargs, msg=msg, failed=True))
+
+    def exit_json(self, **kwargs):
+        raise BenchModuleExit(kwargs)
+
+
+class InProcessResponse(object):
+    """requests.Response look-alike returned by InProcessSession"""
+
+    def __init__(self, status_code, content, headers):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.content = content
+        self.text = content.decode("utf-8")
+        self.headers = headers
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class InProcessSession(object):
+    """
+    requests.Session look-alike that dispatches to a MockPrismCentral without HTTP
+    Authentication and cookies are skipped, everything else goes through the
+    mock request handling including fault injection.
+    """
+
+    def __init__(self, mock):
+        self.mock = mock
+        self.cookies = {}
+        self.headers = {}
+
+    def request(self, method, url, data=None, **kwargs):
+        path = url.split("/api/nutanix/", 1)[1]
+        headers = {"Content-Type": "application/json"}
+        if self.mock.latency or self.mock.latency_jitter:
+            self.mock.sleep(self.mock.latency + self.mock.random.uniform(0, self.mock.latency_jitter))
+        try:
+            with self.mock.lock:
+                body = json.loads(data) if data else None
+                status, response = self.mock.handle(method, path, body)
+        except MockApiError as err:
+            headers.update(err.headers)
+            status, response = err.status, {"state": "ERROR", "message_list": [{"message": err.message}]}
+        return InProcessResponse(status, json.dumps(response).encode("utf-8"), headers)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request("POST", url, data=data, **kwargs)
+
+    def mount(self, prefix, adapter):
+        pass
+
+
+def create_client(module, clock=None):
+    """
+    This routine helps to create a NutanixApiClient the way nutanix_vm does
+    The name cache and adaptive paging are set up as params ask.
+    Args:
+        module(obj): BenchModule
+        clock(obj): NutanixClock of the client
+    Returns:
+        client(obj): NutanixApiClient
+    """
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import NutanixApiClient
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_name_cache import use_name_cache
+    from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_page_tuner import use_adaptive_paging
+
+    client = NutanixApiClient(module, clock=clock)
+    use_name_cache(client)
+    use_adaptive_paging(client)
+    return client
+
+
+def in_process_client(mock, clock=None, **params):
+    """
+    This routine helps to create a NutanixApiClient wired to a mock without HTTP
+    Args:
+        mock(obj): MockPrismCentral
+        clock(obj): NutanixClock of the client, e.g. the NutanixSimulatedClock driving the mock
+        params(dict): module params overriding DEFAULT_PARAMS
+    Returns:
+        client(obj): NutanixApiClient
+    """
+    client = create_client(BenchModule(**params), clock=clock)
+    client.session = InProcessSession(mock)
+    return client
+
+
+def http_client(url, **params):
+    """
+    This routine helps to create a NutanixApiClient talking to a running mock server
+    Args:
+        url(str): base url returned by MockPrismCentral.start()
+        params(dict): module params overriding DEFAULT_PARAMS
+    Returns:
+        client(obj): NutanixApiClient
+    """
+    client = create_client(BenchModule(**params))
+    client.api_base = "{0}/api/nutanix".format(url)
+    return client
+
+
+def vm_params(mock, disks=1, nics=1, by_name=True, **overrides):
+    """
+    This routine helps to build nutanix_vm params the way AnsibleModule fills them
+    Args:
+        mock(obj): MockPrismCentral providing cluster, subnet and image references
+        disks(int): number of disks
+        nics(int): number of nics
+        by_name(bool): reference entities by name instead of uuid
+        overrides(dict): params to override
+    Returns:
+        params(dict): module params
+    """
+    def reference(api, index):
+        entities = sorted(mock.entities[api].values(), key=lambda entity: entity["spec"]["name"])
+        entity = entities[index % len(entities)]
+        if by_name:
+            return entity["spec"]["name"], None
+        return None, entity["metadata"]["uuid"]
+
+    cluster_name, cluster_uuid = reference("clusters", 0)
+    disk_list = []
+    for index in range(disks):
+        image_name, image_uuid = reference("images", index)
+        disk_list.append({
+            "uuid": None,
+            "disk_size_bytes": None,
+            "disk_size_mib": None if index == 0 else 10240 + index,
+            "storage_config": None if index == 0 else {
+                "flash_mode": None,
+                "storage_container_reference": {
+                    "uuid": None, "name": "default-container", "kind": "storage_container", "url": None},
+            },
+            "device_properties": {
+                "device_type": "DISK",
+                "disk_address": {"device_index": None, "adapter_type": "SCSI"},
+            },
+            "data_source_reference": {
+                "uuid": image_uuid, "name": image_name, "kind": "image", "url": None,
+            } if index == 0 else None,
+        })
+    nic_list = []
+    for index in range(nics):
+        subnet_name, subnet_uuid = reference("subnets", index)
+        nic_list.append({
+            "uuid": None,
+            "nic_type": "NORMAL_NIC",
+            "num_queues": None,
+            "network_function_nic_type": None,
+            "vlan_mode": "ACCESS",
+            "mac_address": None,
+            "model": None,
+            "is_connected": True,
+            "ip_endpoint_list": None,
+            "secondary_ip_address_list": None,
+            "network_function_chain_reference": None,
+            "subnet_reference": {"name": subnet_name, "kind": "subnet", "uuid": subnet_uuid},
+            "trunked_vlan_list": None,
+        })
+
+    params = dict(DEFAULT_PARAMS)
+    params.update(
+        state="present",
+        name="bench-vm",
+        vm_uuid=None,
+        cpu=2,
+        vcpu=1,
+        memory=2048,
+        cluster=cluster_uuid or cluster_name,
+        power_state="ON",
+        dry_run=False,
+        disk_list=disk_list,
+        nic_list=nic_list,
+        guest_customization=None,
+        page_length=250,
+    )
+    params.update(overrides)
+    return params
+
+
+def image_params(name, **overrides):
+    """
+    This routine helps to build nutanix_image params of a disk image downloaded from a url
+    Args:
+        name(str): image name
+        overrides(dict): params to override
+    Returns:
+        params(dict): module params
+    """
+    params = dict(
+        image_name=name,
+        image_type="DISK_IMAGE",
+        image_url="http://images.example.com/{0}.qcow2".format(name),
+        vm_disk=None,
+        vm_disk_uuid=None,
+        image_uuid=None,
+        image_description=None,
+        image_checksum=None,
+        clusters=["cluster-00"],
+        data={"offset": 0, "length": 500},
+        state="present",
+    )
+    params.update(overrides)
+    return params
+
+
+def load_baseline(path):
+    """Load a baseline file, an empty baseline if it doesn't exist yet"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError):
+        return {}
+
+
+def save_baseline(path, baseline):
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,731 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Local stand-in for the Prism Central v3 API endpoints used by this collection
+
+Serves v3/vms, v3/images, v3/clusters, v3/subnets, v3/groups (storage
+containers) and v3/tasks over HTTP(S) from synthetic in-memory entities, with
+offset pagination, FIQL filters and sorting, asynchronous tasks, gzip
+compressed responses and injectable latency, per entity and deep offset costs,
+bandwidth, errors and throttling. Run it standalone:
+
+    python hacking/mock_prism_central.py --port 9440 --vms 5000 \\
+        --certfile cert.pem --keyfile key.pem --task-duration 2
+
+or start it in-process from benchmarks with MockPrismCentral(...).start().
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import base64
+import copy
+import gzip
+import json
+import random
+import re
+import ssl
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+API_PREFIX = "/api/nutanix/"
+SESSION_COOKIE = "NTNX_IGW_SESSION"
+UUID_PATTERN = "[0-9a-fA-F-]{36}"
+FIQL_PATTERN = re.compile(r"^([A-Za-z_.]+)(==|!=|=gt=|=ge=|=lt=|=le=)(.*)$")
+# Responses smaller than this are sent uncompressed, like most web servers do
+GZIP_MIN_BYTES = 1024
+# FIQL attributes that differ from the entity name path
+FIQL_ATTRIBUTES = {"vm_name": "name"}
+
+
+def format_time(timestamp):
+    """Format a timestamp the way PC formats task times"""
+    return datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def fiql_match(entity_value, operator, value):
+    """Compare an entity attribute with a FIQL operand"""
+    if operator == "==":
+        return entity_value == value
+    if operator == "!=":
+        return entity_value != value
+    if entity_value is None:
+        return False
+    if operator == "=gt=":
+        return entity_value > value
+    if operator == "=ge=":
+        return entity_value >= value
+    if operator == "=lt=":
+        return entity_value < value
+    return entity_value <= value
+
+
+def fiql_filter(expression, get_attribute):
+    """
+    Build a predicate from a FIQL expression, ',' is OR and ';' is AND
+    Args:
+        expression(str): FIQL filter
+        get_attribute(func): callable returning the value of an attribute of an entity
+    Returns:
+        (func): predicate taking an entity
+    """
+    if not expression:
+        return lambda entity: True
+
+    clauses = []
+    for or_clause in expression.split(","):
+        terms = []
+        for term in or_clause.split(";"):
+            match = FIQL_PATTERN.match(term.strip())
+            if not match:
+                raise ValueError("Invalid filter '{0}'".format(term))
+            attribute, operator, value = match.groups()
+            terms.append((FIQL_ATTRIBUTES.get(attribute, attribute), operator, value))
+        clauses.append(terms)
+
+    def predicate(entity):
+        return any(all(fiql_match(get_attribute(entity, attribute), operator, value)
+                       for attribute, operator, value in terms)
+                   for terms in clauses)
+    return predicate
+
+
+class MockApiError(Exception):
+    """Error response of the mock API"""
+
+    def __init__(self, status, message, headers=None):
+        super(MockApiError, self).__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class MockPrismCentral(object):
+    """
+    In-memory Prism Central v3 API
+
+    Args:
+        vms(int): number of synthetic VMs
+        images(int): number of synthetic images
+        clusters(int): number of synthetic clusters
+        subnets(int): number of synthetic subnets
+        storage_containers(int): number of storage containers per cluster
+        task_duration(float): seconds a task takes to complete
+        ip_delay(float): seconds after power on until a VM reports an IP
+        latency(float): seconds added to every response
+        latency_jitter(float): random seconds added on top of latency
+        scan_latency(float): seconds added to list responses per entity skipped by the offset,
+            like PC walking past the earlier pages
+        entity_latency(float): seconds added to list responses per entity returned
+        error_rate(float): fraction of requests failing with a 500/503
+        error_codes(tuple): status codes of the failing requests
+        task_failure_rate(float): fraction of tasks ending as FAILED
+        throttle_rps(float): requests per second above which 429 is returned, 0 disables
+        max_length(int): maximum page length accepted by list calls
+        compression(bool): gzip HTTP responses of clients accepting it
+        bandwidth(float): HTTP response bytes per second shared by all connections, 0 disables the limit
+        username(str): accepted username
+        password(str): accepted password
+        seed(int): random seed for reproducible data and faults
+        clock(func): callable returning the current time in seconds
+        sleep(func): callable used to inject latency
+    """
+
+    def __init__(self, vms=100, images=10, clusters=2, subnets=4, storage_containers=2,
+                 task_duration=1.0, ip_delay=1.0, latency=0.0, latency_jitter=0.0,
+                 scan_latency=0.0, entity_latency=0.0,
+                 error_rate=0.0, error_codes=(500, 503), task_failure_rate=0.0, throttle_rps=0, max_length=500,
+                 compression=True, bandwidth=0,
+                 username="admin", password="nutanix/4u", seed=0,
+                 clock=time.time, sleep=time.sleep):
+        self.task_duration = task_duration
+        self.ip_delay = ip_delay
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.scan_latency = scan_latency
+        self.entity_latency = entity_latency
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.task_failure_rate = task_failure_rate
+        self.throttle_rps = throttle_rps
+        self.max_length = max_length
+        self.compression = compression
+        self.bandwidth = bandwidth
+        # Time at which the simulated link finished sending the queued responses
+        self.link_free_at = 0
+        self.link_lock = threading.Lock()
+        self.credentials = (username, password)
+        self.clock = clock
+        self.sleep = sleep
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.sessions = set()
+        self.calls = Counter()
+        self.throttle_window = (0, 0)
+        # (status, headers) of the next requests to fail, see queue_faults
+        self.queued_faults = deque()
+        self.server = None
+        self.thread = None
+
+        self.entities = {"vms": {}, "images": {}, "clusters": {}, "subnets": {}}
+        self.storage_containers = {}
+        self.tasks = {}
+        # vm_uuid : time the VM was powered on, used to hand out IPs
+        self.power_on_times = {}
+        self.populate(vms, images, clusters, subnets, storage_containers)
+
+    # Synthetic data
+
+    def new_uuid(self):
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def populate(self, vms, images, clusters, subnets, storage_containers):
+        """Generate synthetic entities"""
+        for index in range(clusters):
+            cluster_uuid = self.new_uuid()
+            name = "cluster-{0:02d}".format(index)
+            self.entities["clusters"][cluster_uuid] = {
+                "metadata": {"kind": "cluster", "uuid": cluster_uuid},
+                "spec": {"name": name},
+                "status": {"name": name, "state": "COMPLETE"},
+            }
+            for sc_index in range(storage_containers):
+                sc_name = "default-container" if sc_index == 0 else "container-{0:02d}".format(sc_index)
+                self.storage_containers[self.new_uuid()] = {"name": sc_name, "cluster": cluster_uuid}
+
+        cluster_uuids = sorted(self.entities["clusters"])
+        for index in range(subnets):
+            subnet_uuid = self.new_uuid()
+            name = "vlan.{0}".format(index)
+            self.entities["subnets"][subnet_uuid] = {
+                "metadata": {"kind": "subnet", "uuid": subnet_uuid},
+                "spec": {"name": name, "resources": {"vlan_id": index}},
+                "status": {"name": name, "state": "COMPLETE", "resources": {"vlan_id": index}},
+            }
+
+        for index in range(images):
+            self.add_image({
+                "name": "image-{0:04d}".format(index),
+                "description": "",
+                "resources": {"image_type": "DISK_IMAGE" if index % 4 else "ISO_IMAGE"},
+            })
+
+        subnet_uuids = sorted(self.entities["subnets"])
+        for index in range(vms):
+            spec = {
+                "name": "vm-{0:06d}".format(index),
+                "cluster_reference": {"kind": "cluster", "uuid": cluster_uuids[index % len(cluster_uuids)]}
+                if cluster_uuids else {},
+                "resources": {
+                    "num_sockets": 1 + index % 4,
+                    "num_vcpus_per_socket": 1,
+                    "memory_size_mib": 1024 * (1 + index % 8),
+                    "power_state": "ON" if index % 5 else "OFF",
+                    "disk_list": [{
+                        "device_properties": {"device_type": "DISK",
+                                              "disk_address": {"device_index": 0, "adapter_type": "SCSI"}},
+                        "disk_size_mib": 10240,
+                    }],
+                    "nic_list": [{
+                        "nic_type": "NORMAL_NIC",
+                        "subnet_reference": {"kind": "subnet", "uuid": subnet_uuids[index % len(subnet_uuids)]},
+                    }] if subnet_uuids else [],
+                },
+            }
+            vm_uuid = self.add_vm(spec)
+            if spec["resources"]["power_state"] == "ON":
+                # Pre-existing VMs already have their IP
+                self.power_on_times[vm_uuid] = float("-inf")
+
+    def add_vm(self, spec, vm_uuid=None):
+        vm_uuid = vm_uuid or self.new_uuid()
+        spec = copy.deepcopy(spec)
+        resources = spec.setdefault("resources", {})
+        for disk in resources.setdefault("disk_list", []):
+            disk.setdefault("uuid", self.new_uuid())
+            if "data_source_reference" in disk and "disk_size_mib" not in disk:
+                disk["disk_size_mib"] = 4096
+        for nic in resources.setdefault("nic_list", []):
+            nic.setdefault("uuid", self.new_uuid())
+            nic.setdefault("mac_address", "50:6b:8d:{0:02x}:{1:02x}:{2:02x}".format(
+                *[self.random.randint(0, 255) for i in range(3)]))
+        self.entities["vms"][vm_uuid] = {
+            "metadata": {"kind": "vm", "uuid": vm_uuid, "spec_version": 0, "entity_version": "1"},
+            "spec": spec,
+        }
+        if resources.get("power_state") == "ON":
+            self.power_on_times[vm_uuid] = self.clock()
+        return vm_uuid
+
+    def add_image(self, spec, image_uuid=None):
+        image_uuid = image_uuid or self.new_uuid()
+        self.entities["images"][image_uuid] = {
+            "metadata": {"kind": "image", "uuid": image_uuid, "spec_version": 0},
+            "spec": copy.deepcopy(spec),
+        }
+        return image_uuid
+
+    # Entity views
+
+    def render(self, api, entity):
+        """Return the API representation of a stored entity"""
+        entity = copy.deepcopy(entity)
+        if api == "vms":
+            self.render_vm_status(entity)
+        elif api == "images":
+            entity["status"] = dict(copy.deepcopy(entity["spec"]), state="COMPLETE")
+        return entity
+
+    def render_vm_status(self, vm):
+        spec = vm["spec"]
+        status = copy.deepcopy(spec)
+        status["state"] = "COMPLETE"
+        cluster_uuid = spec.get("cluster_reference", {}).get("uuid")
+        cluster = self.entities["clusters"].get(cluster_uuid)
+        if cluster:
+            status["cluster_reference"] = {"kind": "cluster", "uuid": cluster_uuid,
+                                           "name": cluster["status"]["name"]}
+        resources = status["resources"]
+        powered_on_at = self.power_on_times.get(vm["metadata"]["uuid"])
+        has_ip = (resources.get("power_state") == "ON" and powered_on_at is not None and
+                  self.clock() >= powered_on_at + self.ip_delay)
+        for index, nic in enumerate(resources.get("nic_list", [])):
+            nic.setdefault("nic_type", "NORMAL_NIC")
+            endpoints = nic.get("ip_endpoint_list") or [{"type": "ASSIGNED"}]
+            for endpoint in endpoints:
+                endpoint.setdefault("type", "ASSIGNED")
+                if not endpoint.get("ip"):
+                    endpoint["ip"] = "10.{0}.{1}.{2}".format(
+                        index, int(vm["metadata"]["uuid"][:2], 16), int(vm["metadata"]["uuid"][2:4], 16) or 1
+                    ) if has_ip else ""
+            nic["ip_endpoint_list"] = endpoints if has_ip else []
+        vm["status"] = status
+
+    def get_attribute(self, entity, attribute):
+        if attribute in ("uuid", "metadata.uuid"):
+            return entity.get("uuid") or entity["metadata"]["uuid"]
+        if attribute == "name":
+            return entity["spec"].get("name")
+        value = entity
+        for key in attribute.split("."):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
+
+    # Tasks
+
+    def create_task(self, operation, entity_kind, entity_uuid, effect=None):
+        """Create a task completing after task_duration, effect runs on success"""
+        task_uuid = self.new_uuid()
+        now = self.clock()
+        self.tasks[task_uuid] = {
+            "uuid": task_uuid,
+            "operation_type": operation,
+            "entity_reference_list": [{"kind": entity_kind, "uuid": entity_uuid}],
+            "creation_time": format_time(now),
+            "start_time": format_time(now),
+            "_created": now,
+            "_fails": self.random.random() < self.task_failure_rate,
+            "_effect": effect,
+        }
+        return task_uuid
+
+    def render_task(self, task):
+        now = self.clock()
+        elapsed = now - task["_created"]
+        rendered = dict((key, value) for key, value in task.items() if not key.startswith("_"))
+        if elapsed >= self.task_duration:
+            if task["_effect"] is not None and not task["_fails"]:
+                task["_effect"]()
+                task["_effect"] = None
+            done_at = task["_created"] + self.task_duration
+            rendered.update(percentage_complete=100, completion_time=format_time(done_at),
+                            last_update_time=format_time(done_at))
+            if task["_fails"]:
+                rendered.update(status="FAILED", error_code="500",
+                                error_detail="Injected task failure for {0}".format(task["operation_type"]))
+            else:
+                rendered["status"] = "SUCCEEDED"
+        else:
+            percentage = int(100 * elapsed / self.task_duration) if self.task_duration else 0
+            rendered.update(status="RUNNING" if percentage else "QUEUED", percentage_complete=percentage,
+                            last_update_time=format_time(now))
+        return rendered
+
+    # Request handling
+
+    def get_transfer_delay(self, size):
+        """Return the seconds until a response of size bytes has passed the shared link"""
+        with self.link_lock:
+            now = self.clock()
+            self.link_free_at = max(now, self.link_free_at) + size / float(self.bandwidth)
+            return self.link_free_at - now
+
+    def queue_faults(self, status, count=1, headers=None):
+        """Fail the next count API requests with status, sending headers such as Retry-After"""
+        with self.lock:
+            self.queued_faults.extend([(status, dict(headers or {}))] * count)
+
+    def check_faults(self, method, path):
+        """Raise injected throttling and error responses"""
+        if self.queued_faults:
+            status, headers = self.queued_faults.popleft()
+            raise MockApiError(status, "Injected error", headers)
+        if self.throttle_rps:
+            second = int(self.clock())
+            window_second, count = self.throttle_window
+            count = count + 1 if window_second == second else 1
+            self.throttle_window = (second, count)
+            if count > self.throttle_rps:
+                raise MockApiError(429, "Too many requests", {"Retry-After": "1"})
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise MockApiError(self.random.choice(self.error_codes), "Injected error")
+
+    def authenticate(self, headers, cookies):
+        """Return a new session token for valid basic credentials, raise 401 otherwise"""
+        if cookies.get(SESSION_COOKIE) in self.sessions:
+            return None
+        authorization = headers.get("Authorization") or ""
+        if authorization.startswith("Basic "):
+            username, sep, password = base64.b64decode(authorization[6:]).decode("utf-8").partition(":")
+            if (username, password) == self.credentials:
+                token = uuid.uuid4().hex
+                self.sessions.add(token)
+                return token
+        raise MockApiError(401, "Authentication required")
+
+    def handle(self, method, path, body):
+        """
+        Dispatch an API request
+        Args:
+            method(str): http method
+            path(str): path below /api/nutanix/
+            body(dict): decoded json body
+        Returns:
+            (tuple): (status, json response)
+        """
+        self.calls["{0} {1}".format(method, re.sub(UUID_PATTERN, "{uuid}", path))] += 1
+        self.check_faults(method, path)
+
+        match = re.match(r"^v3/(vms|images|clusters|subnets|tasks)/list$", path)
+        if match and method == "POST":
+            return 200, self.list(match.group(1), body or {})
+        if path == "v3/groups" and method == "POST":
+            return 200, self.groups(body or {})
+        match = re.match(r"^v3/tasks/({0})$".format(UUID_PATTERN), path)
+        if match and method == "GET":
+            task = self.tasks.get(match.group(1))
+            if task is None:
+                raise MockApiError(404, "Task not found")
+            return 200, self.render_task(task)
+        match = re.match(r"^v3/(vms|images)$", path)
+        if match and method == "POST":
+            return 202, self.create(match.group(1), body)
+        match = re.match(r"^v3/(vms|images|clusters|subnets)/({0})$".format(UUID_PATTERN), path)
+        if match:
+            api, entity_uuid = match.groups()
+            entity = self.entities[api].get(entity_uuid)
+            if entity is None:
+                raise MockApiError(404, "Entity {0} not found".format(entity_uuid))
+            if method == "GET":
+                return 200, self.render(api, entity)
+            if method == "PUT" and api in ("vms", "images"):
+                return 202, self.update(api, entity, body)
+            if method == "DELETE" and api in ("vms", "images"):
+                return 202, self.delete(api, entity_uuid)
+        if path == "v3/users/me" and method == "GET":
+            return 200, {"status": {"name": self.credentials[0]}}
+        raise MockApiError(404, "Unknown endpoint {0} {1}".format(method, path))
+
+    def list(self, api, body):
+        length = body.get("length") or 20
+        offset = body.get("offset") or 0
+        if length > self.max_length:
+            raise MockApiError(422, "length must be <= {0}".format(self.max_length))
+        try:
+            predicate = fiql_filter(body.get("filter"), self.get_attribute)
+        except ValueError as err:
+            raise MockApiError(400, str(err))
+
+        if api == "tasks":
+            matches = [task for task in map(self.render_task, self.tasks.values()) if predicate(task)]
+        else:
+            matches = [entity for entity in self.entities[api].values() if predicate(entity)]
+            sort_attribute = body.get("sort_attribute")
+            if sort_attribute:
+                sort_attribute = FIQL_ATTRIBUTES.get(sort_attribute, sort_attribute)
+                matches.sort(key=lambda entity: self.get_attribute(entity, sort_attribute) or "",
+                             reverse=body.get("sort_order") == "DESCENDING")
+        page = matches[offset:offset + length]
+        if api != "tasks":
+            page = [self.render(api, entity) for entity in page]
+        return {
+            "api_version": "3.1",
+            "metadata": {"kind": api[:-1], "total_matches": len(matches), "length": len(page), "offset": offset},
+            "entities": page,
+        }
+
+    def groups(self, body):
+        if body.get("entity_type") != "storage_container":
+            raise MockApiError(400, "Unsupported entity_type {0}".format(body.get("entity_type")))
+        offset = body.get("group_member_offset") or 0
+        count = body.get("group_member_count") or 20
+
+        def get_attribute(item, attribute):
+            return item[1].get({"container_name": "name"}.get(attribute, attribute))
+
+        try:
+            predicate = fiql_filter(body.get("filter_criteria"), get_attribute)
+        except ValueError as err:
+            raise MockApiError(400, str(err))
+        matches = [item for item in sorted(self.storage_containers.items()) if predicate(item)]
+        results = [{
+            "entity_id": sc_uuid,
+            "data": [
+                {"name": "cluster", "values": [{"values": [sc["cluster"]]}]},
+                {"name": "container_name", "values": [{"values": [sc["name"]]}]},
+            ],
+        } for sc_uuid, sc in matches[offset:offset + count]]
+        return {
+            "entity_type": "storage_container",
+            "filtered_entity_count": len(matches),
+            "total_entity_count": len(matches),
+            "group_results": [{"entity_results": results, "total_entity_count": len(matches)}],
+        }
+
+    def create(self, api, body):
+        if not body or "spec" not in body:
+            raise MockApiError(400, "spec is required")
+        entity_uuid = self.new_uuid()
+        if api == "vms":
+            self.add_vm(body["spec"], entity_uuid)
+        else:
+            self.add_image(body["spec"], entity_uuid)
+        # Like PC, the user creating an entity owns it
+        owner_reference = {"kind": "user", "name": self.credentials[0],
+                           "uuid": str(uuid.uuid5(uuid.NAMESPACE_OID, self.credentials[0]))}
+        self.entities[api][entity_uuid]["metadata"]["owner_reference"] = owner_reference
+        task_uuid = self.create_task("create_" + api[:-1], api[:-1], entity_uuid)
+        return {
+            "spec": body["spec"],
+            "metadata": dict(body.get("metadata") or {}, uuid=entity_uuid, owner_reference=owner_reference),
+            "status": {"state": "PENDING", "execution_context": {"task_uuid": task_uuid}},
+        }
+
+    def update(self, api, entity, body):
+        if not body or "spec" not in body:
+            raise MockApiError(400, "spec is required")
+        metadata = entity["metadata"]
+        if body.get("metadata", {}).get("spec_version", metadata["spec_version"]) < metadata["spec_version"]:
+            raise MockApiError(409, "spec_version is outdated")
+        entity_uuid = metadata["uuid"]
+        new_spec = copy.deepcopy(body["spec"])
+
+        def apply_update():
+            old_power_state = entity["spec"].get("resources", {}).get("power_state")
+            entity["spec"] = new_spec
+            metadata["spec_version"] += 1
+            if "entity_version" in metadata:
+                metadata["entity_version"] = str(int(metadata["entity_version"]) + 1)
+            power_state = new_spec.get("resources", {}).get("power_state")
+            if api == "vms" and power_state != old_power_state:
+                if power_state == "ON":
+                    self.power_on_times[entity_uuid] = self.clock()
+                else:
+                    self.power_on_times.pop(entity_uuid, None)
+
+        task_uuid = self.create_task("update_" + api[:-1], api[:-1], entity_uuid, apply_update)
+        return {
+            "spec": body["spec"],
+            "metadata": metadata,
+            "status": {"state": "PENDING", "execution_context": {"task_uuid": task_uuid}},
+        }
+
+    def delete(self, api, entity_uuid):
+        def apply_delete():
+            self.entities[api].pop(entity_uuid, None)
+            self.power_on_times.pop(entity_uuid, None)
+
+        task_uuid = self.create_task("delete_" + api[:-1], api[:-1], entity_uuid, apply_delete)
+        return {"status": {"state": "DELETE_PENDING", "execution_context": {"task_uuid": task_uuid}}}
+
+    # Server lifecycle
+
+    def start(self, host="127.0.0.1", port=0, certfile=None, keyfile=None):
+        """
+        Start serving in a background thread
+        Returns:
+            (str): base url of the server, e.g. https://127.0.0.1:9440
+        """
+        self.server = MockHTTPServer((host, port), MockRequestHandler)
+        self.server.mock = self
+        scheme = "http"
+        # Clients only send Secure cookies back over https
+        self.server.cookie_flags = "HttpOnly"
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+            scheme = "https"
+            self.server.cookie_flags = "Secure; HttpOnly"
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return "{0}://{1}:{2}".format(scheme, host, self.server.server_address[1])
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class MockHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end of MockPrismCentral"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, with Nagle they wait for the delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def dispatch(self, method):
+        mock = self.server.mock
+        content_length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(content_length) if content_length else b""
+        path = self.path.split("?", 1)[0]
+        headers = {}
+
+        if path == "/mock/stats":
+            return self.send_json(200, {"calls": dict(mock.calls)}, headers)
+        if path == "/mock/reset" and method == "POST":
+            mock.calls.clear()
+            return self.send_json(200, {}, headers)
+
+        if mock.latency or mock.latency_jitter:
+            mock.sleep(mock.latency + mock.random.uniform(0, mock.latency_jitter))
+        try:
+            if not path.startswith(API_PREFIX):
+                raise MockApiError(404, "Unknown path {0}".format(path))
+            cookies = {}
+            for cookie in (self.headers.get("Cookie") or "").split(";"):
+                name, sep, value = cookie.strip().partition("=")
+                cookies[name] = value
+            body = json.loads(raw_body.decode("utf-8")) if raw_body else None
+            if mock.scan_latency and path.endswith("/list") and isinstance(body, dict):
+                mock.sleep(mock.scan_latency * (body.get("offset") or 0))
+            with mock.lock:
+                token = mock.authenticate(self.headers, cookies)
+                if token:
+                    headers["Set-Cookie"] = "{0}={1}; Path=/; {2}".format(
+                        SESSION_COOKIE, token, self.server.cookie_flags)
+                status, response = mock.handle(method, path[len(API_PREFIX):], body)
+            if mock.entity_latency and isinstance(response, dict) and "entities" in response:
+                mock.sleep(mock.entity_latency * len(response["entities"]))
+        except MockApiError as err:
+            headers.update(err.headers)
+            status, response = err.status, {"state": "ERROR", "code": err.status,
+                                            "message_list": [{"message": err.message}]}
+        except ValueError as err:
+            status, response = 400, {"state": "ERROR", "code": 400, "message_list": [{"message": str(err)}]}
+        self.send_json(status, response, headers)
+
+    def send_json(self, status, response, headers):
+        mock = self.server.mock
+        content = json.dumps(response).encode("utf-8")
+        if mock.compression and len(content) >= GZIP_MIN_BYTES and \
+                "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            content = gzip.compress(content, 6)
+            headers["Content-Encoding"] = "gzip"
+        if mock.bandwidth:
+            mock.sleep(mock.get_transfer_delay(len(content)))
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Prism Central v3 API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9440)
+    parser.add_argument("--certfile", help="TLS certificate, the server speaks plain HTTP without it")
+    parser.add_argument("--keyfile", help="TLS private key")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="nutanix/4u")
+    parser.add_argument("--vms", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--clusters", type=int, default=2)
+    parser.add_argument("--subnets", type=int, default=4)
+    parser.add_argument("--storage-containers", type=int, default=2, help="containers per cluster")
+    parser.add_argument("--task-duration", type=float, default=1.0)
+    parser.add_argument("--ip-delay", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--scan-latency", type=float, default=0.0,
+                        help="seconds added to list responses per entity skipped by the offset")
+    parser.add_argument("--entity-latency", type=float, default=0.0,
+                        help="seconds added to list responses per entity returned")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--task-failure-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rps", type=float, default=0)
+    parser.add_argument("--no-compression", action="store_true", help="never gzip responses")
+    parser.add_argument("--bandwidth", type=float, default=0, help="response bytes per second, 0 is unlimited")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mock = MockPrismCentral(
+        vms=args.vms, images=args.images, clusters=args.clusters, subnets=args.subnets,
+        storage_containers=args.storage_containers, task_duration=args.task_duration,
+        ip_delay=args.ip_delay, latency=args.latency, latency_jitter=args.latency_jitter,
+        scan_latency=args.scan_latency, entity_latency=args.entity_latency, error_rate=args.error_rate, task_failure_rate=args.task_failure_rate,
+        throttle_rps=args.throttle_rps, compression=not args.no_compression, bandwidth=args.bandwidth,
+        username=args.username, password=args.password,
+        seed=args.seed)
+    url = mock.start(args.host, args.port, args.certfile, args.keyfile)
+    print("Mock Prism Central listening on {0}".format(url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
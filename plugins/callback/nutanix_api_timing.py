@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+    name: nutanix_api_timing
+    type: aggregate
+    short_description: Summarizes the Nutanix API load of a playbook run
+    description:
+    - Collects the C(api_stats), C(api_polls) and C(api_retries) blocks returned by the Nutanix modules
+    - Prints API calls, latency, task polls and time spent sleeping per host and per endpoint at the end of the run
+    - Optionally writes the summary as JSON and in the Prometheus text format
+    - HTTP latency and per endpoint data need C(api_stats) enabled on the tasks, e.g. by exporting NUTANIX_API_STATS=true
+    requirements:
+    - enable in configuration, e.g. C(callbacks_enabled = nutanix.nutanix.nutanix_api_timing)
+    options:
+      json_path:
+        description: File to write the summary to as JSON
+        type: path
+        env:
+        - name: NUTANIX_API_TIMING_JSON
+        ini:
+        - section: callback_nutanix_api_timing
+          key: json_path
+      prometheus_path:
+        description: File to write the summary to in the Prometheus text format, e.g. for the node exporter textfile collector
+        type: path
+        env:
+        - name: NUTANIX_API_TIMING_PROMETHEUS
+        ini:
+        - section: callback_nutanix_api_timing
+          key: prometheus_path
+'''
+
+import json
+import os
+
+from ansible.plugins.callback import CallbackBase
+
+HOST_COUNTERS = ("tasks", "calls", "errors", "api_seconds", "retries", "backoff_seconds",
+                 "task_polls", "task_poll_seconds", "ip_polls", "ip_wait_seconds")
+ENDPOINT_COUNTERS = ("calls", "errors", "total_seconds", "request_bytes", "response_bytes", "response_wire_bytes")
+
+
+def escape_label(value):
+    """Escape a Prometheus label value"""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class CallbackModule(CallbackBase):
+    '''Aggregates Nutanix API timing across a playbook run'''
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'nutanix.nutanix.nutanix_api_timing'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self.hosts = {}
+        self.endpoints = {}
+        self.json_path = None
+        self.prometheus_path = None
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super(CallbackModule, self).set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        self.json_path = self.get_option('json_path')
+        self.prometheus_path = self.get_option('prometheus_path')
+
+    def _record(self, result):
+        '''Add the API statistics of a task result, including loop items'''
+        items = result._result.get('results')
+        if not isinstance(items, list):
+            items = [result._result]
+        for item in items:
+            # Results of modules failing in NutanixApiClient.fail may only carry api_retries
+            if isinstance(item, dict) and ('api_polls' in item or 'api_stats' in item or 'api_retries' in item):
+                self._record_item(result._host.get_name(), item)
+
+    def _record_item(self, host_name, item):
+        host = self.hosts.setdefault(host_name, dict((counter, 0) for counter in HOST_COUNTERS))
+        host['tasks'] += 1
+        retries = item.get('api_retries') or {}
+        host['retries'] += retries.get('retries', 0)
+        host['backoff_seconds'] += retries.get('backoff_seconds', 0)
+        polls = item.get('api_polls') or {}
+        for counter in ('task_polls', 'task_poll_seconds', 'ip_polls', 'ip_wait_seconds'):
+            host[counter] += polls.get(counter, 0)
+
+        api_stats = item.get('api_stats') or {}
+        host['calls'] += api_stats.get('calls', 0)
+        host['api_seconds'] += api_stats.get('total_seconds', 0)
+        for key, stats in (api_stats.get('endpoints') or {}).items():
+            endpoint = self.endpoints.setdefault(key, dict(
+                [(counter, 0) for counter in ENDPOINT_COUNTERS] + [('max_seconds', 0), ('latency_buckets', {})]))
+            for counter in ENDPOINT_COUNTERS:
+                endpoint[counter] += stats.get(counter, 0)
+            host['errors'] += stats.get('errors', 0)
+            endpoint['max_seconds'] = max(endpoint['max_seconds'], stats.get('max_seconds', 0))
+            for bound, count in (stats.get('latency_buckets') or {}).items():
+                endpoint['latency_buckets'][bound] = endpoint['latency_buckets'].get(bound, 0) + count
+
+    def v2_runner_on_ok(self, result):
+        self._record(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result)
+
+    def summary(self):
+        '''Return the aggregated statistics'''
+        return {
+            'hosts': self.hosts,
+            'endpoints': self.endpoints,
+            'totals': dict((counter, sum(host[counter] for host in self.hosts.values()))
+                           for counter in HOST_COUNTERS),
+        }
+
+    def _display_summary(self):
+        self._display.banner('NUTANIX API TIMING')
+        self._display.display('{0:<30} {1:>6} {2:>7} {3:>6} {4:>9} {5:>8} {6:>10} {7:>9} {8:>8}'.format(
+            'host', 'tasks', 'calls', 'errors', 'api s', 'polls', 'poll sleep', 'ip wait', 'retries'))
+        for name in sorted(self.hosts):
+            host = self.hosts[name]
+            self._display.display(
+                '{0:<30} {1[tasks]:>6} {1[calls]:>7} {1[errors]:>6} {1[api_seconds]:>9.2f} {2:>8} '
+                '{1[task_poll_seconds]:>10.1f} {1[ip_wait_seconds]:>9.1f} {1[retries]:>8}'.format(
+                    name, host, host['task_polls'] + host['ip_polls']))
+        if not self.endpoints:
+            return
+        self._display.display('')
+        self._display.display('{0:<40} {1:>7} {2:>6} {3:>9} {4:>8} {5:>8} {6:>12} {7:>12}'.format(
+            'endpoint', 'calls', 'errors', 'total s', 'mean s', 'max s', 'resp bytes', 'wire bytes'))
+        for key in sorted(self.endpoints, key=lambda key: -self.endpoints[key]['total_seconds']):
+            endpoint = self.endpoints[key]
+            self._display.display('{0:<40} {1[calls]:>7} {1[errors]:>6} {1[total_seconds]:>9.2f} {2:>8.3f} '
+                                  '{1[max_seconds]:>8.3f} {1[response_bytes]:>12} {1[response_wire_bytes]:>12}'.format(
+                                      key, endpoint, endpoint['total_seconds'] / max(endpoint['calls'], 1)))
+
+    def _prometheus_lines(self):
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append('# HELP {0} {1}'.format(name, help_text))
+            lines.append('# TYPE {0} {1}'.format(name, metric_type))
+            for labels, value in samples:
+                label_text = ','.join('{0}="{1}"'.format(key, escape_label(str(label))) for key, label in labels)
+                lines.append('{0}{{{1}}} {2}'.format(name, label_text, value))
+
+        endpoint_labels = []
+        for key in sorted(self.endpoints):
+            method, template = key.split(' ', 1)
+            endpoint_labels.append((key, [('method', method), ('endpoint', template)]))
+
+        metric('nutanix_api_requests_total', 'counter', 'Nutanix API requests',
+               [(labels, self.endpoints[key]['calls']) for key, labels in endpoint_labels])
+        metric('nutanix_api_request_errors_total', 'counter', 'Nutanix API requests failing with a connection error or a 4xx/5xx status',
+               [(labels, self.endpoints[key]['errors']) for key, labels in endpoint_labels])
+        metric('nutanix_api_response_bytes_total', 'counter', 'Nutanix API response body bytes after decompression',
+               [(labels, self.endpoints[key]['response_bytes']) for key, labels in endpoint_labels])
+        metric('nutanix_api_response_wire_bytes_total', 'counter', 'Nutanix API response body bytes as received',
+               [(labels, self.endpoints[key]['response_wire_bytes']) for key, labels in endpoint_labels])
+
+        histogram = 'nutanix_api_request_duration_seconds'
+        lines.append('# HELP {0} Nutanix API request latency'.format(histogram))
+        lines.append('# TYPE {0} histogram'.format(histogram))
+        for key, labels in endpoint_labels:
+            endpoint = self.endpoints[key]
+            label_text = ','.join('{0}="{1}"'.format(name, escape_label(value)) for name, value in labels)
+            for bound in sorted(endpoint['latency_buckets'], key=float):
+                lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(
+                    histogram, label_text, bound, endpoint['latency_buckets'][bound]))
+            lines.append('{0}_bucket{{{1},le="+Inf"}} {2}'.format(histogram, label_text, endpoint['calls']))
+            lines.append('{0}_sum{{{1}}} {2}'.format(histogram, label_text, endpoint['total_seconds']))
+            lines.append('{0}_count{{{1}}} {2}'.format(histogram, label_text, endpoint['calls']))
+
+        hosts = sorted(self.hosts)
+        for name, counter, help_text in (
+                ('nutanix_api_tasks_total', 'tasks', 'Nutanix module tasks'),
+                ('nutanix_api_task_polls_total', 'task_polls', 'Nutanix task polling requests'),
+                ('nutanix_api_task_poll_sleep_seconds_total', 'task_poll_seconds', 'Seconds slept between task polls'),
+                ('nutanix_api_ip_polls_total', 'ip_polls', 'VM IP address polling requests'),
+                ('nutanix_api_ip_wait_seconds_total', 'ip_wait_seconds', 'Seconds slept waiting for VM IP addresses'),
+                ('nutanix_api_retries_total', 'retries', 'Retried Nutanix API requests'),
+                ('nutanix_api_retry_backoff_seconds_total', 'backoff_seconds', 'Seconds slept before retries')):
+            metric(name, 'counter', help_text, [([('host', host)], self.hosts[host][counter]) for host in hosts])
+        return lines
+
+    def _write(self, path, content):
+        path = os.path.expanduser(path)
+        tmp_path = '{0}.{1}'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.rename(tmp_path, path)
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.hosts:
+            return
+        self._display_summary()
+        if self.json_path:
+            self._write(self.json_path, json.dumps(self.summary(), indent=2, sort_keys=True) + '\n')
+        if self.prometheus_path:
+            self._write(self.prometheus_path, '\n'.join(self._prometheus_lines()) + '\n')
@@ -54,17 +54,67 @@ DOCUMENTATION = r'''
         type: boolean
         env:
          - name: VALIDATE_CERTS
+      session_cache:
+        description:
+        - Reuse the PC session cookie across requests and runs instead of sending credentials with every call
+        - The cookie is cached under ~/.ansible/tmp/nutanix_sessions, readable by the current user only
+        default: True
+        type: boolean
+      compression:
+        description:
+        - Set value to C(False) to ask PC for uncompressed responses instead of gzip compressed ones
+        - Compression shrinks pages of full VM specs several fold, which saves time on slow links to remote PCs
+        default: True
+        type: boolean
+        env:
+         - name: NUTANIX_COMPRESSION
+      api_engine:
+        description:
+        - C(requests) fetches the single page of VMs described by I(data)
+        - C(asyncio) fetches all VMs from the I(data) offset on, I(data) length VMs per request, all pages at once after the first one
+        - C(asyncio) requires the aiohttp package
+        default: requests
+        choices: ['requests', 'asyncio']
+        type: str
+        env:
+         - name: NUTANIX_API_ENGINE
+      pool_maxsize:
+        description: Maximum number of requests in flight and of open connections of the C(asyncio) engine
+        default: 10
+        type: int
+      pagination:
+        description:
+        - C(offset) lists VMs as described by I(api_engine)
+        - C(keyset) makes the C(requests) engine fetch all VMs, I(data) length VMs per request, sorted by uuid and
+          asking for the uuids after the last one seen, so PC doesn't scan the skipped VMs again for every page and
+          VMs created or deleted meanwhile aren't skipped or repeated. The I(data) offset is ignored
+        default: offset
+        choices: ['offset', 'keyset']
+        type: str
+        env:
+         - name: NUTANIX_PAGINATION
+      pagination_splits:
+        description: Number of uuid ranges scanned in parallel with C(keyset) pagination, up to I(pool_maxsize) at a time
+        default: 1
+        type: int
+    notes:
+    - Export NUTANIX_PROFILE=true to profile parsing with cProfile and NUTANIX_PROFILE_MEMORY=true to add tracemalloc
+    - The reports are written to NUTANIX_PROFILE_PATH, by default ~/.ansible/tmp/nutanix_profiles
 '''
 
-try:
-    import requests
-    HAS_REQUESTS = True
-except ImportError:
-    HAS_REQUESTS = False
-
 import json
+import threading
 from ansible.errors import AnsibleError
 from ansible.plugins.inventory import BaseInventoryPlugin
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_cache import (
+    NutanixSessionCache,
+    get_session_cookies,
+    has_session_cookie
+)
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_profiler import (
+    profile_path,
+    run_profiled
+)
 
 
 class InventoryModule(BaseInventoryPlugin):
@@ -75,37 +125,137 @@ class InventoryModule(BaseInventoryPlugin):
     def __init__(self):
         super(InventoryModule, self).__init__()
         self.session = None
+        self.session_cache = None
+        # Keyset pagination lists uuid ranges from several threads
+        self.session_lock = threading.Lock()
+        # Option defaults, overridden by _parse, for callers building the inventory directly
+        self.data = {"offset": 0, "length": 500}
+        self.validate_certs = True
+        self.use_session_cache = True
+        self.compression = True
+        self.api_engine = "requests"
+        self.pool_maxsize = 10
+        self.pagination = "offset"
+        self.pagination_splits = 1
 
     def _get_create_session(self):
-        '''Create session'''
-        if not self.session:
-            self.session = requests.Session()
-            if not self.validate_certs:
-                self.session.verify = self.validate_certs
-                from urllib3.exceptions import InsecureRequestWarning
-                requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
+        '''Create session, once even when keyset pagination calls this from several threads'''
+        with self.session_lock:
+            if not self.session:
+                # Imported on first use to keep plugin loading fast
+                try:
+                    import requests
+                except ImportError:
+                    raise AnsibleError("Missing python 'requests' package")
+                from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import get_accept_encoding
+                session = requests.Session()
+                session.headers["Accept-Encoding"] = get_accept_encoding(self.compression)
+                if self.use_session_cache:
+                    self.session_cache = NutanixSessionCache(
+                        "{0}:{1}".format(self.pc_hostname, self.pc_port), self.pc_username, self.pc_password)
+                    self.session_cache.load(session.cookies)
+                if not self.validate_certs:
+                    session.verify = self.validate_certs
+                    from urllib3.exceptions import InsecureRequestWarning
+                    requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
+                self.session = session
 
         return self.session
 
-    def _get_vm_list(self):
-        '''Get a list of existing VMs'''
+    def _get_vm_list(self, data=None, document=None):
+        '''Get existing VMs, decoded one at a time as the response is read, document receives the other keys'''
+        from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import iter_response_chunks
+        from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_json import iter_json_items
+
         api_url = "https://{0}:{1}/api/nutanix/v3/vms/list".format(self.pc_hostname, self.pc_port)
         auth = (self.pc_username, self.pc_password)
         headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
 
         session = self._get_create_session()
-        vm_list_response = session.post(url=api_url, auth=auth, headers=headers, data=json.dumps(self.data))
+        # Credentials are only sent until PC hands out a session cookie
+        sent_cookies = get_session_cookies(session.cookies)
+        if sent_cookies:
+            auth = None
+        data = json.dumps(self.data if data is None else data)
+        vm_list_response = session.post(url=api_url, auth=auth, headers=headers, data=data, stream=True)
+        if vm_list_response.status_code == 401 and auth is None:
+            # Session expired, log in again unless another thread already did
+            vm_list_response.close()
+            with self.session_lock:
+                if get_session_cookies(session.cookies) == sent_cookies:
+                    session.cookies.clear()
+                    if self.session_cache:
+                        self.session_cache.clear()
+            auth = None if has_session_cookie(session.cookies) else (self.pc_username, self.pc_password)
+            vm_list_response = session.post(url=api_url, auth=auth, headers=headers, data=data, stream=True)
+            if vm_list_response.status_code == 401 and auth is None:
+                # The session of the other thread expired as well
+                vm_list_response.close()
+                auth = (self.pc_username, self.pc_password)
+                vm_list_response = session.post(url=api_url, auth=auth, headers=headers, data=data, stream=True)
+        if not vm_list_response.ok:
+            raise AnsibleError("Unable to list VMs: {0} {1}".format(vm_list_response.status_code, vm_list_response.text))
+        if auth is not None and self.session_cache:
+            with self.session_lock:
+                self.session_cache.save(session.cookies)
+
+        return iter_json_items(iter_response_chunks(vm_list_response), "entities", document)
+
+    def _get_vm_list_keyset(self):
+        '''Get all VMs, paging by uuid instead of offset, the uuid ranges of pagination_splits in parallel'''
+        from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import iter_keyset_entities
+
+        data = dict(self.data)
+        data.pop("offset", None)
+        return iter_keyset_entities(self._get_vm_list, data, data.get("length") or 500, self.pagination_splits,
+                                    workers=self.pool_maxsize)
+
+    def _get_vm_list_async(self):
+        '''Get all VMs from the data offset on, requesting the pages concurrently'''
+        # Imported on first use, asyncio and aiohttp are only needed by this engine
+        from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_async import (
+            NutanixApiError,
+            NutanixAsyncClient,
+            import_aiohttp,
+            run_coroutine,
+            update_cookie_jar
+        )
+        if not import_aiohttp():
+            raise AnsibleError("Missing python 'aiohttp' package, required by api_engine asyncio")
+
+        session = self._get_create_session()
+        client = NutanixAsyncClient(
+            "https://{0}:{1}/api/nutanix".format(self.pc_hostname, self.pc_port),
+            (self.pc_username, self.pc_password), validate_certs=self.validate_certs,
+            concurrency=self.pool_maxsize, cookies=get_session_cookies(session.cookies),
+            compression=self.compression)
 
-        return vm_list_response.json()
+        async def list_vms():
+            async with client:
+                return await client.list_all_entities("vms", self.data)
+
+        try:
+            entities = run_coroutine(list_vms())
+        except NutanixApiError as err:
+            raise AnsibleError("Unable to list VMs: {0}".format(str(err)))
+        if update_cookie_jar(session.cookies, client.cookies) and self.session_cache:
+            self.session_cache.save(session.cookies)
+        return entities
 
     def _build_inventory(self):
         '''Build inventory from API response'''
         vars_to_remove = ["disk_list", "vnuma_config", "nic_list", "power_state_mechanism", "host_reference",
                           "serial_port_list", "gpu_list", "storage_config", "boot_config", "guest_customization"]
-        vm_list_resp = self._get_vm_list()
+        if self.api_engine == "asyncio":
+            entities = self._get_vm_list_async()
+        elif self.pagination == "keyset":
+            entities = self._get_vm_list_keyset()
+        else:
+            entities = self._get_vm_list()
 
-        for entity in vm_list_resp["entities"]:
+        for entity in entities:
             nic_count = 0
+            vm_ip = None
             cluster = entity["status"]["cluster_reference"]["name"]
             # self.inventory.add_host(f"{vm_name}-{vm_uuid}")
             vm_name = entity["status"]["name"]
@@ -124,7 +274,8 @@ class InventoryModule(BaseInventoryPlugin):
             self.inventory.add_group(cluster)
             self.inventory.add_child('all', cluster)
             self.inventory.add_host(vm_name, group=cluster)
-            self.inventory.set_variable(vm_name, 'ansible_host', vm_ip)
+            if vm_ip:
+                self.inventory.set_variable(vm_name, 'ansible_host', vm_ip)
             self.inventory.set_variable(vm_name, 'uuid', vm_uuid)
 
             # Add hostvars
@@ -145,10 +296,11 @@ class InventoryModule(BaseInventoryPlugin):
         return valid
 
     def parse(self, inventory, loader, path, cache):
-        '''Parse inventory'''
-        if not HAS_REQUESTS:
-            raise AnsibleError("Missing python 'requests' package")
+        '''Parse inventory, profiled if NUTANIX_PROFILE is exported'''
+        run_profiled("nutanix_vm_inventory", self._parse, (inventory, loader, path, cache), default_path=profile_path)
 
+    def _parse(self, inventory, loader, path, cache):
+        '''Parse inventory'''
         super(InventoryModule, self).parse(inventory, loader, path, cache)
         self._read_config_data(path)
 
@@ -158,5 +310,11 @@ class InventoryModule(BaseInventoryPlugin):
         self.pc_port = self.get_option('pc_port')
         self.data = self.get_option('data')
         self.validate_certs = self.get_option('validate_certs')
+        self.use_session_cache = self.get_option('session_cache')
+        self.compression = self.get_option('compression')
+        self.api_engine = self.get_option('api_engine')
+        self.pool_maxsize = self.get_option('pool_maxsize')
+        self.pagination = self.get_option('pagination')
+        self.pagination_splits = self.get_option('pagination_splits')
 
         self._build_inventory()
@@ -5,32 +5,167 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
+import importlib
 import json
+import random
+import threading
 import traceback
 import time
-import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from datetime import datetime
 from ansible.module_utils.basic import missing_required_lib
-
-try:
-    import requests
-    import requests.exceptions
-    HAS_REQUESTS = True
-except ImportError:
-    HAS_REQUESTS = False
-    REQUESTS_IMPORT_ERROR = traceback.format_exc()
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_cache import (
+    NutanixCircuitBreaker,
+    NutanixSessionCache,
+    circuit_breaker_threshold,
+    get_session_cookies,
+    has_session_cookie
+)
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_stats import NutanixApiStats
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_clock import NutanixClock
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_json import (
+    chunk_size,
+    iter_json_items,
+    loads
+)
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_profiler import NutanixProfiler
+
+# Imported by import_requests when the first client is created
+requests = None
+REQUESTS_IMPORT_ERROR = None
 
 length = 250
+# Concurrent page requests of the pagers. Streamed list pages fetched ahead of
+# the one being decoded are read whole, so up to max_workers - 1 raw page
+# bodies are held in memory in exchange for overlapping their transfer.
+max_workers = 4
+pagination = "offset"
+pagination_splits = 1
+# Unique and never changing, keyset pages are sorted and filtered on it
+keyset_attribute = "uuid"
+pool_maxsize = 10
+task_poll_interval = 0.5
+task_poll_max_interval = 10
+task_poll_backoff = 2
+task_list_batch = 100
+retries = 3
+retry_backoff = 1
+retry_max_backoff = 30
+retry_max_retry_after = 120
+# Rejected before being processed, safe to retry for any method
+retry_any_method_status_codes = (429, 503)
+# Safe to retry for idempotent requests only
+retry_idempotent_status_codes = (502, 504)
+idempotent_methods = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
 
 
 class NutanixApiError(Exception):
     pass
 
 
+class NutanixResponse(object):
+    """
+    Response of NutanixApiClient.request
+
+    json() decodes the body once, with orjson if it is installed, and
+    iter_items() decodes the items of a top level array one at a time as the
+    body is read, for requests sent with stream=True. Other attributes are
+    those of the wrapped requests response.
+    """
+
+    def __init__(self, response, client, stats_record=None, latency=None):
+        self.response = response
+        self.client = client
+        # api_stats record of a streamed response, its body is counted once read
+        self.stats_record = stats_record
+        # Seconds until the response headers arrived
+        self.latency = latency
+        # Number of entities asked for, set by the pagers
+        self.page_length = None
+        self.document = None
+        self.read_bytes = 0
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def json(self):
+        if self.document is None:
+            self.document = loads(self.response.content)
+        return self.document
+
+    def iter_items(self, key="entities"):
+        """
+        This routine helps to iterate over the items of a top level array of the body
+        Only one item is decoded at a time, json() returns the other top level
+        keys once all items were yielded.
+        Args:
+            key(str): key of the array, e.g. entities
+        Returns:
+            (generator): yields the array items
+        """
+        if self.document is not None:
+            for item in self.document.get(key, []):
+                yield item
+            return
+        document = {}
+        for item in iter_json_items(self.iter_chunks(), key, document):
+            yield item
+        self.document = document
+        if self.stats_record is not None:
+            self.client.api_stats.add_response_bytes(
+                self.stats_record, self.read_bytes, get_wire_bytes(self.response))
+
+    def read(self):
+        """Read the whole body of a streamed response now, iter_items() then decodes it from memory"""
+        try:
+            return self.response.content
+        except requests.exceptions.RequestException as err:
+            self.client.fail("Request failed while reading the response {0}".format(str(err)),
+                             api_retries=self.client.retry_stats)
+
+    def iter_chunks(self):
+        """Yield the decompressed body chunks, counting their bytes"""
+        try:
+            for chunk in iter_response_chunks(self.response):
+                self.read_bytes += len(chunk)
+                yield chunk
+        except requests.exceptions.RequestException as err:
+            self.client.fail("Request failed while reading the response {0}".format(str(err)),
+                             api_retries=self.client.retry_stats)
+
+
 class NutanixApiClient(object):
-    """Nutanix Rest API client"""
+    """
+    Nutanix Rest API client
+
+    One client may be shared by the threads of a module run. request() keeps
+    its per request state local, the session pools up to pool_maxsize
+    connections, and the statistics, circuit breaker, session cookie, name
+    cache and cassette are guarded by locks. Only the first failing request
+    fails the module, later ones raise NutanixApiError. Per run indexes such
+    as storage_container_index must be filled by one thread at a time, and
+    a client must not be shared across processes.
+    """
 
-    def __init__(self, module):
+    def __init__(self, module, clock=None):
         self.module = module
+        # Guards retry_stats and poll_stats
+        self.stats_lock = threading.Lock()
+        # Serializes logging in again and saving the session cookie
+        self.session_lock = threading.Lock()
+        self.fail_lock = threading.Lock()
+        self.failed = False
+        # Time source and sleeper of all wait loops, simulated clocks can be injected
+        self.clock = clock or NutanixClock()
+        # Profiler of the whole run if NUTANIX_PROFILE is exported, else started here
+        self.profiler = NutanixProfiler.active
+        if self.profiler is None and module.params.get("profile"):
+            self.profiler = NutanixProfiler(
+                getattr(module, "_name", "nutanix"), memory=module.params.get("profile_memory"),
+                path=module.params.get("profile_path"))
+            self.profiler.start()
         pc_hostname = module.params["pc_hostname"]
         pc_username = module.params["pc_username"]
         pc_password = module.params["pc_password"]
@@ -38,337 +173,596 @@ class NutanixApiClient(object):
         self.validate_certs = module.params["validate_certs"]
         self.api_base = "https://{0}:{1}/api/nutanix".format(
             pc_hostname, pc_port)
+        self.pc_host = "{0}:{1}".format(pc_hostname, pc_port)
         self.auth = (pc_username, pc_password)
+        self.page_length = module.params.get("page_length") or length
+        self.pagination = module.params.get("pagination") or pagination
+        self.pagination_splits = module.params.get("pagination_splits") or pagination_splits
+        self.task_poll_interval = module.params.get(
+            "task_poll_interval") or task_poll_interval
+        self.task_poll_max_interval = module.params.get(
+            "task_poll_max_interval") or task_poll_max_interval
+        self.retries = module.params.get("retries")
+        if self.retries is None:
+            self.retries = retries
+        self.retry_backoff = module.params.get("retry_backoff")
+        if self.retry_backoff is None:
+            self.retry_backoff = retry_backoff
+        self.retry_stats = {"retries": 0, "backoff_seconds": 0.0}
+        # Polling requests sent and seconds slept while waiting for tasks and VM IPs
+        self.poll_stats = {"task_polls": 0, "task_poll_seconds": 0.0, "ip_polls": 0, "ip_wait_seconds": 0.0}
+        self.api_stats = NutanixApiStats() if module.params.get("api_stats") else None
+        cassette_mode = module.params.get("cassette_mode")
+        if not module.params.get("cassette_path"):
+            cassette_mode = None
+        threshold = module.params.get("circuit_breaker_threshold")
+        if threshold is None:
+            threshold = circuit_breaker_threshold
+        if cassette_mode == "replay":
+            # Replayed failures must not trip the breaker of the real PC
+            threshold = 0
+        self.circuit_breaker = NutanixCircuitBreaker(self.pc_host, threshold=threshold)
         # Ensure that all deps are present
         self.check_dependencies()
-        # Create session
-        self.session = requests.Session()
+        # (cluster_uuid, container_name) : storage_container_uuid, filled per run
+        self.storage_container_index = {}
+        self.indexed_storage_container_names = set()
+        # Set by nutanix_name_cache.use_name_cache in modules with the name_cache options
+        self.name_cache = None
+        # Set by nutanix_page_tuner.use_adaptive_paging in modules with the adaptive_paging options,
+        # returns the NutanixPageTuner of an entity kind and starting page length
+        self.page_tuner_factory = None
+        # kind : NutanixPageTuner, shared by the pagers of this run
+        self.page_tuners = {}
+        self.page_tuners_lock = threading.Lock()
+        # Create session, reusing a cached PC session cookie if there is one
+        self.session = self.create_session()
+        self.session_cache = None
+        if module.params.get("session_cache") and cassette_mode != "replay":
+            self.session_cache = NutanixSessionCache(self.pc_host, pc_username, pc_password)
+            self.session_cache.load(self.session.cookies)
+        self.cassette_mode = cassette_mode
+        self.cassette = None
+        if cassette_mode:
+            self.open_cassette(cassette_mode)
         if not self.validate_certs:
             from urllib3.exceptions import InsecureRequestWarning
             requests.packages.urllib3.disable_warnings(
                 category=InsecureRequestWarning)
 
-    def request(self, api_endpoint, method, data, timeout=20):
-        self.api_url = "{0}/{1}".format(self.api_base, api_endpoint)
+    def request(self, api_endpoint, method, data, timeout=20, stream=False):
+        api_url = "{0}/{1}".format(self.api_base, api_endpoint)
         headers = {'Content-Type': 'application/json',
                    'Accept': 'application/json'}
+        idempotent = is_idempotent_request(api_endpoint, method)
+        attempt = 0
+        # The request whose failure opened the breaker still gets its retries
+        tripped = False
+        while True:
+            open_for = 0 if tripped else self.circuit_breaker.open_for()
+            if open_for:
+                self.fail(
+                    "Request not sent, PC {0} failed {1} consecutive requests, retry after {2:.0f} seconds".format(
+                        self.pc_host, self.circuit_breaker.state["failures"], open_for),
+                    api_retries=self.retry_stats)
+
+            start = self.clock.time()
+            response, error = self.send(method, api_url, data, headers, timeout, stream)
+            latency = self.clock.time() - start
+            stats_record = None
+            if self.api_stats is not None:
+                # The body of a streamed response is counted by NutanixResponse once read
+                unread = error is not None or (stream and response.ok)
+                stats_record = self.api_stats.record(
+                    method, api_endpoint, response.status_code if error is None else None,
+                    latency, len(data or ""), 0 if unread else len(response.content),
+                    0 if unread else get_wire_bytes(response))
+            if self.cassette is not None and error is None:
+                self.cassette.record(method, api_endpoint, data, response, latency)
+            if error is None and response.ok:
+                self.circuit_breaker.record_success()
+                return NutanixResponse(response, self, stats_record if stream else None, latency)
+            if is_circuit_breaker_failure(response, error):
+                tripped = self.circuit_breaker.record_failure() or tripped
+
+            delay = get_retry_delay(attempt, idempotent, response, error, self)
+            if delay is None:
+                break
+            attempt += 1
+            self.add_stats(self.retry_stats, retries=1, backoff_seconds=delay)
+            self.clock.sleep(delay, "retry")
+
+        if error is not None:
+            self.fail("Request failed {0}".format(str(error)),
+                      api_retries=self.retry_stats)
+        self.fail("Request failed to complete, response code {0}, content {1}".format(
+            response.status_code, response.content), api_retries=self.retry_stats)
+
+    def fail(self, msg, **kwargs):
+        """
+        This routine helps to fail the module from request(), from any thread
+        Only the first failure is reported through fail_json, requests failing
+        afterwards in other threads raise NutanixApiError instead. The polling
+        and API statistics are added like update_result does for successes.
+        Args:
+            msg(str): failure message
+            kwargs(dict): extra result keys
+        """
+        with self.fail_lock:
+            failed, self.failed = self.failed, True
+        if failed:
+            raise NutanixApiError(msg)
+        with self.stats_lock:
+            kwargs["api_polls"] = dict(self.poll_stats)
+        if self.api_stats is not None:
+            kwargs["api_stats"] = self.api_stats.summary()
+        self.module.fail_json(msg, **kwargs)
+
+    def create_session(self):
+        """
+        This routine helps to create the HTTP session and its connection pool
+        Returns:
+            session(obj): requests session
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.module.params.get("pool_maxsize") or pool_maxsize,
+            pool_block=bool(self.module.params.get("pool_block")))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if self.module.params.get("keep_alive") is False:
+            session.headers["Connection"] = "close"
+        session.headers["Accept-Encoding"] = get_accept_encoding(self.module.params.get("compression"))
+        return session
+
+    def add_stats(self, stats, **increments):
+        """
+        This routine helps to add to retry_stats or poll_stats from any thread
+        Args:
+            stats(dict): retry_stats or poll_stats
+            increments(dict): key : value to add
+        """
+        with self.stats_lock:
+            for key, value in increments.items():
+                stats[key] += value
+
+    def send(self, method, api_url, data, headers, timeout, stream=False):
+        """
+        This routine helps to send a single request with the current PC session
+        Returns:
+            (tuple): (response, None) or (None, error) on connection failures
+        """
+        def send_once(auth):
+            response = self.session.request(method=method, url=api_url, auth=auth, data=data, headers=headers,
+                                            verify=self.validate_certs, timeout=timeout, stream=stream)
+            if stream and not response.ok:
+                # Error bodies are small, reading them returns the connection to the pool
+                response.content
+            return response
+
+        # Credentials are only sent until PC hands out a session cookie
+        sent_cookies = get_session_cookies(self.session.cookies)
+        auth = None if sent_cookies else self.auth
         try:
-            response = self.session.request(method=method, url=self.api_url, auth=self.auth,
-                                            data=data, headers=headers, verify=self.validate_certs, timeout=timeout)
+            response = send_once(auth)
+            if response.status_code == 401 and auth is None:
+                # Session expired, log in again unless another thread already did
+                with self.session_lock:
+                    if get_session_cookies(self.session.cookies) == sent_cookies:
+                        self.session.cookies.clear()
+                        if self.session_cache:
+                            self.session_cache.clear()
+                auth = None if has_session_cookie(self.session.cookies) else self.auth
+                response = send_once(auth)
+                if response.status_code == 401 and auth is None:
+                    # The session of the other thread expired as well
+                    auth = self.auth
+                    response = send_once(auth)
         except requests.exceptions.RequestException as cerr:
-            self.module.fail_json("Request failed {0}".format(str(cerr)))
-
-        if response.ok:
-            return response
-        else:
-            self.module.fail_json("Request failed to complete, response code {0}, content {1}".format(
-                response.status_code, response.content))
+            return None, cerr
+
+        if auth is not None and self.session_cache:
+            with self.session_lock:
+                self.session_cache.save(self.session.cookies)
+        return response, None
+
+    def update_result(self, result):
+        """
+        This routine helps to add client statistics to a module result
+        Args:
+            result(dict): module result
+        Returns:
+            result(dict): module result
+        """
+        with self.stats_lock:
+            result["api_retries"] = dict(self.retry_stats)
+            result["api_polls"] = dict(self.poll_stats)
+        if self.api_stats is not None:
+            result["api_stats"] = self.api_stats.summary()
+        if self.profiler is not None:
+            if self.profiler.path:
+                result["profile_files"] = self.profiler.write()
+            else:
+                result["profile"] = self.profiler.report()
+        return result
+
+    def open_cassette(self, cassette_mode):
+        """
+        This routine helps to record requests to or replay them from params cassette_path
+        Args:
+            cassette_mode(str): record or replay
+        """
+        # Imported here, only runs with a cassette need it
+        from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_cassette import (
+            NutanixCassetteRecorder,
+            NutanixCassetteSession,
+            get_run_key
+        )
+
+        cassette_path = self.module.params["cassette_path"]
+        run_key = get_run_key(self.module)
+        if cassette_mode == "record":
+            self.cassette = NutanixCassetteRecorder(
+                cassette_path, run_key, secrets=(self.auth[1],), names=(self.auth[0],))
+            return
+        try:
+            self.session = NutanixCassetteSession(
+                cassette_path, run_key, self.api_base, clock=self.clock,
+                time_scale=self.module.params.get("cassette_time_scale") or 0)
+        except (IOError, OSError, ValueError) as err:
+            self.module.fail_json("Unable to replay cassette {0}, {1}".format(cassette_path, str(err)))
+
+    def get_page_tuner(self, kind, page_length):
+        """
+        This routine helps to get the page length tuner of an entity kind
+        Args:
+            kind(str): entity kind, e.g. vms
+            page_length(int): starting page length unless one is stored for this PC and kind
+        Returns:
+            tuner(obj): NutanixPageTuner, None unless adaptive paging is used
+        """
+        if self.page_tuner_factory is None:
+            return None
+        with self.page_tuners_lock:
+            tuner = self.page_tuners.get(kind)
+            if tuner is None:
+                tuner = self.page_tuners[kind] = self.page_tuner_factory(kind, page_length)
+        return tuner
 
     def check_dependencies(self):
-        if not HAS_REQUESTS:
+        if not import_requests():
             self.module.fail_json(
                 msg=missing_required_lib('requests'),
                 exception=REQUESTS_IMPORT_ERROR)
 
 
-def task_poll(task_uuid, client):
+def import_requests():
     """
-    This routine helps to poll given task and check if task is SUCCEEDED or FAILED
-    Args:
-        task_uuid(str): task uuid
-        client(obj): Rest client obj
+    This routine helps to import requests on first use
+    requests and urllib3 take most of the module start up time, so they are
+    not imported until a client is created, after argument validation.
     Returns:
-        Returns None in-case of SUCCESS else error_output incase of FAILURE
+        (bool): True if requests is available
     """
-    while True:
-        response = client.request(
-            api_endpoint="v3/tasks/{0}".format(task_uuid), method="GET", data=None)
-        if response.json()["status"] == "SUCCEEDED":
-            return None
-        elif response.json()["status"] == "FAILED":
-            error_out = response.json()["error_detail"]
-            return error_out
-        time.sleep(10)
+    global requests, REQUESTS_IMPORT_ERROR
+    if requests is None and REQUESTS_IMPORT_ERROR is None:
+        try:
+            requests = importlib.import_module("requests")
+        except ImportError:
+            REQUESTS_IMPORT_ERROR = traceback.format_exc()
+    return requests is not None
 
 
-def list_entities(api, filter, client):
+def is_idempotent_request(api_endpoint, method):
     """
-    This routine helps to list entities of a given api resource name and filter
+    This routine helps to determine if a request can be safely sent again
+    List and groups queries are read only even though they are POST requests.
     Args:
-        api(str): api resource name
-        filter(dict): filter payload
-        client(obj): Rest client obj
+        api_endpoint(str): api endpoint
+        method(str): http method
     Returns:
-        response.json()(dict): json object response
+        (bool): returns True/False
     """
-    response = client.request(
-        api_endpoint="v3/{0}/list".format(api), method="POST", data=json.dumps(filter))
-    return response.json()
+    if method.upper() in idempotent_methods:
+        return True
+    return method.upper() == "POST" and (api_endpoint.endswith("/list") or api_endpoint == "v3/groups")
 
 
-def get_vm_uuid(params, client):
+def get_retry_after(response):
     """
-    This routine helps to get vm uuid list of given name
+    This routine helps to parse the Retry-After header of a response
     Args:
-        params(obj): ansible params object
-        client(obj): Rest client obj
+        response(obj): response object
     Returns:
-        vm_uuid(list): List of vm uuid's of given name
+        (float): seconds to wait, None if the header is missing or invalid
     """
-    offset = 0
-    total_matches = 99999
-    vm_name = params['name']
-    vm_uuid = []
-    while offset < total_matches:
-        filter = {"filter": "vm_name=={0}".format(
-            vm_name), "length": length, "offset": offset}
-        vms_list = list_entities('vms', filter, client)
-        for vm in vms_list["entities"]:
-            if vm["status"]["name"] == vm_name:
-                vm_uuid.append(vm["metadata"]["uuid"])
-
-        total_matches = vms_list["metadata"]["total_matches"]
-        offset += length
-
-    return vm_uuid
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    # HTTP dates are rare, email.utils is only imported for them
+    from email.utils import mktime_tz, parsedate_tz
+    retry_date = parsedate_tz(value)
+    if retry_date is None:
+        return None
+    return max(mktime_tz(retry_date) - time.time(), 0)
 
 
-def get_vm(vm_uuid, client):
+def is_circuit_breaker_failure(response, error):
     """
-    This routine helps to get vm spec
+    This routine helps to decide if a failed request counts toward the circuit breaker
+    A 429 with Retry-After is PC pacing its clients, which the retry honours,
+    not PC failing.
     Args:
-        vm_uuid(str): vm uuid
-        client(obj): Rest client obj
+        response(obj): failed response, None on connection failures
+        error(obj): connection error, None if a response was received
     Returns:
-        get_virtual_machine.json()(dict): vm json object
+        (bool): returns True/False
     """
-    get_virtual_machine = client.request(
-        api_endpoint="v3/vms/{0}".format(vm_uuid), method="GET", data=None)
-    return get_virtual_machine.json()
+    if error is not None:
+        return True
+    if response.status_code == 429:
+        return get_retry_after(response) is None
+    return response.status_code >= 500
 
 
-def create_vm(data, client):
+def get_accept_encoding(compression):
     """
-    This routine helps to create vm
+    This routine helps to get the Accept-Encoding header value of the compression param
     Args:
-        data(dict): vm payload data
-        client(obj): Rest client obj
+        compression(bool): request gzip compressed responses, None means the default True
     Returns:
-        task_uuid(str): task uuid
-        image_uuid(str): image uuid
+        (str): header value
     """
-    response = client.request(
-        api_endpoint="v3/vms",
-        method="POST",
-        data=json.dumps(data)
-    )
-    json_content = response.json()
-    return (
-        json_content["status"]["execution_context"]["task_uuid"],
-        json_content["metadata"]["uuid"]
-    )
+    return "identity" if compression is False else "gzip"
 
 
-def update_vm(vm_uuid, data, client):
+def get_wire_bytes(response):
     """
-    This routine helps to update vm
+    This routine helps to get the size of a response body as received, before decompression
     Args:
-        vm_uuid(str): vm uuid
-        data(dict): image payload data
-        client(obj): Rest client obj
+        response(obj): response object
     Returns:
-        task_uuid(str): task uuid
+        (int): bytes read from the connection, the decoded size if unknown
     """
-    response = client.request(
-        api_endpoint="v3/vms/{0}".format(vm_uuid), method="PUT", data=json.dumps(data))
-    return response.json()["status"]["execution_context"]["task_uuid"]
+    wire_bytes = getattr(response, "wire_bytes", None)
+    if wire_bytes is None:
+        try:
+            # Bytes pulled from the socket by urllib3, compressed or not
+            wire_bytes = response.raw.tell()
+        except AttributeError:
+            # Replayed and in-process responses have no connection
+            wire_bytes = len(response.content)
+    return wire_bytes
 
 
-def delete_vm(vm_uuid, client):
+def iter_response_chunks(response):
     """
-    This routine helps to delete vm
+    This routine helps to read a response body in chunks, decompressed
     Args:
-        vm_uuid(str): vm uuid
-        client(obj): Rest client obj
+        response(obj): requests response, streamed or not
     Returns:
-        task_uuid(str): task uuid
+        (iter): body chunks as bytes
     """
-    response = client.request(
-        api_endpoint="v3/vms/{0}".format(vm_uuid), method="DELETE", data=None)
-    return response.json()["status"]["execution_context"]["task_uuid"]
+    if getattr(response, "raw", None) is None:
+        # Replayed and in-process responses are already in memory
+        return iter([response.content])
+    return response.iter_content(chunk_size)
 
 
-def update_powerstate_vm(vm_uuid, client, mechanism, power_state):
+def get_retry_delay(attempt, idempotent, response, error, client):
     """
-    This routine helps update vm power state
+    This routine helps to decide if a failed request is retried
     Args:
-        vm_uuid(str): image name
+        attempt(int): number of retries done so far
+        idempotent(bool): request can be safely sent again
+        response(obj): failed response, None on connection failures
+        error(obj): connection error, None if a response was received
         client(obj): Rest client obj
-        mechanism(str): power state mechanism
-        power_state(str): power state
     Returns:
-        power_state(method): update vm
+        delay(float): seconds to wait before retrying, None if not retried
     """
-    data = get_vm(vm_uuid, client)
-
-    if "status" in data:
-        del data["status"]
-
-    data["spec"]["resources"]["power_state"] = power_state
-
-    if "power_state_mechanism" in data["spec"]["resources"]:
-        data["spec"]["resources"]["power_state_mechanism"]["mechanism"] = mechanism
-    else:
-        data["spec"]["resources"] = {
-            "power_state_mechanism": {
-                "mechanism": mechanism
-            }
-        }
+    if attempt >= client.retries:
+        return None
+    if error is not None:
+        if not idempotent:
+            return None
+    elif response.status_code not in retry_any_method_status_codes and (
+            not idempotent or response.status_code not in retry_idempotent_status_codes):
+        return None
 
-    return update_vm(vm_uuid, data, client)
+    retry_after = get_retry_after(response) if response is not None else None
+    if retry_after is not None:
+        return min(retry_after, retry_max_retry_after)
+    # Full jitter exponential backoff
+    return random.uniform(0, min(client.retry_backoff * 2 ** attempt, retry_max_backoff))
 
 
-def get_image_uuid(image_name, client):
+def task_poll(task_uuid, client):
     """
-    This routine helps to get image uuid list of given name
+    This routine helps to poll given task and check if task is SUCCEEDED or FAILED
+    Polling starts at client.task_poll_interval and backs off with jitter towards
+    client.task_poll_max_interval, using the task progress to predict the next check.
     Args:
-        image_name(str): image name
+        task_uuid(str): task uuid
         client(obj): Rest client obj
     Returns:
-        image_uuid(list): List of image uuid's of given name
+        Returns None in-case of SUCCESS else error_output incase of FAILURE
     """
-    offset = 0
-    total_matches = 99999
-    image_uuid = []
-    while offset < total_matches:
-        filter = {"filter": "name=={0}".format(
-            image_name), "length": length, "offset": offset}
-        image_list = list_entities('images', filter, client)
-        for subnet in image_list["entities"]:
-            if subnet["status"]["name"] == image_name:
-                image_uuid.append(subnet["metadata"]["uuid"])
-
-        total_matches = image_list["metadata"]["total_matches"]
-        offset += length
-
-    return image_uuid
+    delay = client.task_poll_interval
+    poll_start = client.clock.time()
+    while True:
+        response = client.request(
+            api_endpoint="v3/tasks/{0}".format(task_uuid), method="GET", data=None)
+        client.add_stats(client.poll_stats, task_polls=1)
+        task = response.json()
+        if task["status"] == "SUCCEEDED":
+            return None
+        elif task["status"] == "FAILED":
+            error_out = task["error_detail"]
+            return error_out
+        sleep_time = get_task_poll_delay(task, delay, client, client.clock.time() - poll_start)
+        client.add_stats(client.poll_stats, task_poll_seconds=sleep_time)
+        client.clock.sleep(sleep_time, "task_poll")
+        delay = min(delay * task_poll_backoff, client.task_poll_max_interval)
 
 
-def get_image(image_uuid, client):
+def wait_for_tasks(task_uuids, client):
     """
-    This routine helps to get image spec
+    This routine helps to wait for multiple tasks using one tasks list query per polling round
+    Tasks missing from the list response are fetched individually.
     Args:
-        image_uuid(str): image uuid
+        task_uuids(list): list of task uuids
         client(obj): Rest client obj
     Returns:
-        get_image.json()(dict): image json object
+        (generator): yields (task_uuid, error_output) as tasks finish,
+        error_output is None in-case of SUCCESS
     """
-    get_image = client.request(
-        api_endpoint="v3/images/{0}".format(image_uuid), method="GET", data=None)
-    return get_image.json()
-
-
-def create_image(data, client):
+    pending = list(dict.fromkeys(task_uuids))
+    delay = client.task_poll_interval
+    poll_start = client.clock.time()
+    while pending:
+        tasks = get_tasks(pending, client)
+        client.add_stats(client.poll_stats, task_polls=(len(pending) + task_list_batch - 1) // task_list_batch)
+        running = []
+        for task_uuid in pending:
+            task = tasks.get(task_uuid)
+            if task is None:
+                task = client.request(
+                    api_endpoint="v3/tasks/{0}".format(task_uuid), method="GET", data=None).json()
+                client.add_stats(client.poll_stats, task_polls=1)
+            if task["status"] == "SUCCEEDED":
+                yield task_uuid, None
+            elif task["status"] == "FAILED":
+                yield task_uuid, task["error_detail"]
+            else:
+                running.append((task_uuid, task))
+
+        pending = [task_uuid for task_uuid, task in running]
+        if pending:
+            elapsed = client.clock.time() - poll_start
+            sleep_time = min(get_task_poll_delay(task, delay, client, elapsed)
+                             for task_uuid, task in running)
+            client.add_stats(client.poll_stats, task_poll_seconds=sleep_time)
+            client.clock.sleep(sleep_time, "task_poll")
+            delay = min(delay * task_poll_backoff, client.task_poll_max_interval)
+
+
+def get_tasks(task_uuids, client):
     """
-    This routine helps to create image
+    This routine helps to fetch task objects in batches through the tasks list api
     Args:
-        data(dict): image payload data
+        task_uuids(list): list of task uuids
         client(obj): Rest client obj
     Returns:
-        task_uuid(str): task uuid
-        image_uuid(str): image uuid
+        tasks(dict): map of task_uuid : task json object
     """
-    response = client.request(
-        api_endpoint="v3/images",
-        method="POST",
-        data=json.dumps(data)
-    )
-    json_content = response.json()
-    return (
-        json_content["status"]["execution_context"]["task_uuid"],
-        json_content["metadata"]["uuid"]
-    )
+    tasks = {}
+    for index in range(0, len(task_uuids), task_list_batch):
+        batch = task_uuids[index:index + task_list_batch]
+        filter = {
+            "kind": "task",
+            "length": len(batch),
+            "filter": ",".join("uuid=={0}".format(task_uuid) for task_uuid in batch)
+        }
+        task_list = list_entities('tasks', filter, client)
+        for task in task_list.get("entities", []):
+            task_uuid = get_task_uuid(task)
+            if task_uuid in batch:
+                tasks[task_uuid] = task
+    return tasks
 
 
-def update_image(image_uuid, data, client):
+def get_task_uuid(task):
     """
-    This routine helps to update image
+    This routine helps to get the uuid of a task json object
     Args:
-        image_uuid(str): image uuid
-        data(dict): image payload data
-        client(obj): Rest client obj
+        task(dict): task json object
     Returns:
         task_uuid(str): task uuid
     """
-    response = client.request(
-        api_endpoint="v3/images/{0}".format(image_uuid), method="PUT", data=json.dumps(data))
-    return response.json()["status"]["execution_context"]["task_uuid"]
+    if "uuid" in task:
+        return task["uuid"]
+    return task["metadata"]["uuid"]
 
 
-def delete_image(image_uuid, client):
+def get_task_poll_delay(task, delay, client, elapsed):
     """
-    This routine helps to delete image
+    This routine helps to compute the wait time before the next task poll
     Args:
-        image_uuid(str): image uuid
+        task(dict): task json object
+        delay(float): current backoff delay in seconds
         client(obj): Rest client obj
+        elapsed(float): seconds spent polling the task so far
     Returns:
-        task_uuid(str): task uuid
+        delay(float): seconds to sleep before the next poll
     """
-    response = client.request(
-        api_endpoint="v3/images/{0}".format(image_uuid), method="DELETE", data=None)
-    return response.json()["status"]["execution_context"]["task_uuid"]
+    percentage = task.get("percentage_complete") or 0
+    if 0 < percentage < 100:
+        task_elapsed = get_task_elapsed_time(task)
+        if task_elapsed is None:
+            task_elapsed = elapsed
+        # Estimate the remaining time from the progress rate seen so far
+        remaining = task_elapsed * (100 - percentage) / percentage
+        delay = max(client.task_poll_interval,
+                    min(remaining, client.task_poll_max_interval))
 
+    # Equal jitter keeps parallel pollers from hitting PC in lockstep
+    return delay / 2 + random.uniform(0, delay / 2)
 
-def get_cluster_uuid(cluster_name, client):
+
+def get_task_elapsed_time(task):
     """
-    This routine helps to get cluster uuid list using given name
+    This routine helps to get the server side run time of a task
     Args:
-        cluster_name(str): cluster name
-        client(obj): Rest client obj
+        task(dict): task json object
     Returns:
-        cluster_uuid(list): List of Cluster uuid's of given name
+        elapsed(float): seconds between start_time and completion_time or
+        last_update_time, None if the timestamps are not available
     """
-    offset = 0
-    total_matches = 99999
-    cluster_uuid = []
-    while offset < total_matches:
-        filter = {"filter": "name=={0}".format(
-            cluster_name), "length": length, "offset": offset}
-        cluster_list = list_entities('clusters', filter, client)
-        for cluster in cluster_list["entities"]:
-            if cluster["status"]["name"] == cluster_name:
-                cluster_uuid.append(cluster["metadata"]["uuid"])
+    start_time = parse_task_time(task.get("start_time"))
+    end_time = parse_task_time(
+        task.get("completion_time") or task.get("last_update_time"))
+    if start_time is None or end_time is None:
+        return None
+    return max((end_time - start_time).total_seconds(), 0)
 
-        total_matches = cluster_list["metadata"]["total_matches"]
-        offset += length
 
-    return cluster_uuid
+def parse_task_time(value):
+    """
+    This routine helps to parse task timestamps, e.g. 2021-06-01T10:00:00.123456Z
+    Args:
+        value(str): timestamp string
+    Returns:
+        (datetime): parsed timestamp, None if value can't be parsed
+    """
+    if not value:
+        return None
+    for time_format in ("%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ"):
+        try:
+            return datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+    return None
 
 
-def get_subnet_uuid(subnet_name, client):
+def list_entities(api, filter, client):
     """
-    This routine helps to get subnet uuid list using given name
+    This routine helps to list entities of a given api resource name and filter
     Args:
-        subnet_name(str): Subnet name
+        api(str): api resource name
+        filter(dict): filter payload
         client(obj): Rest client obj
     Returns:
-        subnet_uuid(list): List of Subnet uuid's of given name
+        response.json()(dict): json object response
     """
-    offset = 0
-    total_matches = 99999
-    subnet_uuid = []
-    while offset < total_matches:
-        filter = {"filter": "name=={0}".format(
-            subnet_name), "length": length, "offset": offset}
-        subnet_list = list_entities('subnets', filter, client)
-        for subnet in subnet_list["entities"]:
-            if subnet["status"]["name"] == subnet_name:
-                subnet_uuid.append(subnet["metadata"]["uuid"])
-
-        total_matches = subnet_list["metadata"]["total_matches"]
-        offset += length
-
-    return subnet_uuid
+    response = client.request(
+        api_endpoint="v3/{0}/list".format(api), method="POST", data=json.dumps(filter))
+    return response.json()
 
 
 def groups_call(filter, client):
@@ -385,125 +779,330 @@ def groups_call(filter, client):
     return groups_response.json()
 
 
-def get_cluster_storage_container_map(storage_container_name, client):
+def iter_pages(fetch_page, offset, page_length, get_total, workers=max_workers, tuner=None, read_ahead=None):
     """
-    This routine helps to create map of cluster_uuid : storage_container_uuid
+    This routine helps to page through a paginated api lazily
+    The first page is fetched alone to learn the total count, up to workers
+    following pages are then kept in flight and yielded in offset order.
+    Pending requests are cancelled when the caller stops iterating, and pages
+    fetched ahead but never yielded are closed so that streamed responses
+    return their connections to the pool.
     Args:
-        storage_container_name(str): Storage container name
-        client(obj): Rest client obj
+        fetch_page(func): callable returning the page for an offset and a page length
+        offset(int): offset of the first page
+        page_length(int): number of entities per page
+        get_total(func): callable returning the total count from a page
+        workers(int): maximum number of concurrent page requests
+        tuner(obj): NutanixPageTuner, its current page length is used for every request instead
+        read_ahead(func): callable reading a streamed page body, called by the worker for pages
+                          fetched while an earlier page is still to be consumed, the others stream
     Returns:
-        cluster_sc_map(dict): map of cluster_uuid : storage_container_uuid
+        (generator): yields pages in offset order
     """
-    offset = 0
-    total_matches = 99999
-    cluster_sc_map = {}
-    while offset < total_matches:
-        filter = {
-            "entity_type": "storage_container",
-            "group_member_attributes": [
-                {
-                    "attribute": "cluster"
-                },
-                {
-                    "attribute": "container_name"
-                }
-            ],
-            "group_member_count": length,
-            "group_member_offset": offset
-        }
-        sc_list = groups_call(filter, client)
-        for sc in sc_list["group_results"][0]["entity_results"]:
-            for attribute in sc["data"]:
-                if attribute["name"] == "container_name":
-                    sc_name = attribute["values"][0]["values"][0]
-                if attribute["name"] == "cluster":
-                    cluster = attribute["values"][0]["values"][0]
-                entity_id = sc["entity_id"]
-
-            if sc_name == storage_container_name:
-                cluster_sc_map[cluster] = entity_id
-
-        total_matches = sc_list["total_entity_count"]
-        offset += length
-
-    return cluster_sc_map
+    def get_page_length():
+        return tuner.page_length if tuner is not None else page_length
+
+    first_length = get_page_length()
+    first_page = fetch_page(offset, first_length)
+    yield first_page
+
+    total = get_total(first_page)
+
+    def iter_page_requests(offset):
+        # Lengths are picked as the requests are sent, after the pages before were measured
+        while offset < total:
+            length = get_page_length()
+            yield offset, length
+            offset += length
+
+    page_requests = iter_page_requests(offset + first_length)
+    if workers <= 1:
+        for offset, length in page_requests:
+            yield fetch_page(offset, length)
+        return
+
+    # Offset of the page the caller waits for or consumes
+    consuming = [None]
+
+    def fetch_ahead(offset, length):
+        page = fetch_page(offset, length)
+        if read_ahead is not None and consuming[0] != offset:
+            read_ahead(page)
+        return page
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    in_flight = deque((offset, executor.submit(fetch_ahead, offset, length))
+                      for offset, length in islice(page_requests, workers))
+    try:
+        while in_flight:
+            consuming[0], future = in_flight.popleft()
+            page = future.result()
+            for offset, length in islice(page_requests, 1):
+                in_flight.append((offset, executor.submit(fetch_ahead, offset, length)))
+            yield page
+    finally:
+        for offset, future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=True)
+        for offset, future in in_flight:
+            if not future.cancelled() and future.exception() is None:
+                close = getattr(future.result(), "close", None)
+                if close is not None:
+                    close()
+
+
+def record_page(tuner, page, count):
+    """
+    This routine helps to feed the page length tuner with a page that was read
+    Args:
+        tuner(obj): NutanixPageTuner or None
+        page(obj): NutanixResponse of the page, with its page_length set
+        count(int): number of entities in the page
+    """
+    if tuner is not None:
+        tuner.record(page.page_length, count, page.latency or 0, page.read_bytes or len(page.content))
 
 
-def is_uuid(UUID):
+def iter_entities(api, filter, client, length=None, workers=max_workers):
     """
-    This routine helps to determine given UUID is a valid uuid or not
+    This routine helps to iterate over all entities of a given api resource name and filter
     Args:
-        UUID(str): UUID string
+        api(str): api resource name
+        filter(dict): filter payload, offset and length are honoured if set
+        client(obj): Rest client obj
+        length(int): page length, defaults to filter length or client.page_length
+        workers(int): maximum number of concurrent page requests
     Returns:
-        (bool): returns True/False
+        (generator): yields entity json objects page by page
     """
-    try:
-        uuid.UUID(UUID)
-        return True
-    except ValueError:
-        return False
+    filter = dict(filter)
+    page_length = length or filter.get("length") or client.page_length
+    tuner = client.get_page_tuner(api, page_length)
+
+    if client.pagination == "keyset" and not filter.get("offset") and not filter.get("sort_attribute"):
+        def fetch_keyset_page(payload, document):
+            page = client.request(
+                api_endpoint="v3/{0}/list".format(api), method="POST", data=json.dumps(payload), stream=True)
+            page.page_length = payload["length"]
+            count = 0
+            for entity in page.iter_items("entities"):
+                count += 1
+                yield entity
+            document.update(page.json())
+            record_page(tuner, page, count)
+
+        for entity in iter_keyset_entities(fetch_keyset_page, filter, page_length, client.pagination_splits,
+                                           workers, tuner):
+            yield entity
+        return
+
+    def fetch_page(offset, length):
+        # Pages are decoded as they are read, one entity at a time
+        page = client.request(
+            api_endpoint="v3/{0}/list".format(api), method="POST",
+            data=json.dumps(dict(filter, offset=offset, length=length)), stream=True)
+        page.page_length = length
+        return page
+
+    def get_total(page):
+        return page.json()["metadata"]["total_matches"]
+
+    # Pages fetched ahead are read whole so that their transfer overlaps the decoding
+    for page in iter_pages(fetch_page, filter.get("offset") or 0, page_length, get_total, workers, tuner,
+                           read_ahead=NutanixResponse.read):
+        count = 0
+        for entity in page.iter_items("entities"):
+            count += 1
+            yield entity
+        record_page(tuner, page, count)
+
+
+def get_keyset_ranges(splits):
+    """
+    This routine helps to split the uuid key space into ranges of about the same size
+    Args:
+        splits(int): number of ranges
+    Returns:
+        ranges(list): (lower, upper) uuid prefixes, None for an open end
+    """
+    splits = max(1, min(splits, 0x10000))
+    bounds = ["{0:04x}".format(index * 0x10000 // splits) for index in range(1, splits)]
+    return list(zip([None] + bounds, bounds + [None]))
 
 
-def set_payload_keys(params, payload_format, payload):
+def add_fiql_terms(expression, terms):
     """
-    This routine helps to create dict from ansible input values. ignoring all the null values
+    This routine helps to AND terms to a FIQL filter
     Args:
-        params(obj): Ansible input object
-        payload_format(dict): Reference dict
-        payload(dict): Sets payload dict based on given params
+        expression(str): FIQL filter, may be empty
+        terms(list): FIQL terms every match must satisfy
     Returns:
-        payload(dict): returns final dict after setting all the params
+        (str): FIQL filter
     """
-    for i in payload_format.keys():
+    if not terms:
+        return expression
+    if not expression:
+        return ";".join(terms)
+    if "(" in expression:
+        return "({0});{1}".format(expression, ";".join(terms))
+    # ';' binds tighter than ',', so the terms are added to every OR clause
+    return ",".join("{0};{1}".format(clause, ";".join(terms)) for clause in expression.split(","))
 
-        if params[i] is None:
-            continue
-        elif type(params[i]) is dict:
-            payload[i] = set_payload_keys(params[i], payload_format[i], {})
-        elif type(params[i]) is list:
-            payload[i] = []
-            for item in params[i]:
-                payload[i].append(set_payload_keys(item, payload_format[i][0], {}))
-        elif type(params[i]) is str or type(params[i]) is int:
-            payload[i] = params[i]
-    return payload
 
+def iter_keyset_entities(fetch_page, filter, page_length, splits=pagination_splits, workers=max_workers, tuner=None):
+    """
+    This routine helps to page through a list api by key instead of offset
+    Pages are sorted by uuid and each one asks for the uuids after the last
+    one seen, so PC doesn't skip over the entities of earlier pages and
+    entities created or deleted during the scan don't shift later pages.
+    With splits > 1 the uuid space is cut into as many ranges, scanned in
+    parallel, and entities are yielded as their pages complete.
+    Args:
+        fetch_page(func): callable taking a list payload and a dict, returning an
+        iterator of the page entities and filling the dict with the other keys of the response
+        filter(dict): list payload, its filter is kept, offset and sort are replaced
+        page_length(int): number of entities per page
+        splits(int): number of uuid ranges scanned in parallel
+        workers(int): maximum number of concurrent page requests
+        tuner(obj): NutanixPageTuner, its current page length is used for every request instead
+    Returns:
+        (generator): yields entity json objects, each uuid once
+    """
+    cursors = [{"lower": lower, "upper": upper, "after": None, "done": False}
+               for lower, upper in get_keyset_ranges(splits)]
+    seen = set()
+
+    def read_page(cursor):
+        """Yield the entities of the next page of a range, moving its cursor past them"""
+        terms = []
+        if cursor["after"] is not None:
+            terms.append("{0}=gt={1}".format(keyset_attribute, cursor["after"]))
+        elif cursor["lower"] is not None:
+            terms.append("{0}=ge={1}".format(keyset_attribute, cursor["lower"]))
+        if cursor["upper"] is not None:
+            terms.append("{0}=lt={1}".format(keyset_attribute, cursor["upper"]))
+        length = tuner.page_length if tuner is not None else page_length
+        payload = dict(filter, offset=0, length=length, sort_attribute=keyset_attribute,
+                       sort_order="ASCENDING")
+        payload["filter"] = add_fiql_terms(filter.get("filter"), terms)
+        if not payload["filter"]:
+            del payload["filter"]
+        document = {}
+        count = 0
+        for entity in fetch_page(payload, document):
+            count += 1
+            cursor["after"] = max(cursor["after"] or "", entity["metadata"]["uuid"])
+            yield entity
+        # total_matches counts the rest of the range, this page included
+        total = document.get("metadata", {}).get("total_matches", count + 1)
+        cursor["done"] = count < length or total <= count
+
+    if len(cursors) == 1 or workers <= 1:
+        for cursor in cursors:
+            while not cursor["done"]:
+                for entity in read_page(cursor):
+                    if entity["metadata"]["uuid"] not in seen:
+                        seen.add(entity["metadata"]["uuid"])
+                        yield entity
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(workers, len(cursors)))
+    # One page in flight per range, a range's next page needs the last uuid of its previous one
+    in_flight = {}
+
+    def submit(cursor):
+        in_flight[executor.submit(lambda: list(read_page(cursor)))] = cursor
 
-def has_changed(source_payload, destination_payload):
+    try:
+        for cursor in cursors:
+            submit(cursor)
+        while in_flight:
+            for future in wait(in_flight, return_when=FIRST_COMPLETED)[0]:
+                cursor = in_flight.pop(future)
+                entities = future.result()
+                if not cursor["done"]:
+                    submit(cursor)
+                for entity in entities:
+                    if entity["metadata"]["uuid"] not in seen:
+                        seen.add(entity["metadata"]["uuid"])
+                        yield entity
+    finally:
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def iter_groups_entities(filter, client, length=None, workers=max_workers):
     """
-    This routine helps to compare 2 objects and find for differences.
+    This routine helps to iterate over all entity results of a groups api query
     Args:
-        source_payload(dict): Source payload dict
-        destination_payload(dict): Destination payload dict
+        filter(dict): groups payload, group_member_offset and group_member_count are honoured if set
+        client(obj): Rest client obj
+        length(int): page length, defaults to group_member_count or client.page_length
+        workers(int): maximum number of concurrent page requests
     Returns:
-        status(bool): returns bool value after comparision
-    """
-    status = False
-    for key in source_payload.keys():
-        if type(source_payload[key]) is dict:
-            status = has_changed(source_payload[key], destination_payload[key])
-        elif type(source_payload[key]) is list:
-            for i, item in enumerate(source_payload[key]):
-                try:
-                    status = has_changed(item, destination_payload[key][i])
-                except IndexError:
-                    status = True
-        elif type(source_payload[key]) is str or type(source_payload[key]) is int:
-            if source_payload[key] != destination_payload[key]:
-                return True
-
-        if status:
-            return status
-    return status
-
-
-def read_file(filename):
-    """
-    This routine helps to read the given file
+        (generator): yields entity_results json objects page by page
+    """
+    filter = dict(filter)
+    page_length = length or filter.get("group_member_count") or client.page_length
+    tuner = client.get_page_tuner("groups:{0}".format(filter.get("entity_type")), page_length)
+
+    def fetch_page(offset, length):
+        page = client.request(
+            api_endpoint="v3/groups", method="POST",
+            data=json.dumps(dict(filter, group_member_offset=offset, group_member_count=length)))
+        page.page_length = length
+        return page
+
+    def get_total(page):
+        return page.json()["total_entity_count"]
+
+    for page in iter_pages(fetch_page, filter.get("group_member_offset") or 0, page_length, get_total, workers, tuner):
+        count = 0
+        for group in page.json().get("group_results", [])[:1]:
+            for entity in group["entity_results"]:
+                count += 1
+                yield entity
+        record_page(tuner, page, count)
+
+
+def get_entity_uuids_by_name(api, filter_attribute, name, client):
+    """
+    This routine helps to get uuid list of entities matching the given name
     Args:
-        filename(str): name of the file to be read
+        api(str): api resource name
+        filter_attribute(str): name attribute used in the FIQL filter
+        name(str): entity name
+        client(obj): Rest client obj
+    Returns:
+        entity_uuid(list): List of entity uuid's of given name
+    """
+    entity_uuid = []
+    filter = {"filter": "{0}=={1}".format(filter_attribute, name)}
+    for entity in iter_entities(api, filter, client):
+        if entity["status"]["name"] == name:
+            entity_uuid.append(entity["metadata"]["uuid"])
+
+    return entity_uuid
+
+
+def get_cached_lookup(kind, name, client, lookup):
+    """
+    This routine helps to resolve a name through the client name cache
+    Empty results are not cached so newly created entities are found.
+    Args:
+        kind(str): entity kind
+        name(str): entity name
+        client(obj): Rest client obj
+        lookup(func): lookup routine called on a cache miss
     Returns:
-        f.read()(byte): byte string
+        value(obj): lookup result
     """
-    with open(filename, "r", encoding='utf-8') as f:
-        return f.read()
+    if client.name_cache is None:
+        return lookup()
+    value = client.name_cache.get(kind, name)
+    if value is None:
+        value = lookup()
+        if value:
+            client.name_cache.set(kind, name, value)
+    return value
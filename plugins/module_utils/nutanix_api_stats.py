@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import math
+import re
+import threading
+
+UUID_PATTERN = re.compile(
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+# Upper bounds in seconds of the cumulative latency histogram, mergeable across module runs
+latency_buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def get_endpoint_template(api_endpoint):
+    """
+    This routine helps to replace uuids in an api endpoint, e.g. v3/vms/{uuid}
+    Args:
+        api_endpoint(str): api endpoint
+    Returns:
+        (str): endpoint template
+    """
+    return UUID_PATTERN.sub("{uuid}", api_endpoint)
+
+
+def percentile(values, percent):
+    """
+    This routine helps to compute the nearest rank percentile of sorted values
+    Args:
+        values(list): sorted list of numbers
+        percent(int): percentile to compute
+    Returns:
+        (float): percentile value, 0 for an empty list
+    """
+    if not values:
+        return 0
+    rank = max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class NutanixApiStats(object):
+    """
+    Per request HTTP statistics of a NutanixApiClient
+
+    Each request records its method, endpoint template, status, latency and
+    request/response sizes, the response both as received and decompressed;
+    summary() aggregates them for module results.
+    Requests may be recorded from several threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = []
+
+    def record(self, method, api_endpoint, status, latency, request_bytes, response_bytes, response_wire_bytes=None):
+        """
+        This routine helps to record a single HTTP request
+        Args:
+            method(str): http method
+            api_endpoint(str): api endpoint
+            status(int): response status code, None on connection failures
+            latency(float): request latency in seconds
+            request_bytes(int): request body size
+            response_bytes(int): response body size
+            response_wire_bytes(int): response body size as received, smaller if compressed,
+            defaults to response_bytes
+        Returns:
+            record(dict): the record, see add_response_bytes
+        """
+        record = {
+            "method": method,
+            "endpoint": get_endpoint_template(api_endpoint),
+            "status": status,
+            "latency": latency,
+            "request_bytes": request_bytes,
+            "response_bytes": response_bytes,
+            "response_wire_bytes": response_bytes if response_wire_bytes is None else response_wire_bytes,
+        }
+        with self.lock:
+            self.records.append(record)
+        return record
+
+    def add_response_bytes(self, record, response_bytes, response_wire_bytes):
+        """
+        This routine helps to count the body of a streamed response once it was read
+        Args:
+            record(dict): record returned by record()
+            response_bytes(int): response body size
+            response_wire_bytes(int): response body size as received
+        """
+        with self.lock:
+            record["response_bytes"] += response_bytes
+            record["response_wire_bytes"] += response_wire_bytes
+
+    def summary(self):
+        """
+        This routine helps to aggregate the recorded requests
+        Returns:
+            api_stats(dict): call counts, latency percentiles and histogram and byte totals per endpoint
+        """
+        with self.lock:
+            records = list(self.records)
+        endpoints = {}
+        for record in records:
+            key = "{0} {1}".format(record["method"], record["endpoint"])
+            endpoint = endpoints.setdefault(key, {
+                "calls": 0, "errors": 0, "latencies": [], "request_bytes": 0, "response_bytes": 0,
+                "response_wire_bytes": 0})
+            endpoint["calls"] += 1
+            if record["status"] is None or record["status"] >= 400:
+                endpoint["errors"] += 1
+            endpoint["latencies"].append(record["latency"])
+            endpoint["request_bytes"] += record["request_bytes"]
+            endpoint["response_bytes"] += record["response_bytes"]
+            endpoint["response_wire_bytes"] += record["response_wire_bytes"]
+
+        for endpoint in endpoints.values():
+            latencies = sorted(endpoint.pop("latencies"))
+            endpoint["total_seconds"] = round(sum(latencies), 6)
+            endpoint["p50_seconds"] = round(percentile(latencies, 50), 6)
+            endpoint["p95_seconds"] = round(percentile(latencies, 95), 6)
+            endpoint["max_seconds"] = round(latencies[-1], 6)
+            endpoint["latency_buckets"] = dict(
+                (str(bound), sum(1 for latency in latencies if latency <= bound)) for bound in latency_buckets)
+
+        return {
+            "calls": len(records),
+            "total_seconds": round(sum(record["latency"] for record in records), 6),
+            "request_bytes": sum(record["request_bytes"] for record in records),
+            "response_bytes": sum(record["response_bytes"] for record in records),
+            "response_wire_bytes": sum(record["response_wire_bytes"] for record in records),
+            "endpoints": endpoints,
+        }
@@ -0,0 +1,543 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import asyncio
+import gzip
+import importlib
+import json
+import threading
+import traceback
+import zlib
+from ansible.module_utils.basic import missing_required_lib
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import (
+    NutanixApiError,
+    get_accept_encoding,
+    get_retry_delay,
+    get_task_poll_delay,
+    get_task_uuid,
+    is_circuit_breaker_failure,
+    is_idempotent_request,
+    length,
+    pool_maxsize,
+    retries,
+    retry_backoff,
+    task_list_batch,
+    task_poll_backoff,
+    task_poll_interval,
+    task_poll_max_interval
+)
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_cache import (
+    get_session_cookies,
+    session_cookie_names
+)
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_clock import (
+    NutanixClock,
+    NutanixSimulatedClock
+)
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_json import loads
+
+# Imported by import_aiohttp when the first asyncio client is opened
+aiohttp = None
+AIOHTTP_IMPORT_ERROR = None
+
+
+class NutanixAsyncResponse(object):
+    """Response of NutanixAsyncClient.request, the body is read and decompressed before the connection is released"""
+
+    def __init__(self, status_code, headers, content, wire_bytes=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.wire_bytes = len(content) if wire_bytes is None else wire_bytes
+        self.document = None
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        # Decoded once, with orjson if it is installed
+        if self.document is None:
+            self.document = loads(self.content)
+        return self.document
+
+
+class NutanixAsyncClient(object):
+    """
+    asyncio Nutanix Rest API client for large fan-out operations
+
+    Requests run as coroutines of one event loop, at most concurrency at a
+    time over an aiohttp pool of as many connections, so thousands of task
+    polls or entity GETs don't need a thread each. Retries, the circuit
+    breaker and the statistics follow NutanixApiClient; one coroutine logs
+    in while the others wait for its session cookie. Failed requests raise
+    NutanixApiError. The client must be opened inside the event loop using
+    it, synchronous code drives it through run_async or run_coroutine.
+    """
+
+    def __init__(self, api_base, auth, validate_certs=True, concurrency=None,
+                 retries=retries, retry_backoff=retry_backoff, clock=None, cookies=None, compression=True):
+        self.api_base = api_base
+        self.auth = auth
+        self.validate_certs = validate_certs
+        self.accept_encoding = get_accept_encoding(compression)
+        self.concurrency = concurrency or pool_maxsize
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.clock = clock or NutanixClock()
+        # name : value of the PC session cookies, sent instead of credentials
+        self.cookies = dict(cookies or {})
+        self.page_length = length
+        self.task_poll_interval = task_poll_interval
+        self.task_poll_max_interval = task_poll_max_interval
+        self.retry_stats = {"retries": 0, "backoff_seconds": 0.0}
+        self.poll_stats = {"task_polls": 0, "task_poll_seconds": 0.0, "ip_polls": 0, "ip_wait_seconds": 0.0}
+        self.stats_lock = threading.Lock()
+        self.api_stats = None
+        self.circuit_breaker = None
+        self.session = None
+        self.semaphore = None
+        self.login_lock = None
+
+    @classmethod
+    def from_client(cls, client, concurrency=None):
+        """
+        This routine helps to create an asyncio client sharing the settings of a NutanixApiClient
+        The PC session cookie is copied, the statistics, circuit breaker and
+        clock are shared, so results and api_stats cover both engines.
+        Args:
+            client(obj): Rest client obj
+            concurrency(int): maximum requests in flight, defaults to params pool_maxsize
+        Returns:
+            async_client(obj): NutanixAsyncClient, not opened yet
+        """
+        async_client = cls(
+            client.api_base, client.auth, validate_certs=client.validate_certs,
+            concurrency=concurrency or client.module.params.get("pool_maxsize"),
+            retries=client.retries, retry_backoff=client.retry_backoff, clock=client.clock,
+            cookies=get_session_cookies(client.session.cookies),
+            compression=client.module.params.get("compression"))
+        async_client.page_length = client.page_length
+        async_client.task_poll_interval = client.task_poll_interval
+        async_client.task_poll_max_interval = client.task_poll_max_interval
+        async_client.retry_stats = client.retry_stats
+        async_client.poll_stats = client.poll_stats
+        async_client.stats_lock = client.stats_lock
+        async_client.api_stats = client.api_stats
+        async_client.circuit_breaker = client.circuit_breaker
+        return async_client
+
+    async def __aenter__(self):
+        self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_traceback):
+        await self.close()
+
+    def open(self):
+        """
+        This routine helps to create the connection pool, inside the running event loop
+        """
+        if not import_aiohttp():
+            raise NutanixApiError(missing_required_lib('aiohttp'))
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.login_lock = asyncio.Lock()
+        connector_args = {"limit": self.concurrency}
+        if not self.validate_certs:
+            connector_args["ssl"] = False
+        # Cookies are handled by send(), PC sets them for the host name only. Bodies are
+        # decompressed by send_once() so that the compressed size can be recorded.
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(**connector_args), cookie_jar=aiohttp.DummyCookieJar(),
+            auto_decompress=False)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, api_endpoint, method, data, timeout=20):
+        api_url = "{0}/{1}".format(self.api_base, api_endpoint)
+        headers = {'Content-Type': 'application/json',
+                   'Accept': 'application/json'}
+        idempotent = is_idempotent_request(api_endpoint, method)
+        attempt = 0
+        # The request whose failure opened the breaker still gets its retries
+        tripped = False
+        while True:
+            open_for = self.circuit_breaker.open_for() if self.circuit_breaker is not None and not tripped else 0
+            if open_for:
+                raise NutanixApiError(
+                    "Request not sent, PC failed {0} consecutive requests, retry after {1:.0f} seconds".format(
+                        self.circuit_breaker.state["failures"], open_for))
+
+            start = self.clock.time()
+            response, error = await self.send(method, api_url, data, headers, timeout)
+            latency = self.clock.time() - start
+            if self.api_stats is not None:
+                self.api_stats.record(
+                    method, api_endpoint, response.status_code if error is None else None,
+                    latency, len(data or ""), len(response.content) if error is None else 0,
+                    response.wire_bytes if error is None else 0)
+            if error is None and response.ok:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_success()
+                return response
+            if self.circuit_breaker is not None and is_circuit_breaker_failure(response, error):
+                tripped = self.circuit_breaker.record_failure() or tripped
+
+            delay = get_retry_delay(attempt, idempotent, response, error, self)
+            if delay is None:
+                break
+            attempt += 1
+            self.add_stats(self.retry_stats, retries=1, backoff_seconds=delay)
+            await self.sleep(delay, "retry")
+
+        if error is not None:
+            raise NutanixApiError("Request failed {0}".format(str(error) or repr(error)))
+        raise NutanixApiError("Request failed to complete, response code {0}, content {1}".format(
+            response.status_code, response.content))
+
+    async def send(self, method, api_url, data, headers, timeout):
+        """
+        This routine helps to send a single request with the current PC session
+        Returns:
+            (tuple): (response, None) or (None, error) on connection failures
+        """
+        sent_cookies = dict(self.cookies)
+        try:
+            if sent_cookies:
+                response = await self.send_once(method, api_url, data, headers, timeout, None)
+                if response.status_code != 401:
+                    return response, None
+            # Log in one coroutine at a time, the others reuse its session
+            async with self.login_lock:
+                if not self.cookies or self.cookies == sent_cookies:
+                    self.cookies.clear()
+                    return await self.send_once(method, api_url, data, headers, timeout, self.auth), None
+            response = await self.send_once(method, api_url, data, headers, timeout, None)
+            if response.status_code == 401:
+                # The new session expired as well
+                response = await self.send_once(method, api_url, data, headers, timeout, self.auth)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as cerr:
+            return None, cerr
+        return response, None
+
+    async def send_once(self, method, api_url, data, headers, timeout, auth):
+        """
+        This routine helps to send one HTTP request, credentials are only sent if auth is set
+        Returns:
+            response(obj): NutanixAsyncResponse
+        """
+        headers = dict(headers, **{"Accept-Encoding": self.accept_encoding})
+        if auth is None:
+            headers["Cookie"] = "; ".join("{0}={1}".format(name, value) for name, value in self.cookies.items())
+        async with self.semaphore:
+            async with self.session.request(
+                    method, api_url, data=data, headers=headers,
+                    auth=aiohttp.BasicAuth(*auth) if auth else None,
+                    timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                raw_content = await response.read()
+                for name, morsel in response.cookies.items():
+                    if name in session_cookie_names:
+                        self.cookies[name] = morsel.value
+        return NutanixAsyncResponse(response.status, response.headers,
+                                    decode_content(raw_content, response.headers), len(raw_content))
+
+    async def sleep(self, seconds, reason):
+        """Sleep through the client clock, a simulated clock only yields to the other coroutines"""
+        if isinstance(self.clock, NutanixSimulatedClock):
+            self.clock.sleep(seconds, reason)
+            await asyncio.sleep(0)
+        else:
+            await asyncio.sleep(seconds)
+
+    def add_stats(self, stats, **increments):
+        """
+        This routine helps to add to retry_stats or poll_stats, which may be shared with a NutanixApiClient
+        Args:
+            stats(dict): retry_stats or poll_stats
+            increments(dict): key : value to add
+        """
+        with self.stats_lock:
+            for key, value in increments.items():
+                stats[key] += value
+
+    async def list_entities(self, api, filter):
+        """
+        This routine helps to list entities of a given api resource name and filter
+        Args:
+            api(str): api resource name
+            filter(dict): filter payload
+        Returns:
+            (dict): json object response
+        """
+        response = await self.request(
+            api_endpoint="v3/{0}/list".format(api), method="POST", data=json.dumps(filter))
+        return response.json()
+
+    async def list_all_entities(self, api, filter, length=None):
+        """
+        This routine helps to list all entities of a given api resource name and filter
+        The first page is fetched alone to learn the total count, all
+        following pages are then requested at once.
+        Args:
+            api(str): api resource name
+            filter(dict): filter payload, offset and length are honoured if set
+            length(int): page length, defaults to filter length or page_length
+        Returns:
+            entities(list): entity json objects in offset order
+        """
+        filter = dict(filter)
+        page_length = length or filter.get("length") or self.page_length
+        offset = filter.get("offset") or 0
+        first_page = await self.list_entities(api, dict(filter, offset=offset, length=page_length))
+        pages = await asyncio.gather(*[
+            self.list_entities(api, dict(filter, offset=page_offset, length=page_length))
+            for page_offset in range(offset + page_length, first_page["metadata"]["total_matches"], page_length)])
+        return [entity for page in [first_page] + list(pages) for entity in page["entities"]]
+
+    async def get_vm(self, vm_uuid):
+        """
+        This routine helps to get vm spec
+        Args:
+            vm_uuid(str): vm uuid
+        Returns:
+            (dict): vm json object
+        """
+        response = await self.request(
+            api_endpoint="v3/vms/{0}".format(vm_uuid), method="GET", data=None)
+        return response.json()
+
+    async def get_vms(self, vm_uuids):
+        """
+        This routine helps to get the specs of many vms concurrently
+        Args:
+            vm_uuids(list): vm uuids
+        Returns:
+            (list): vm json objects in vm_uuids order
+        """
+        return list(await asyncio.gather(*[self.get_vm(vm_uuid) for vm_uuid in vm_uuids]))
+
+    async def create_vm(self, data):
+        """
+        This routine helps to create vm
+        Args:
+            data(dict): vm payload data
+        Returns:
+            task_uuid(str): task uuid
+            vm_uuid(str): vm uuid
+        """
+        response = await self.request(
+            api_endpoint="v3/vms", method="POST", data=json.dumps(data))
+        json_content = response.json()
+        return (
+            json_content["status"]["execution_context"]["task_uuid"],
+            json_content["metadata"]["uuid"]
+        )
+
+    async def task_poll(self, task_uuid):
+        """
+        This routine helps to poll given task and check if task is SUCCEEDED or FAILED
+        The poll interval follows task_poll of the synchronous client.
+        Args:
+            task_uuid(str): task uuid
+        Returns:
+            Returns None in-case of SUCCESS else error_output incase of FAILURE
+        """
+        delay = self.task_poll_interval
+        poll_start = self.clock.time()
+        while True:
+            response = await self.request(
+                api_endpoint="v3/tasks/{0}".format(task_uuid), method="GET", data=None)
+            self.add_stats(self.poll_stats, task_polls=1)
+            task = response.json()
+            if task["status"] == "SUCCEEDED":
+                return None
+            elif task["status"] == "FAILED":
+                return task["error_detail"]
+            sleep_time = get_task_poll_delay(task, delay, self, self.clock.time() - poll_start)
+            self.add_stats(self.poll_stats, task_poll_seconds=sleep_time)
+            await self.sleep(sleep_time, "task_poll")
+            delay = min(delay * task_poll_backoff, self.task_poll_max_interval)
+
+    async def get_tasks(self, task_uuids):
+        """
+        This routine helps to fetch task objects through concurrent tasks list queries
+        Args:
+            task_uuids(list): list of task uuids
+        Returns:
+            tasks(dict): map of task_uuid : task json object
+        """
+        batches = [task_uuids[index:index + task_list_batch]
+                   for index in range(0, len(task_uuids), task_list_batch)]
+        task_lists = await asyncio.gather(*[
+            self.list_entities("tasks", {
+                "kind": "task",
+                "length": len(batch),
+                "filter": ",".join("uuid=={0}".format(task_uuid) for task_uuid in batch)
+            }) for batch in batches])
+        self.add_stats(self.poll_stats, task_polls=len(batches))
+        tasks = {}
+        for batch, task_list in zip(batches, task_lists):
+            for task in task_list.get("entities", []):
+                task_uuid = get_task_uuid(task)
+                if task_uuid in batch:
+                    tasks[task_uuid] = task
+        return tasks
+
+    async def wait_for_tasks(self, task_uuids):
+        """
+        This routine helps to wait for many tasks, polling all of them in one round of list queries
+        Tasks missing from the list responses are fetched individually.
+        Args:
+            task_uuids(list): list of task uuids
+        Returns:
+            (async generator): yields (task_uuid, error_output) as tasks finish,
+            error_output is None in-case of SUCCESS
+        """
+        pending = list(dict.fromkeys(task_uuids))
+        delay = self.task_poll_interval
+        poll_start = self.clock.time()
+        while pending:
+            tasks = await self.get_tasks(pending)
+            missing = [task_uuid for task_uuid in pending if task_uuid not in tasks]
+            for task_uuid, response in zip(missing, await asyncio.gather(*[
+                    self.request(api_endpoint="v3/tasks/{0}".format(task_uuid), method="GET", data=None)
+                    for task_uuid in missing])):
+                tasks[task_uuid] = response.json()
+            self.add_stats(self.poll_stats, task_polls=len(missing))
+
+            running = []
+            for task_uuid in pending:
+                task = tasks[task_uuid]
+                if task["status"] == "SUCCEEDED":
+                    yield task_uuid, None
+                elif task["status"] == "FAILED":
+                    yield task_uuid, task["error_detail"]
+                else:
+                    running.append((task_uuid, task))
+
+            pending = [task_uuid for task_uuid, task in running]
+            if pending:
+                elapsed = self.clock.time() - poll_start
+                sleep_time = min(get_task_poll_delay(task, delay, self, elapsed)
+                                 for task_uuid, task in running)
+                self.add_stats(self.poll_stats, task_poll_seconds=sleep_time)
+                await self.sleep(sleep_time, "task_poll")
+                delay = min(delay * task_poll_backoff, self.task_poll_max_interval)
+
+
+def import_aiohttp():
+    """
+    This routine helps to import aiohttp on first use, it is only needed by the asyncio engine
+    Returns:
+        (bool): True if aiohttp is available
+    """
+    global aiohttp, AIOHTTP_IMPORT_ERROR
+    if aiohttp is None and AIOHTTP_IMPORT_ERROR is None:
+        try:
+            aiohttp = importlib.import_module("aiohttp")
+        except ImportError:
+            AIOHTTP_IMPORT_ERROR = traceback.format_exc()
+    return aiohttp is not None
+
+
+def decode_content(raw_content, headers):
+    """
+    This routine helps to decompress a response body according to its Content-Encoding
+    Args:
+        raw_content(bytes): body as received
+        headers(dict): response headers
+    Returns:
+        (bytes): decompressed body
+    """
+    encoding = (headers.get("Content-Encoding") or "identity").lower()
+    if encoding == "gzip":
+        return gzip.decompress(raw_content)
+    if encoding == "deflate":
+        return zlib.decompress(raw_content)
+    return raw_content
+
+
+def update_cookie_jar(cookie_jar, cookies):
+    """
+    This routine helps to store the session cookies of an asyncio client in a requests cookie jar
+    Args:
+        cookie_jar(obj): requests cookie jar
+        cookies(dict): name : value of the session cookies
+    Returns:
+        (bool): True if the jar changed
+    """
+    cookies = sorted(cookies.items())
+    if not cookies or cookies == get_session_cookies(cookie_jar):
+        return False
+    cookie_jar.clear()
+    for name, value in cookies:
+        cookie_jar.set(name, value)
+    return True
+
+
+def run_coroutine(coroutine):
+    """
+    This routine helps to run a coroutine to completion from synchronous code
+    A new event loop is used, in a separate thread if the calling thread
+    already runs one.
+    Args:
+        coroutine(obj): coroutine object
+    Returns:
+        result of the coroutine
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = asyncio.run(coroutine)
+        except BaseException as err:
+            outcome["error"] = err
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def run_async(client, operation, *args):
+    """
+    This routine helps a module to run an operation on the asyncio engine
+    operation is called with a NutanixAsyncClient created by from_client
+    and args. A session cookie it obtains is handed back to client and its
+    session cache. The module fails if aiohttp is missing or a request fails.
+    Args:
+        client(obj): Rest client obj
+        operation(func): coroutine function, e.g. NutanixAsyncClient.list_all_entities
+        args(list): arguments passed to operation after the asyncio client
+    Returns:
+        result of operation
+    """
+    if not import_aiohttp():
+        client.module.fail_json(msg=missing_required_lib('aiohttp'), exception=AIOHTTP_IMPORT_ERROR)
+
+    async def run():
+        async with NutanixAsyncClient.from_client(client) as async_client:
+            try:
+                return await operation(async_client, *args)
+            finally:
+                with client.session_lock:
+                    if update_cookie_jar(client.session.cookies, async_client.cookies) and client.session_cache:
+                        client.session_cache.save(client.session.cookies)
+
+    try:
+        return run_coroutine(run())
+    except NutanixApiError as err:
+        client.fail(str(err), api_retries=client.retry_stats)
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+
+session_cache_path = os.path.join("~", ".ansible", "tmp", "nutanix_sessions")
+session_cache_ttl = 600
+session_cookie_names = ("NTNX_IGW_SESSION", "JSESSIONID")
+# PBKDF2 rounds of the credential check stored with cached cookies
+session_credential_rounds = 10000
+circuit_breaker_path = os.path.join("~", ".ansible", "tmp", "nutanix_circuit_breaker")
+circuit_breaker_threshold = 5
+circuit_breaker_cooldown = 60
+
+
+def read_state(path, default):
+    """
+    This routine helps to read a json state file
+    Args:
+        path(str): file path
+        default(obj): value returned if the file is missing or unreadable
+    Returns:
+        (obj): decoded state
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return default
+
+
+def write_state(path, state):
+    """
+    This routine helps to replace a json state file atomically, errors are ignored
+    Args:
+        path(str): file path, its directory is created readable by the current user only
+        state(obj): json serializable state
+    """
+    try:
+        cache_dir = os.path.dirname(path)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, mode=0o700)
+        tmp_path = "{0}.{1}".format(path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+def has_session_cookie(cookie_jar):
+    """
+    This routine helps to check if a cookie jar holds a PC session cookie
+    Args:
+        cookie_jar(obj): requests cookie jar
+    Returns:
+        (bool): returns True/False
+    """
+    return any(cookie.name in session_cookie_names for cookie in cookie_jar)
+
+
+def get_session_cookies(cookie_jar):
+    """
+    This routine helps to get the PC session cookies of a cookie jar
+    Args:
+        cookie_jar(obj): requests cookie jar
+    Returns:
+        (list): sorted (name, value) tuples, empty without a session
+    """
+    return sorted((cookie.name, cookie.value) for cookie in cookie_jar if cookie.name in session_cookie_names)
+
+
+class NutanixSessionCache(object):
+    """
+    Local cache of PC session cookies, reused by later module runs
+
+    Only the session cookies are stored, never the credentials. Each PC host
+    and user gets its own file, readable by the current user only. A salted
+    PBKDF2 hash of the password is stored along, cookies cached with another
+    password are dropped instead of reused, so a wrong or rotated password
+    is noticed on the next run.
+    """
+
+    def __init__(self, pc_host, username, password, ttl=session_cache_ttl, path=session_cache_path):
+        self.ttl = ttl
+        self.password = password
+        cache_dir = os.path.expanduser(path)
+        key = hashlib.sha256("{0}@{1}".format(username, pc_host).encode("utf-8")).hexdigest()
+        self.path = os.path.join(cache_dir, key + ".json")
+
+    def hash_password(self, salt):
+        """Return the hex PBKDF2 hash of the password with a hex salt"""
+        return binascii.hexlify(hashlib.pbkdf2_hmac(
+            "sha256", (self.password or "").encode("utf-8"), binascii.unhexlify(salt),
+            session_credential_rounds)).decode("ascii")
+
+    def load(self, cookie_jar):
+        """
+        This routine helps to restore cached session cookies
+        Args:
+            cookie_jar(obj): requests cookie jar to restore the cookies into
+        Returns:
+            (bool): returns True if a valid session was restored
+        """
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+        if data.get("expires", 0) < time.time():
+            return False
+        salt, credentials = data.get("salt"), data.get("credentials")
+        if not salt or not credentials or not hmac.compare_digest(self.hash_password(salt), credentials):
+            # Cached by a run with other credentials
+            self.clear()
+            return False
+        for cookie in data.get("cookies", []):
+            cookie_jar.set(cookie["name"], cookie["value"],
+                           domain=cookie["domain"], path=cookie["path"])
+        return has_session_cookie(cookie_jar)
+
+    def save(self, cookie_jar):
+        """
+        This routine helps to store the session cookies of a cookie jar
+        Args:
+            cookie_jar(obj): requests cookie jar
+        """
+        cookies = [dict(name=cookie.name, value=cookie.value, domain=cookie.domain, path=cookie.path)
+                   for cookie in cookie_jar if cookie.name in session_cookie_names]
+        if not cookies:
+            return
+        salt = binascii.hexlify(os.urandom(16)).decode("ascii")
+        data = {"expires": time.time() + self.ttl, "salt": salt, "credentials": self.hash_password(salt),
+                "cookies": cookies}
+        try:
+            cache_dir = os.path.dirname(self.path)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, mode=0o700)
+            tmp_path = "{0}.{1}".format(self.path, os.getpid())
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError):
+            pass
+
+    def clear(self):
+        """This routine helps to drop the cached session"""
+        try:
+            os.remove(self.path)
+        except (IOError, OSError):
+            pass
+
+
+class NutanixCircuitBreaker(object):
+    """
+    Consecutive failure counter of a PC host shared by module runs
+
+    Once threshold consecutive requests have failed the breaker opens and
+    requests fail fast for cooldown seconds, after which a single failure
+    opens it again while a success closes it. The state is re-read from the
+    shared file before every request, so a breaker opened or closed by another
+    fork applies to running module runs as well.
+    """
+
+    def __init__(self, pc_host, threshold=circuit_breaker_threshold,
+                 cooldown=circuit_breaker_cooldown, path=circuit_breaker_path):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        key = hashlib.sha256(pc_host.encode("utf-8")).hexdigest()
+        self.path = os.path.join(os.path.expanduser(path), key + ".json")
+        self.lock = threading.Lock()
+        self.state = self._read()
+
+    def _read(self):
+        return read_state(self.path, {"failures": 0, "open_until": 0})
+
+    def _write(self):
+        write_state(self.path, self.state)
+
+    def open_for(self):
+        """
+        This routine helps to check if requests should fail fast
+        Returns:
+            (float): seconds until the breaker closes, 0 if requests are allowed
+        """
+        if not self.threshold:
+            return 0
+        self.state = self._read()
+        return max(self.state["open_until"] - time.time(), 0)
+
+    def record_failure(self):
+        """
+        This routine helps to count a failed request
+        Returns:
+            (bool): True if this failure opened the breaker
+        """
+        if not self.threshold:
+            return False
+        with self.lock:
+            self.state = self._read()
+            self.state["failures"] += 1
+            opened = self.state["failures"] >= self.threshold
+            if opened:
+                self.state["open_until"] = time.time() + self.cooldown
+            self._write()
+        return opened
+
+    def record_success(self):
+        """This routine helps to reset the failure count after a successful request, in any fork"""
+        if not self.threshold:
+            return
+        with self.lock:
+            self.state = self._read()
+            if self.state["failures"] or self.state["open_until"]:
+                self.state = {"failures": 0, "open_until": 0}
+                self._write()
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+
+from ansible.module_utils.six import string_types
+
+cassette_modes = ("record", "replay")
+# Response headers kept in a cassette, cookies and auth challenges are never recorded
+cassette_headers = ("Content-Type", "Retry-After")
+# Module params left out of the run key, they don't change the requests sent
+cassette_ignored_params = ("pc_username", "pc_password", "cassette_path", "cassette_mode", "cassette_time_scale")
+scrubbed = "********"
+
+
+def open_cassette(path, mode):
+    """
+    This routine helps to open a cassette file, gzip compressed if the path ends with .gz
+    Args:
+        path(str): cassette file path
+        mode(str): file mode
+    Returns:
+        (obj): file object
+    """
+    path = os.path.expanduser(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    return open(path, mode)
+
+
+def get_run_key(module):
+    """
+    This routine helps to identify a module run in a cassette
+    Runs of the same module with the same params get the same key, so a
+    replayed run picks the interactions recorded for it.
+    Args:
+        module(obj): Ansible module object
+    Returns:
+        (str): run key
+    """
+    params = dict((key, value) for key, value in module.params.items()
+                  if key not in cassette_ignored_params)
+    data = json.dumps([getattr(module, "_name", ""), params], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+def get_cookie_values(response):
+    """
+    This routine helps to get the cookie values sent with a request and set by its response
+    Args:
+        response(obj): requests response object
+    Returns:
+        (list): cookie values
+    """
+    values = [cookie.value for cookie in getattr(response, "cookies", None) or ()]
+    request = getattr(response, "request", None)
+    header = request.headers.get("Cookie") if request is not None else None
+    for cookie in (header or "").split(";"):
+        values.append(cookie.partition("=")[2].strip())
+    # Session ids are long tokens, short values such as flags would scrub common words
+    return [value for value in values if len(value) >= 8]
+
+
+class NutanixCassetteRecorder(object):
+    """
+    Appends the request/response pairs of a module run to a cassette file
+
+    Each interaction is one compact JSON line holding the run key, method,
+    endpoint, request body, status, response body and latency. Endpoints are
+    relative to the API base, authentication and cookie headers are never
+    written. The password, the username and the values of the cookies sent
+    or set, such as session ids, are scrubbed from the string values of
+    bodies, so scrubbed JSON bodies stay valid JSON.
+    """
+
+    def __init__(self, path, run_key, secrets=(), names=()):
+        self.lock = threading.Lock()
+        self.path = path
+        self.run_key = run_key
+        # Scrubbed wherever they appear, e.g. the password
+        self.secrets = [secret for secret in secrets if secret]
+        # Scrubbed as whole words only, e.g. the username
+        self.names = [name for name in names if name]
+
+    def scrub_text(self, text, names):
+        for secret in self.secrets:
+            text = text.replace(secret, scrubbed)
+        if names:
+            pattern = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+            text = re.sub(r"(?<![\w@-])(?:{0})(?![\w@-])".format(pattern), scrubbed, text)
+        return text
+
+    def scrub_value(self, value, names):
+        if isinstance(value, dict):
+            return dict((key, self.scrub_value(item, names)) for key, item in value.items())
+        if isinstance(value, list):
+            return [self.scrub_value(item, names) for item in value]
+        if isinstance(value, string_types):
+            return self.scrub_text(value, names)
+        return value
+
+    def scrub(self, text, names):
+        """
+        This routine helps to scrub the secrets and names from a body
+        Bodies without them are kept as sent, so that replayed requests still
+        match them.
+        Args:
+            text(str): request or response body
+            names(list): values scrubbed as whole words, e.g. the username and cookie values
+        Returns:
+            (str): scrubbed body
+        """
+        variants = set()
+        for value in self.secrets + names:
+            variants.update((value, json.dumps(value)[1:-1]))
+        if not any(variant in text for variant in variants):
+            return text
+        try:
+            document = json.loads(text)
+        except ValueError:
+            return self.scrub_text(text, names)
+        scrubbed_document = self.scrub_value(document, names)
+        if scrubbed_document == document:
+            return text
+        return json.dumps(scrubbed_document, separators=(",", ":"))
+
+    def record(self, method, api_endpoint, data, response, latency):
+        """
+        This routine helps to append an interaction to the cassette
+        Args:
+            method(str): http method
+            api_endpoint(str): api endpoint
+            data(str): request body
+            response(obj): response object
+            latency(float): request latency in seconds
+        """
+        names = self.names + get_cookie_values(response)
+        interaction = {
+            "run": self.run_key,
+            "method": method,
+            "endpoint": api_endpoint,
+            "request": self.scrub(data, names) if data else None,
+            "status": response.status_code,
+            "headers": dict((name, response.headers[name]) for name in cassette_headers
+                            if name in response.headers),
+            "response": self.scrub(response.text, names),
+            "latency": round(latency, 6),
+        }
+        with self.lock, open_cassette(self.path, "a") as f:
+            f.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+
+
+class NutanixCassetteSession(object):
+    """
+    requests.Session look-alike serving responses from a cassette file
+
+    Interactions recorded for the same run key are preferred. A request is
+    matched with the first unused interaction of the same method, endpoint
+    and body, then of the same method and endpoint; once those are used up
+    the last match is served again, e.g. for extra task polls. Recorded
+    latencies are waited for scaled by time_scale, 0 replays without delay.
+    """
+
+    def __init__(self, path, run_key, api_base, clock, time_scale=0):
+        # requests is imported on first use, see nutanix_api_client.import_requests
+        from requests.cookies import RequestsCookieJar
+        self.api_base = api_base
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.time_scale = time_scale
+        self.cookies = RequestsCookieJar()
+        self.headers = {}
+        with open_cassette(path, "r") as f:
+            interactions = [json.loads(line) for line in f if line.strip()]
+        run_interactions = [interaction for interaction in interactions if interaction["run"] == run_key]
+        # (method, endpoint) : interactions in recorded order
+        self.interactions = {}
+        for interaction in run_interactions or interactions:
+            key = (interaction["method"], interaction["endpoint"])
+            self.interactions.setdefault(key, []).append(interaction)
+        self.used = set()
+
+    def find(self, method, api_endpoint, data):
+        candidates = self.interactions.get((method, api_endpoint), [])
+        unused = [interaction for interaction in candidates if id(interaction) not in self.used]
+        for interaction in unused:
+            if interaction["request"] == data:
+                return interaction
+        if unused:
+            return unused[0]
+        for interaction in reversed(candidates):
+            if interaction["request"] == data:
+                return interaction
+        return candidates[-1] if candidates else None
+
+    def request(self, method, url, data=None, **kwargs):
+        from requests import Response
+        from requests.structures import CaseInsensitiveDict
+        api_endpoint = url[len(self.api_base) + 1:]
+        with self.lock:
+            interaction = self.find(method, api_endpoint, data or None)
+            if interaction is not None:
+                self.used.add(id(interaction))
+        response = Response()
+        response.url = url
+        response.encoding = "utf-8"
+        if interaction is None:
+            response.status_code = 501
+            response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+            response._content = json.dumps({
+                "state": "ERROR",
+                "message_list": [{"message": "No recorded response for {0} {1}".format(method, api_endpoint)}],
+            }).encode("utf-8")
+            return response
+
+        if self.time_scale:
+            self.clock.sleep(interaction["latency"] * self.time_scale, "replay")
+        response.status_code = interaction["status"]
+        response.headers = CaseInsensitiveDict(interaction["headers"])
+        response._content = interaction["response"].encode("utf-8")
+        return response
+
+    def mount(self, prefix, adapter):
+        pass
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import time
+from collections import Counter
+
+
+class NutanixClock(object):
+    """
+    Clock and sleeper of the polling and retry loops
+
+    Wait loops read the time and sleep through NutanixApiClient.clock only, so
+    a different clock can be injected without patching the time module. The
+    reason passed to sleep names the waiting loop, e.g. task_poll, ip_wait or
+    retry.
+    """
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds, reason=None):
+        time.sleep(seconds)
+
+
+class NutanixSimulatedClock(NutanixClock):
+    """
+    Clock whose time only advances when sleeping, sleeps return immediately
+
+    Every sleep is recorded as (time, seconds, reason), so a provisioning run
+    of many simulated minutes finishes in milliseconds and keeps its exact
+    poll schedule for analysis.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds, reason=None):
+        self.sleeps.append((self.now, seconds, reason))
+        self.now += seconds
+
+    def get_slept(self):
+        """
+        This routine helps to sum the simulated sleeps per reason
+        Returns:
+            slept(dict): reason : seconds
+        """
+        slept = Counter()
+        for _start, seconds, reason in self.sleeps:
+            slept[reason] += seconds
+        return dict(slept)
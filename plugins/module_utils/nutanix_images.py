@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# Copyright: (c) 2021, Balu George <balu.george@nutanix.com>
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import (
+    get_cached_lookup,
+    get_entity_uuids_by_name
+)
+
+
+def get_image_uuid(image_name, client):
+    """
+    This routine helps to get image uuid list of given name
+    Args:
+        image_name(str): image name
+        client(obj): Rest client obj
+    Returns:
+        image_uuid(list): List of image uuid's of given name
+    """
+    return get_cached_lookup('images', image_name, client, lambda: (
+        get_entity_uuids_by_name('images', 'name', image_name, client)))
+
+
+def get_image(image_uuid, client):
+    """
+    This routine helps to get image spec
+    Args:
+        image_uuid(str): image uuid
+        client(obj): Rest client obj
+    Returns:
+        get_image.json()(dict): image json object
+    """
+    get_image = client.request(
+        api_endpoint="v3/images/{0}".format(image_uuid), method="GET", data=None)
+    return get_image.json()
+
+
+def create_image(data, client):
+    """
+    This routine helps to create image
+    Args:
+        data(dict): image payload data
+        client(obj): Rest client obj
+    Returns:
+        task_uuid(str): task uuid
+        image_uuid(str): image uuid
+    """
+    response = client.request(
+        api_endpoint="v3/images",
+        method="POST",
+        data=json.dumps(data)
+    )
+    json_content = response.json()
+    return (
+        json_content["status"]["execution_context"]["task_uuid"],
+        json_content["metadata"]["uuid"]
+    )
+
+
+def update_image(image_uuid, data, client):
+    """
+    This routine helps to update image
+    Args:
+        image_uuid(str): image uuid
+        data(dict): image payload data
+        client(obj): Rest client obj
+    Returns:
+        task_uuid(str): task uuid
+    """
+    response = client.request(
+        api_endpoint="v3/images/{0}".format(image_uuid), method="PUT", data=json.dumps(data))
+    return response.json()["status"]["execution_context"]["task_uuid"]
+
+
+def delete_image(image_uuid, client):
+    """
+    This routine helps to delete image
+    Args:
+        image_uuid(str): image uuid
+        client(obj): Rest client obj
+    Returns:
+        task_uuid(str): task uuid
+    """
+    response = client.request(
+        api_endpoint="v3/images/{0}".format(image_uuid), method="DELETE", data=None)
+    return response.json()["status"]["execution_context"]["task_uuid"]
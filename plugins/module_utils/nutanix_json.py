@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import codecs
+import importlib
+import json
+
+# Decoder of whole bodies, picked by loads on first use
+json_loads = None
+# Body bytes read per step when streaming
+chunk_size = 65536
+whitespace = " \t\n\r"
+
+
+def loads(data):
+    """
+    This routine helps to decode a JSON document with the fastest available backend
+    orjson is used if installed, it is imported on the first decode as it
+    adds to the module start up time. The json module is the fallback.
+    Args:
+        data(bytes): JSON document
+    Returns:
+        (obj): decoded document
+    """
+    global json_loads
+    if json_loads is None:
+        try:
+            json_loads = importlib.import_module("orjson").loads
+        except ImportError:
+            json_loads = json.loads
+    return json_loads(data)
+
+
+def iter_json_items(chunks, key, document=None):
+    """
+    This routine helps to decode the items of a top level array of a JSON object incrementally
+    Only the item being decoded and one chunk of the body are held in
+    memory, so the peak memory of a list response scales with its largest
+    entity instead of its page length.
+    Args:
+        chunks(iter): body chunks as bytes, e.g. response.iter_content()
+        key(str): key of the array to stream, e.g. entities
+        document(dict): receives the other top level keys, e.g. metadata,
+        once all items were yielded
+    Returns:
+        (generator): yields the decoded array items in order
+    """
+    stream = NutanixJsonStream(chunks)
+    if document is None:
+        document = {}
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        name = stream.value()
+        stream.expect(":")
+        if name == key and stream.peek() == "[":
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.expect("]")
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.next_of(",]") == "]":
+                        break
+        else:
+            document[name] = stream.value()
+        if stream.next_of(",}") == "}":
+            return
+
+
+class NutanixJsonStream(object):
+    """
+    Buffer of a JSON body read chunk by chunk
+
+    Values are decoded with the C scanner of the json module. A value that
+    ends with the buffer is only accepted at the end of the body, so that
+    values split across chunks are never decoded half.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.raw_decode = json.JSONDecoder().raw_decode
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def read_more(self):
+        """
+        This routine helps to append the next chunk to the buffer, dropping the consumed text
+        Returns:
+            (bool): False at the end of the body
+        """
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            text = self.decoder.decode(b"", True)
+        else:
+            text = self.decoder.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non whitespace character without consuming it, an empty string at the end"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in whitespace:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more():
+                return ""
+
+    def expect(self, char):
+        """Consume the next non whitespace character, which must be char"""
+        self.next_of(char)
+
+    def next_of(self, chars):
+        """Consume and return the next non whitespace character, which must be one of chars"""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError("Expected one of {0} in the JSON body, found {1}".format(
+                " ".join(chars), repr(char) if char else "the end"))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode and consume the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.read_more()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import os
+import threading
+import time
+import traceback
+
+try:
+    import sqlite3
+    HAS_SQLITE3 = True
+except ImportError:
+    HAS_SQLITE3 = False
+    SQLITE3_IMPORT_ERROR = traceback.format_exc()
+
+cache_path = os.path.join("~", ".ansible", "tmp", "nutanix_cache.db")
+cache_ttl = 300
+# Seconds to wait for another module run holding the database lock
+cache_lock_timeout = 30
+
+
+def use_name_cache(client):
+    """
+    This routine helps to give a client the persistent name cache if params name_cache is set
+    Only modules with the name_cache options import this, so the others don't
+    ship the sqlite cache. Caching is disabled if the cache can't be used.
+    Args:
+        client(obj): NutanixApiClient
+    """
+    module = client.module
+    if not module.params.get("name_cache"):
+        return
+    if not HAS_SQLITE3:
+        module.warn("sqlite3 is not available, name cache is disabled")
+        return
+    try:
+        client.name_cache = NutanixNameCache(
+            client.pc_host,
+            ttl=module.params.get("name_cache_ttl") or cache_ttl,
+            path=module.params.get("name_cache_path") or cache_path)
+        if module.params.get("invalidate_name_cache"):
+            client.name_cache.invalidate()
+    except Exception as err:
+        client.name_cache = None
+        module.warn("Unable to use name cache, {0}".format(str(err)))
+
+
+class NutanixNameCache(object):
+    """
+    Persistent name to uuid cache shared by module runs on the same controller
+
+    Entries are keyed by PC host, entity kind and name, and expire after ttl
+    seconds. The cache lives in a sqlite database, which serializes concurrent
+    writers from parallel forks through its own file locking. Threads of a
+    module run share the connection through a lock.
+    """
+
+    def __init__(self, pc_host, ttl=cache_ttl, path=cache_path):
+        self.pc_host = pc_host
+        self.ttl = ttl
+        self.path = os.path.expanduser(path)
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, mode=0o700)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, timeout=cache_lock_timeout, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS name_cache ("
+                "pc_host TEXT, kind TEXT, name TEXT, value TEXT, expires REAL, "
+                "PRIMARY KEY (pc_host, kind, name))")
+
+    def get(self, kind, name):
+        """
+        This routine helps to get a cached value
+        Args:
+            kind(str): entity kind
+            name(str): entity name
+        Returns:
+            value(obj): cached value, None if missing or expired
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM name_cache WHERE pc_host=? AND kind=? AND name=? AND expires>?",
+                (self.pc_host, kind, name, time.time())).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def set(self, kind, name, value):
+        """
+        This routine helps to store a value in the cache
+        Args:
+            kind(str): entity kind
+            name(str): entity name
+            value(obj): json serializable value
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO name_cache VALUES (?, ?, ?, ?, ?)",
+                (self.pc_host, kind, name, json.dumps(value), time.time() + self.ttl))
+
+    def invalidate(self, kind=None, name=None):
+        """
+        This routine helps to drop cached entries of this PC host
+        Args:
+            kind(str): entity kind, all kinds if not given
+            name(str): entity name, all names if not given
+        """
+        query = "DELETE FROM name_cache WHERE pc_host=?"
+        args = [self.pc_host]
+        if kind is not None:
+            query += " AND kind=?"
+            args.append(kind)
+        if name is not None:
+            query += " AND name=?"
+            args.append(name)
+        with self.lock, self.connection:
+            self.connection.execute(query, args)
+            self.connection.execute(
+                "DELETE FROM name_cache WHERE expires<=?", (time.time(),))
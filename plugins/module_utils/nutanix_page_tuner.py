@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import hashlib
+import os
+import threading
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_cache import read_state, write_state
+
+page_length_path = os.path.join("~", ".ansible", "tmp", "nutanix_page_lengths")
+# Seconds PC should take to answer a page
+page_target_seconds = 1.0
+# Decompressed body size a page should stay below
+page_max_bytes = 4 * 1024 * 1024
+# Length limits of v3 list and groups calls
+min_page_length = 20
+max_page_length = 500
+# Largest factor the length changes by after a single page
+page_length_step = 2
+# Relative changes below this are not applied, so the length doesn't flap
+page_length_tolerance = 0.1
+
+
+class NutanixPageTuner(object):
+    """
+    Page length of list or groups calls adapted to the measured pages
+
+    After every full page the length moves toward the one expected to take
+    target_seconds, at most doubling or halving at a time, capped by the
+    response size and the PC limits. The length is stored per PC host and
+    entity kind in a NutanixPageLengthCache, if given, and later runs start
+    from it. Pages may be recorded from several threads.
+    """
+
+    def __init__(self, kind, page_length, cache=None, target_seconds=page_target_seconds,
+                 max_bytes=page_max_bytes, min_length=min_page_length, max_length=max_page_length):
+        self.kind = kind
+        self.cache = cache
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.min_length = min_length
+        self.max_length = max_length
+        self.lock = threading.Lock()
+        stored = cache.get(kind) if cache is not None else None
+        self.page_length = self.clamp(stored or page_length)
+
+    def clamp(self, page_length):
+        """Return the page length within the PC limits"""
+        return int(max(self.min_length, min(self.max_length, page_length)))
+
+    def record(self, page_length, count, seconds, response_bytes):
+        """
+        This routine helps to adapt the page length to a page that was read
+        Short pages, the last ones of a listing, are ignored as their time is
+        mostly the fixed cost of a request.
+        Args:
+            page_length(int): number of entities asked for
+            count(int): number of entities received
+            seconds(float): seconds PC took to answer
+            response_bytes(int): decompressed body size
+        Returns:
+            (bool): True if the page length changed
+        """
+        if count < page_length or count <= 0 or seconds <= 0:
+            return False
+        ideal = count * self.target_seconds / seconds
+        if response_bytes:
+            ideal = min(ideal, count * self.max_bytes / float(response_bytes))
+        with self.lock:
+            current = self.page_length
+            new = self.clamp(max(current / float(page_length_step), min(current * page_length_step, ideal)))
+            if abs(new - current) <= current * page_length_tolerance:
+                return False
+            self.page_length = new
+        if self.cache is not None:
+            self.cache.set(self.kind, new)
+        return True
+
+
+class NutanixPageLengthCache(object):
+    """
+    Tuned list page lengths of a PC host per entity kind, kept across module runs
+
+    The lengths are stored like the circuit breaker state, in a json file per
+    PC host. Concurrent runs may overwrite each other's lengths, which only
+    costs the next run some tuning.
+    """
+
+    def __init__(self, pc_host, path=page_length_path):
+        key = hashlib.sha256(pc_host.encode("utf-8")).hexdigest()
+        self.path = os.path.join(os.path.expanduser(path), key + ".json")
+        self.lock = threading.Lock()
+
+    def get(self, kind):
+        """
+        This routine helps to get the stored page length of an entity kind
+        Args:
+            kind(str): entity kind
+        Returns:
+            (int): page length, None if none was stored
+        """
+        return read_state(self.path, {}).get(kind)
+
+    def set(self, kind, page_length):
+        """
+        This routine helps to store the page length of an entity kind
+        Args:
+            kind(str): entity kind
+            page_length(int): page length
+        """
+        with self.lock:
+            state = read_state(self.path, {})
+            state[kind] = page_length
+            write_state(self.path, state)
+
+
+def use_adaptive_paging(client):
+    """
+    This routine helps to give a client page length tuners if params adaptive_paging is set
+    Only modules with the adaptive_paging options import this, so the others
+    don't ship the tuner.
+    Args:
+        client(obj): NutanixApiClient
+    """
+    params = client.module.params
+    # Recorded and replayed requests must ask for the same page lengths
+    if not params.get("adaptive_paging") or client.cassette_mode is not None:
+        return
+    cache = NutanixPageLengthCache(client.pc_host)
+    target_seconds = params.get("page_target_seconds") or page_target_seconds
+
+    def create_tuner(kind, page_length):
+        return NutanixPageTuner(kind, page_length, cache=cache, target_seconds=target_seconds)
+
+    client.page_tuner_factory = create_tuner
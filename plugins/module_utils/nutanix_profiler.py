@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import base64
+import io
+import marshal
+import os
+import time
+from ansible.module_utils.parsing.convert_bool import boolean
+
+profile_env = "NUTANIX_PROFILE"
+profile_memory_env = "NUTANIX_PROFILE_MEMORY"
+profile_path_env = "NUTANIX_PROFILE_PATH"
+profile_path = os.path.join("~", ".ansible", "tmp", "nutanix_profiles")
+# Number of functions and allocation sites in the text reports
+profile_top = 30
+
+
+class NutanixProfiler(object):
+    """
+    cProfile and optional tracemalloc profiler of a module run
+
+    The report holds the top functions by cumulative time, the raw pstats data
+    base64 encoded and, with memory profiling, the top allocation sites. It is
+    either written to files under path or returned in the module result.
+    """
+
+    # Profiler started by run_profiled, picked up by NutanixApiClient
+    active = None
+
+    def __init__(self, name, memory=False, path=None):
+        # Only imported when profiling, they would slow down the start up of every module
+        import cProfile
+        self.name = name
+        self.memory = memory
+        self.path = path
+        self.profile = cProfile.Profile()
+        self.snapshot = None
+        self.peak = 0
+        self.running = False
+        self.files = None
+
+    def start(self):
+        """This routine helps to start profiling"""
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        self.running = True
+        self.profile.enable()
+
+    def stop(self):
+        """This routine helps to stop profiling, later calls are ignored"""
+        if not self.running:
+            return
+        self.profile.disable()
+        self.running = False
+        if self.memory:
+            import tracemalloc
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def get_stats_text(self):
+        import pstats
+        stream = io.StringIO()
+        pstats.Stats(self.profile, stream=stream).sort_stats("cumulative").print_stats(profile_top)
+        return stream.getvalue()
+
+    def get_allocations(self):
+        if self.snapshot is None:
+            return []
+        return [str(stat) for stat in self.snapshot.statistics("lineno")[:profile_top]]
+
+    def report(self):
+        """
+        This routine helps to build the profile report of a module result
+        Returns:
+            report(dict): pstats text, base64 encoded pstats data and top allocations
+        """
+        self.stop()
+        # pstats.Stats takes the stats over from the profile, encode them first
+        self.profile.create_stats()
+        pstats_b64 = base64.b64encode(marshal.dumps(self.profile.stats)).decode("ascii")
+        report = {
+            "stats": self.get_stats_text(),
+            "pstats_b64": pstats_b64,
+        }
+        if self.memory:
+            report["peak_memory_kib"] = round(self.peak / 1024.0, 1)
+            report["top_allocations"] = self.get_allocations()
+        return report
+
+    def write(self):
+        """
+        This routine helps to write the profile to files under path, only once
+        Returns:
+            files(list): written file paths, load the .pstats file with python -m pstats
+        """
+        if self.files is not None:
+            return self.files
+        self.stop()
+        directory = os.path.expanduser(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o700)
+        prefix = os.path.join(directory, "{0}-{1}-{2}".format(
+            self.name, time.strftime("%Y%m%dT%H%M%S"), os.getpid()))
+        self.profile.dump_stats(prefix + ".pstats")
+        with open(prefix + ".txt", "w") as f:
+            f.write(self.get_stats_text())
+            if self.memory:
+                f.write("\nPeak traced memory: {0:.1f} KiB\nTop allocations:\n".format(self.peak / 1024.0))
+                f.write("\n".join(self.get_allocations()) + "\n")
+        self.files = [prefix + ".pstats", prefix + ".txt"]
+        return self.files
+
+
+def run_profiled(name, func, args=(), default_path=None):
+    """
+    This routine helps to run a module main or plugin method under the profiler
+    Profiling is enabled by exporting NUTANIX_PROFILE=true, NUTANIX_PROFILE_MEMORY=true
+    adds tracemalloc and NUTANIX_PROFILE_PATH selects the report directory.
+    Args:
+        name(str): module or plugin name, used in the report file names
+        func(func): function to run
+        args(tuple): arguments of func
+        default_path(str): report directory if NUTANIX_PROFILE_PATH is not set,
+            without one the report is only returned by NutanixApiClient.update_result
+    Returns:
+        (obj): return value of func
+    """
+    if not boolean(os.environ.get(profile_env, False), strict=False):
+        return func(*args)
+
+    profiler = NutanixProfiler(
+        name, memory=boolean(os.environ.get(profile_memory_env, False), strict=False),
+        path=os.environ.get(profile_path_env) or default_path)
+    NutanixProfiler.active = profiler
+    profiler.start()
+    try:
+        return func(*args)
+    finally:
+        profiler.stop()
+        NutanixProfiler.active = None
+        if profiler.path:
+            profiler.write()
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2021, Nutanix
+# Copyright: (c) 2021, Balu George <balu.george@nutanix.com>
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import (
+    get_cached_lookup,
+    get_entity_uuids_by_name,
+    iter_entities,
+    iter_groups_entities
+)
+
+
+def resolve_names(names, client):
+    """
+    This routine helps to resolve names of several entity kinds with one query per kind
+    Names are looked up in the client name cache first, the remaining names of
+    each kind are resolved by a single FIQL OR filtered list or groups query and
+    the kinds are queried concurrently.
+    Args:
+        names(dict): map of kind : list of names, supported kinds are
+        clusters, subnets, images and storage_containers
+        client(obj): Rest client obj
+    Returns:
+        resolved(dict): map of kind : {name : value}, value is the uuid list of
+        the name or the cluster_uuid : storage_container_uuid map for
+        storage_containers; names that could not be found are left out
+    """
+    resolved, missing = {}, {}
+    for kind, kind_names in names.items():
+        resolved[kind] = {}
+        for name in set(kind_names):
+            value = client.name_cache.get(kind, name) if client.name_cache else None
+            if value is None:
+                missing.setdefault(kind, []).append(name)
+            else:
+                resolved[kind][name] = value
+
+    def resolve_kind(kind):
+        if kind == "storage_containers":
+            return kind, scan_storage_container_maps(missing[kind], client)
+        return kind, get_entity_uuids_by_names(kind, missing[kind], client)
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            for kind, values in executor.map(resolve_kind, sorted(missing)):
+                for name, value in values.items():
+                    if value and client.name_cache:
+                        client.name_cache.set(kind, name, value)
+                resolved[kind].update(values)
+
+    return resolved
+
+
+def get_entity_uuids_by_names(api, names, client):
+    """
+    This routine helps to get uuid lists of entities matching any of the given names
+    Names that can't be expressed in a FIQL filter are looked up one by one.
+    Args:
+        api(str): api resource name
+        names(list): entity names
+        client(obj): Rest client obj
+    Returns:
+        entity_uuids(dict): map of name : list of entity uuid's, only found names are present
+    """
+    entity_uuids = {}
+    fiql_names = [name for name in names if not set(",;=()").intersection(name)]
+    for name in set(names) - set(fiql_names):
+        entity_uuids[name] = get_entity_uuids_by_name(api, 'name', name, client)
+
+    if fiql_names:
+        filter = {"filter": ",".join("name=={0}".format(name) for name in fiql_names)}
+        for entity in iter_entities(api, filter, client):
+            name = entity["status"]["name"]
+            if name in fiql_names:
+                entity_uuids.setdefault(name, []).append(entity["metadata"]["uuid"])
+
+    return dict((name, uuids) for name, uuids in entity_uuids.items() if uuids)
+
+
+def get_vm_uuid(params, client):
+    """
+    This routine helps to get vm uuid list of given name
+    Args:
+        params(obj): ansible params object
+        client(obj): Rest client obj
+    Returns:
+        vm_uuid(list): List of vm uuid's of given name
+    """
+    return get_entity_uuids_by_name('vms', 'vm_name', params['name'], client)
+
+
+def get_vm(vm_uuid, client):
+    """
+    This routine helps to get vm spec
+    Args:
+        vm_uuid(str): vm uuid
+        client(obj): Rest client obj
+    Returns:
+        get_virtual_machine.json()(dict): vm json object
+    """
+    get_virtual_machine = client.request(
+        api_endpoint="v3/vms/{0}".format(vm_uuid), method="GET", data=None)
+    return get_virtual_machine.json()
+
+
+def create_vm(data, client):
+    """
+    This routine helps to create vm
+    Args:
+        data(dict): vm payload data
+        client(obj): Rest client obj
+    Returns:
+        task_uuid(str): task uuid
+        image_uuid(str): image uuid
+    """
+    response = client.request(
+        api_endpoint="v3/vms",
+        method="POST",
+        data=json.dumps(data)
+    )
+    json_content = response.json()
+    return (
+        json_content["status"]["execution_context"]["task_uuid"],
+        json_content["metadata"]["uuid"]
+    )
+
+
+def update_vm(vm_uuid, data, client):
+    """
+    This routine helps to update vm
+    Args:
+        vm_uuid(str): vm uuid
+        data(dict): image payload data
+        client(obj): Rest client obj
+    Returns:
+        task_uuid(str): task uuid
+    """
+    response = client.request(
+        api_endpoint="v3/vms/{0}".format(vm_uuid), method="PUT", data=json.dumps(data))
+    return response.json()["status"]["execution_context"]["task_uuid"]
+
+
+def delete_vm(vm_uuid, client):
+    """
+    This routine helps to delete vm
+    Args:
+        vm_uuid(str): vm uuid
+        client(obj): Rest client obj
+    Returns:
+        task_uuid(str): task uuid
+    """
+    response = client.request(
+        api_endpoint="v3/vms/{0}".format(vm_uuid), method="DELETE", data=None)
+    return response.json()["status"]["execution_context"]["task_uuid"]
+
+
+def update_powerstate_vm(vm_uuid, client, mechanism, power_state, vm_payload=None):
+    """
+    This routine helps update vm power state
+    Args:
+        vm_uuid(str): image name
+        client(obj): Rest client obj
+        mechanism(str): power state mechanism
+        power_state(str): power state
+        vm_payload(dict): vm json object already fetched by the caller, updated in place
+    Returns:
+        power_state(method): update vm
+    """
+    data = vm_payload if vm_payload is not None else get_vm(vm_uuid, client)
+
+    if "status" in data:
+        del data["status"]
+
+    data["spec"]["resources"]["power_state"] = power_state
+    data["spec"]["resources"].setdefault("power_state_mechanism", {})["mechanism"] = mechanism
+
+    return update_vm(vm_uuid, data, client)
+
+
+def get_cluster_uuid(cluster_name, client):
+    """
+    This routine helps to get cluster uuid list using given name
+    Args:
+        cluster_name(str): cluster name
+        client(obj): Rest client obj
+    Returns:
+        cluster_uuid(list): List of Cluster uuid's of given name
+    """
+    return get_cached_lookup('clusters', cluster_name, client, lambda: (
+        get_entity_uuids_by_name('clusters', 'name', cluster_name, client)))
+
+
+def get_subnet_uuid(subnet_name, client):
+    """
+    This routine helps to get subnet uuid list using given name
+    Args:
+        subnet_name(str): Subnet name
+        client(obj): Rest client obj
+    Returns:
+        subnet_uuid(list): List of Subnet uuid's of given name
+    """
+    return get_cached_lookup('subnets', subnet_name, client, lambda: (
+        get_entity_uuids_by_name('subnets', 'name', subnet_name, client)))
+
+
+def get_cluster_storage_container_map(storage_container_name, client):
+    """
+    This routine helps to create map of cluster_uuid : storage_container_uuid
+    Args:
+        storage_container_name(str): Storage container name
+        client(obj): Rest client obj
+    Returns:
+        cluster_sc_map(dict): map of cluster_uuid : storage_container_uuid
+    """
+    return get_cached_lookup('storage_containers', storage_container_name, client, lambda: (
+        scan_cluster_storage_container_map(storage_container_name, client)))
+
+
+def scan_cluster_storage_container_map(storage_container_name, client):
+    """
+    This routine helps to scan all storage containers for the given name
+    Args:
+        storage_container_name(str): Storage container name
+        client(obj): Rest client obj
+    Returns:
+        cluster_sc_map(dict): map of cluster_uuid : storage_container_uuid
+    """
+    return scan_storage_container_maps([storage_container_name], client).get(storage_container_name, {})
+
+
+def scan_storage_container_maps(storage_container_names, client):
+    """
+    This routine helps to look up several storage container names with one groups query
+    The name filter is pushed into filter_criteria and the matches are added to
+    the per run client.storage_container_index, names already indexed are not
+    queried again.
+    Args:
+        storage_container_names(list): Storage container names
+        client(obj): Rest client obj
+    Returns:
+        sc_maps(dict): map of storage_container_name : {cluster_uuid : storage_container_uuid},
+        only found names are present
+    """
+    names = set(storage_container_names) - client.indexed_storage_container_names
+    if names:
+        filter = {
+            "entity_type": "storage_container",
+            "group_member_attributes": [
+                {
+                    "attribute": "cluster"
+                },
+                {
+                    "attribute": "container_name"
+                }
+            ]
+        }
+        # Names with FIQL separators can't be filtered server side
+        if not any(set(",;=()").intersection(name) for name in names):
+            filter["filter_criteria"] = ",".join(
+                "container_name=={0}".format(name) for name in sorted(names))
+
+        for sc in iter_groups_entities(filter, client):
+            sc_name, cluster = None, None
+            for attribute in sc["data"]:
+                if attribute["name"] == "container_name":
+                    sc_name = attribute["values"][0]["values"][0]
+                if attribute["name"] == "cluster":
+                    cluster = attribute["values"][0]["values"][0]
+
+            if sc_name in names:
+                client.storage_container_index[(cluster, sc_name)] = sc["entity_id"]
+        client.indexed_storage_container_names.update(names)
+
+    sc_maps = {}
+    for (cluster, sc_name), sc_uuid in client.storage_container_index.items():
+        if sc_name in storage_container_names:
+            sc_maps.setdefault(sc_name, {})[cluster] = sc_uuid
+
+    return sc_maps
+
+
+def is_uuid(UUID):
+    """
+    This routine helps to determine given UUID is a valid uuid or not
+    Args:
+        UUID(str): UUID string
+    Returns:
+        (bool): returns True/False
+    """
+    try:
+        uuid.UUID(UUID)
+        return True
+    except ValueError:
+        return False
+
+
+def set_payload_keys(params, payload_format, payload):
+    """
+    This routine helps to create dict from ansible input values. ignoring all the null values
+    Args:
+        params(obj): Ansible input object
+        payload_format(dict): Reference dict
+        payload(dict): Sets payload dict based on given params
+    Returns:
+        payload(dict): returns final dict after setting all the params
+    """
+    for i in payload_format.keys():
+
+        if params[i] is None:
+            continue
+        elif type(params[i]) is dict:
+            payload[i] = set_payload_keys(params[i], payload_format[i], {})
+        elif type(params[i]) is list:
+            payload[i] = []
+            for item in params[i]:
+                payload[i].append(set_payload_keys(item, payload_format[i][0], {}))
+        elif type(params[i]) is str or type(params[i]) is int:
+            payload[i] = params[i]
+    return payload
+
+
+def has_changed(source_payload, destination_payload):
+    """
+    This routine helps to compare 2 objects and find for differences.
+    Args:
+        source_payload(dict): Source payload dict
+        destination_payload(dict): Destination payload dict
+    Returns:
+        status(bool): returns bool value after comparision
+    """
+    status = False
+    for key in source_payload.keys():
+        if type(source_payload[key]) is dict:
+            status = has_changed(source_payload[key], destination_payload[key])
+        elif type(source_payload[key]) is list:
+            for i, item in enumerate(source_payload[key]):
+                try:
+                    status = has_changed(item, destination_payload[key][i])
+                except IndexError:
+                    status = True
+        elif type(source_payload[key]) is str or type(source_payload[key]) is int:
+            if source_payload[key] != destination_payload[key]:
+                return True
+
+        if status:
+            return status
+    return status
+
+
+def read_file(filename):
+    """
+    This routine helps to read the given file
+    Args:
+        filename(str): name of the file to be read
+    Returns:
+        f.read()(byte): byte string
+    """
+    with open(filename, "r", encoding='utf-8') as f:
+        return f.read()
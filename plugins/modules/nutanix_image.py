@@ -123,6 +123,115 @@ options:
         - This is not recommended for production setup
         type: bool
         default: True
+    task_poll_interval:
+        description:
+        - Initial interval in seconds between task status checks
+        - The interval backs off with jitter up to C(task_poll_max_interval)
+        type: float
+        default: 0.5
+    task_poll_max_interval:
+        description:
+        - Maximum interval in seconds between task status checks
+        type: float
+        default: 10
+    session_cache:
+        description:
+        - Reuse the PC session cookie across requests and module runs instead of sending credentials with every call
+        - The cookie is cached under ~/.ansible/tmp/nutanix_sessions, readable by the current user only
+        type: bool
+        default: True
+    retries:
+        description:
+        - Number of times a request is retried after a connection error or a 429, 502, 503 or 504 response
+        - Only idempotent requests are retried after connection errors, 502 and 504 responses
+        type: int
+        default: 3
+    retry_backoff:
+        description:
+        - Base delay in seconds of the jittered exponential backoff between retries
+        - A C(Retry-After) header sent by PC takes precedence
+        type: float
+        default: 1
+    circuit_breaker_threshold:
+        description:
+        - Number of consecutive failed requests after which requests to the PC fail fast for 60 seconds
+        - The failure count is shared by module runs on the same controller, set to C(0) to disable
+        type: int
+        default: 5
+    pool_maxsize:
+        description:
+        - Maximum number of connections to the PC kept open for reuse
+        - Parallel list queries and bulk operations use up to this many connections at a time
+        type: int
+        default: 10
+    pool_block:
+        description:
+        - Set value to C(True) to make requests wait for a free connection once C(pool_maxsize) connections are in use
+        - By default extra connections are opened and closed after the request
+        type: bool
+        default: False
+    keep_alive:
+        description:
+        - Set value to C(False) to close the connection after every request instead of reusing it
+        type: bool
+        default: True
+    compression:
+        description:
+        - Set value to C(False) to ask PC for uncompressed responses instead of gzip compressed ones
+        - Compression shrinks list pages of full VM specs several fold, which saves time on slow links to remote PCs
+        - C(api_stats) reports the bytes received as C(response_wire_bytes) next to the decompressed C(response_bytes)
+        - Can also be set by exporting NUTANIX_COMPRESSION
+        type: bool
+        default: True
+    api_stats:
+        description:
+        - Set value to C(True) to record every API request and return an aggregated C(api_stats) block
+        - C(api_stats) holds call counts, p50/p95/max latency, a latency histogram and byte totals per endpoint
+        - Can also be enabled by exporting NUTANIX_API_STATS=true
+        type: bool
+        default: False
+    cassette_path:
+        description:
+        - Path of a cassette file holding recorded API requests and responses, compressed if it ends with C(.gz)
+        - Only used when C(cassette_mode) is set
+        - Can also be set by exporting NUTANIX_CASSETTE_PATH
+        type: path
+    cassette_mode:
+        description:
+        - C(record) appends every API request and response of the run to C(cassette_path)
+        - Credentials and session cookies are not recorded
+        - C(replay) serves the responses from C(cassette_path) without contacting Prism Central
+        - Can also be set by exporting NUTANIX_CASSETTE_MODE
+        type: str
+        choices:
+        - record
+        - replay
+    cassette_time_scale:
+        description:
+        - Fraction of the recorded latency to wait before each replayed response
+        - C(1) replays the original timings, C(0.1) compresses them tenfold and C(0) replays without delay
+        - Can also be set by exporting NUTANIX_CASSETTE_TIME_SCALE
+        type: float
+        default: 0
+    profile:
+        description:
+        - Set value to C(True) to profile the module run with cProfile
+        - The report is returned as C(profile), holding the top functions by cumulative time and the base64 encoded pstats data
+        - Exporting NUTANIX_PROFILE=true also enables it and covers the whole module run including argument parsing
+        type: bool
+        default: False
+    profile_memory:
+        description:
+        - Set value to C(True) to add the peak memory and top allocation sites from tracemalloc to the profile
+        - Can also be enabled by exporting NUTANIX_PROFILE_MEMORY=true
+        type: bool
+        default: False
+    profile_path:
+        description:
+        - Directory to write the profile to instead of returning it, as a C(.pstats) file and a C(.txt) summary
+        - The written files are returned as C(profile_files)
+        - Can also be set by exporting NUTANIX_PROFILE_PATH
+        type: path
 author:
     - Balu George (@balugeorge)
 """
@@ -188,12 +297,15 @@ from urllib.parse import urlparse
 from ansible.module_utils.basic import AnsibleModule, env_fallback
 from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import (
     NutanixApiClient,
+    list_entities,
+    task_poll,
+    wait_for_tasks)
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_images import (
     create_image,
     update_image,
-    list_entities,
     get_image,
-    delete_image,
-    task_poll)
+    delete_image)
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_profiler import run_profiled
 
 
 CREATE_PAYLOAD = """{
@@ -272,6 +384,31 @@ def generate_argument_spec(result):
         state=dict(type="str", default="present"),
         validate_certs=dict(type="bool", default=True, fallback=(
             env_fallback, ["VALIDATE_CERTS"])),
+        profile=dict(type="bool", default=False, fallback=(
+            env_fallback, ["NUTANIX_PROFILE"])),
+        profile_memory=dict(type="bool", default=False, fallback=(
+            env_fallback, ["NUTANIX_PROFILE_MEMORY"])),
+        profile_path=dict(type="path", fallback=(
+            env_fallback, ["NUTANIX_PROFILE_PATH"])),
+        cassette_path=dict(type="path", fallback=(
+            env_fallback, ["NUTANIX_CASSETTE_PATH"])),
+        cassette_mode=dict(type="str", choices=["record", "replay"], fallback=(
+            env_fallback, ["NUTANIX_CASSETTE_MODE"])),
+        cassette_time_scale=dict(type="float", default=0, fallback=(
+            env_fallback, ["NUTANIX_CASSETTE_TIME_SCALE"])),
+        api_stats=dict(type="bool", default=False, fallback=(
+            env_fallback, ["NUTANIX_API_STATS"])),
+        retries=dict(type="int", default=3),
+        retry_backoff=dict(type="float", default=1),
+        circuit_breaker_threshold=dict(type="int", default=5),
+        pool_maxsize=dict(type="int", default=10),
+        pool_block=dict(type="bool", default=False),
+        keep_alive=dict(type="bool", default=True),
+        compression=dict(type="bool", default=True, fallback=(
+            env_fallback, ["NUTANIX_COMPRESSION"])),
+        session_cache=dict(type="bool", default=True),
+        task_poll_interval=dict(type="float", default=0.5),
+        task_poll_max_interval=dict(type="float", default=10),
     )
 
     module = AnsibleModule(
@@ -290,22 +427,25 @@ def generate_argument_spec(result):
 
 
 def get_existing_image_state(module, client):
-    """Check if an image is present in PC"""
+    """Check if an image is present in PC, returns the state, uuid and list entity of the image"""
     image_state = {"match_state": False, "match_name": False,
                    "match_type": False, "match_description": False}
     image_uuid = None
+    image_entity = None
     image_name = module.params.get("image_name")
     image_type = module.params.get("image_type")
-    image_description = module.params.get("image_description")
+    # No description is stored as an empty one, see _update
+    image_description = module.params.get("image_description") or ""
     image_url = module.params.get("image_url")
     payload = set_list_payload(module.params["data"])
     image_list_data = list_entities('images', payload, client)
     for entity in image_list_data["entities"]:
         if image_name == entity["status"]["name"]:
             existing_image_type = entity["status"]["resources"]["image_type"]
-            existing_image_description = entity["status"].get("description")
+            existing_image_description = entity["status"].get("description") or ""
             image_state["match_name"] = True
             image_uuid = entity["metadata"]["uuid"]
+            image_entity = entity
             if image_type == existing_image_type and image_description == existing_image_description:
                 image_state["match_state"] = True
                 break
@@ -316,7 +456,7 @@ def get_existing_image_state(module, client):
                 image_state["match_description"] = True
                 break
 
-    return image_state, image_uuid
+    return image_state, image_uuid, image_entity
 
 
 def create_image_spec(module, client, result):
@@ -397,18 +537,20 @@ def _create(module, client, result):
     """Create image"""
     image_count = 0
     image_uuid_list = []
-    image_spec = create_image_spec(module, client, result)
     image_name = module.params.get("image_name")
 
     # Get existing image state
-    image_state, image_uuid = get_existing_image_state(module, client)
+    image_state, image_uuid, image_entity = get_existing_image_state(module, client)
     for state_name, state_value in image_state.items():
         if state_name == "match_state" and state_value:
             result["image_state"] = image_state
-            module.exit_json(**result)
+            module.exit_json(**client.update_result(result))
             return result
         elif state_name != "match_state" and state_value:
-            return _update(module, client, result, image_uuid)
+            return _update(module, client, result, image_uuid, image_entity)
+
+    # Only new images need the spec, it looks up clusters and VMs
+    image_spec = create_image_spec(module, client, result)
 
     # Create Image
     task_uuid, image_uuid = create_image(image_spec, client)
@@ -424,8 +566,8 @@ def _create(module, client, result):
     return result
 
 
-def _update(module, client, result, image_uuid):
-    """Update Image"""
+def _update(module, client, result, image_uuid, image_entity=None):
+    """Update Image, image_entity is the image from the images list if it was already fetched"""
     image_count = 0
     data = set_list_payload(module.params["data"])
     image_name = module.params.get("image_name")
@@ -436,7 +578,10 @@ def _update(module, client, result, image_uuid):
     if image_uuid_for_update:
         image_uuid = image_uuid_for_update
     # Get image spec
-    image_spec = get_image(image_uuid, client)
+    if image_entity and image_entity["metadata"]["uuid"] == image_uuid:
+        image_spec = image_entity
+    else:
+        image_spec = get_image(image_uuid, client)
 
     # Update image spec
     del image_spec["status"]
@@ -503,10 +648,11 @@ def _delete(module, client, result):
         return result
 
     # Check status of all deletion tasks for removal of multiple images with duplicate names
+    # Nothing is added to task_uuid_list yet, duplicate names fail above and a single
+    # image deletion is polled with task_poll
     if task_uuid_list:
         result["msg"] = []
-        for tuuid in task_uuid_list:
-            task_status = task_poll(tuuid, client)
+        for tuuid, task_status in wait_for_tasks(task_uuid_list, client):
             if task_status:
                 result["failed"] = True
                 result["msg"].append(task_status)
@@ -533,8 +679,8 @@ def main():
     elif arg_spec.params.get("state") == "absent":
         result = _delete(arg_spec, api_client, result_init)
 
-    arg_spec.exit_json(**result)
+    arg_spec.exit_json(**api_client.update_result(result))
 
 
 if __name__ == "__main__":
-    main()
+    run_profiled("nutanix_image", main)
@@ -65,6 +65,104 @@ options:
                 description:
                 - Offset
                 type: int
+    session_cache:
+        description:
+        - Reuse the PC session cookie across requests and module runs instead of sending credentials with every call
+        - The cookie is cached under ~/.ansible/tmp/nutanix_sessions, readable by the current user only
+        type: bool
+        default: True
+    retries:
+        description:
+        - Number of times a request is retried after a connection error or a 429, 502, 503 or 504 response
+        - Only idempotent requests are retried after connection errors, 502 and 504 responses
+        type: int
+        default: 3
+    retry_backoff:
+        description:
+        - Base delay in seconds of the jittered exponential backoff between retries
+        - A C(Retry-After) header sent by PC takes precedence
+        type: float
+        default: 1
+    circuit_breaker_threshold:
+        description:
+        - Number of consecutive failed requests after which requests to the PC fail fast for 60 seconds
+        - The failure count is shared by module runs on the same controller, set to C(0) to disable
+        type: int
+        default: 5
+    pool_maxsize:
+        description:
+        - Maximum number of connections to the PC kept open for reuse
+        - Parallel list queries and bulk operations use up to this many connections at a time
+        type: int
+        default: 10
+    pool_block:
+        description:
+        - Set value to C(True) to make requests wait for a free connection once C(pool_maxsize) connections are in use
+        - By default extra connections are opened and closed after the request
+        type: bool
+        default: False
+    keep_alive:
+        description:
+        - Set value to C(False) to close the connection after every request instead of reusing it
+        type: bool
+        default: True
+    compression:
+        description:
+        - Set value to C(False) to ask PC for uncompressed responses instead of gzip compressed ones
+        - Compression shrinks list pages of full VM specs several fold, which saves time on slow links to remote PCs
+        - C(api_stats) reports the bytes received as C(response_wire_bytes) next to the decompressed C(response_bytes)
+        - Can also be set by exporting NUTANIX_COMPRESSION
+        type: bool
+        default: True
+    api_stats:
+        description:
+        - Set value to C(True) to record every API request and return an aggregated C(api_stats) block
+        - C(api_stats) holds call counts, p50/p95/max latency, a latency histogram and byte totals per endpoint
+        - Can also be enabled by exporting NUTANIX_API_STATS=true
+        type: bool
+        default: False
+    cassette_path:
+        description:
+        - Path of a cassette file holding recorded API requests and responses, compressed if it ends with C(.gz)
+        - Only used when C(cassette_mode) is set
+        - Can also be set by exporting NUTANIX_CASSETTE_PATH
+        type: path
+    cassette_mode:
+        description:
+        - C(record) appends every API request and response of the run to C(cassette_path)
+        - Credentials and session cookies are not recorded
+        - C(replay) serves the responses from C(cassette_path) without contacting Prism Central
+        - Can also be set by exporting NUTANIX_CASSETTE_MODE
+        type: str
+        choices:
+        - record
+        - replay
+    cassette_time_scale:
+        description:
+        - Fraction of the recorded latency to wait before each replayed response
+        - C(1) replays the original timings, C(0.1) compresses them tenfold and C(0) replays without delay
+        - Can also be set by exporting NUTANIX_CASSETTE_TIME_SCALE
+        type: float
+        default: 0
+    profile:
+        description:
+        - Set value to C(True) to profile the module run with cProfile
+        - The report is returned as C(profile), holding the top functions by cumulative time and the base64 encoded pstats data
+        - Exporting NUTANIX_PROFILE=true also enables it and covers the whole module run including argument parsing
+        type: bool
+        default: False
+    profile_memory:
+        description:
+        - Set value to C(True) to add the peak memory and top allocation sites from tracemalloc to the profile
+        - Can also be enabled by exporting NUTANIX_PROFILE_MEMORY=true
+        type: bool
+        default: False
+    profile_path:
+        description:
+        - Directory to write the profile to instead of returning it, as a C(.pstats) file and a C(.txt) summary
+        - The written files are returned as C(profile_files)
+        - Can also be set by exporting NUTANIX_PROFILE_PATH
+        type: path
 author:
     - Balu George (@balugeorge)
 """
@@ -100,6 +198,7 @@ RETURN = r"""
 
 from ansible.module_utils.basic import AnsibleModule, env_fallback
 from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import NutanixApiClient, list_entities
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_profiler import run_profiled
 
 
 def set_list_payload(data):
@@ -141,6 +240,29 @@ def get_image_list():
         ),
         validate_certs=dict(type="bool", default=True, fallback=(
             env_fallback, ["VALIDATE_CERTS"])),
+        profile=dict(type="bool", default=False, fallback=(
+            env_fallback, ["NUTANIX_PROFILE"])),
+        profile_memory=dict(type="bool", default=False, fallback=(
+            env_fallback, ["NUTANIX_PROFILE_MEMORY"])),
+        profile_path=dict(type="path", fallback=(
+            env_fallback, ["NUTANIX_PROFILE_PATH"])),
+        cassette_path=dict(type="path", fallback=(
+            env_fallback, ["NUTANIX_CASSETTE_PATH"])),
+        cassette_mode=dict(type="str", choices=["record", "replay"], fallback=(
+            env_fallback, ["NUTANIX_CASSETTE_MODE"])),
+        cassette_time_scale=dict(type="float", default=0, fallback=(
+            env_fallback, ["NUTANIX_CASSETTE_TIME_SCALE"])),
+        api_stats=dict(type="bool", default=False, fallback=(
+            env_fallback, ["NUTANIX_API_STATS"])),
+        retries=dict(type="int", default=3),
+        retry_backoff=dict(type="float", default=1),
+        circuit_breaker_threshold=dict(type="int", default=5),
+        pool_maxsize=dict(type="int", default=10),
+        pool_block=dict(type="bool", default=False),
+        keep_alive=dict(type="bool", default=True),
+        compression=dict(type="bool", default=True, fallback=(
+            env_fallback, ["NUTANIX_COMPRESSION"])),
+        session_cache=dict(type="bool", default=True),
     )
 
     module = AnsibleModule(
@@ -172,7 +294,7 @@ def get_image_list():
         if image_name == entity["status"]["name"]:
             result["image"] = entity
             result["image_uuid"] = entity["metadata"]["uuid"]
-            module.exit_json(**result)
+            module.exit_json(**client.update_result(result))
         else:
             spec_list.append(entity["spec"])
             status_list.append(entity["status"])
@@ -187,7 +309,7 @@ def get_image_list():
         result["images"] = image_list
         result["meta_list"] = meta_list
 
-    module.exit_json(**result)
+    module.exit_json(**client.update_result(result))
 
 
 def main():
@@ -195,4 +317,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    run_profiled('nutanix_image_info', main)
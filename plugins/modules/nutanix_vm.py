@@ -107,6 +107,74 @@ options:
         - Set value to C(True) to skip vm creation and print the spec for verification.
         type: bool
         default: False
+    page_length:
+        description:
+        - Number of entities requested per page when looking up clusters, subnets, images and VMs by name.
+        type: int
+        default: 250
+    pagination:
+        description:
+        - C(offset) pages through list results by increasing offset.
+        - C(keyset) sorts them by uuid and asks for the uuids after the last one seen, so PC doesn't scan
+          the skipped entities again for every page and entities created or deleted meanwhile aren't skipped or repeated.
+        - Can also be set by exporting NUTANIX_PAGINATION.
+        type: str
+        choices:
+        - offset
+        - keyset
+        default: offset
+    pagination_splits:
+        description:
+        - Number of uuid ranges scanned in parallel with C(keyset) pagination.
+        type: int
+        default: 1
+    adaptive_paging:
+        description:
+        - Set value to C(True) to adapt the page length of list and groups calls to the measured pages.
+        - Starting from I(page_length), the length moves toward pages taking I(page_target_seconds),
+          within 20 to 500 entities and 4 MiB per page.
+        - The length is remembered per PC and entity kind under ~/.ansible/tmp/nutanix_page_lengths for later runs.
+        - Not used when C(cassette_mode) is set.
+        - Can also be enabled by exporting NUTANIX_ADAPTIVE_PAGING=true.
+        type: bool
+        default: False
+    page_target_seconds:
+        description:
+        - Seconds a page should take PC to answer with I(adaptive_paging).
+        type: float
+        default: 1
+    name_cache:
+        description:
+        - Cache cluster, subnet, image and storage container name to uuid lookups on the controller.
+        - The cache is shared by module runs against the same PC; set to C(False) to bypass it.
+        type: bool
+        default: True
+    name_cache_ttl:
+        description:
+        - Time in seconds after which cached name lookups expire.
+        type: int
+        default: 300
+    name_cache_path:
+        description:
+        - Path of the sqlite database used for the name cache.
+        type: path
+        default: ~/.ansible/tmp/nutanix_cache.db
+    invalidate_name_cache:
+        description:
+        - Set value to C(True) to drop all cached name lookups for this PC before running.
+        type: bool
+        default: False
+    task_poll_interval:
+        description:
+        - Initial interval in seconds between task status checks.
+        - The interval backs off with jitter up to C(task_poll_max_interval).
+        type: float
+        default: 0.5
+    task_poll_max_interval:
+        description:
+        - Maximum interval in seconds between task status checks.
+        type: float
+        default: 10
     disk_list:
         description:
         - Virtual Machine Disk list
@@ -397,6 +465,104 @@ options:
                 choices:
                 - FRESH
                 - PREPARED
+    session_cache:
+        description:
+        - Reuse the PC session cookie across requests and module runs instead of sending credentials with every call
+        - The cookie is cached under ~/.ansible/tmp/nutanix_sessions, readable by the current user only
+        type: bool
+        default: True
+    retries:
+        description:
+        - Number of times a request is retried after a connection error or a 429, 502, 503 or 504 response
+        - Only idempotent requests are retried after connection errors, 502 and 504 responses
+        type: int
+        default: 3
+    retry_backoff:
+        description:
+        - Base delay in seconds of the jittered exponential backoff between retries
+        - A C(Retry-After) header sent by PC takes precedence
+        type: float
+        default: 1
+    circuit_breaker_threshold:
+        description:
+        - Number of consecutive failed requests after which requests to the PC fail fast for 60 seconds
+        - The failure count is shared by module runs on the same controller, set to C(0) to disable
+        type: int
+        default: 5
+    pool_maxsize:
+        description:
+        - Maximum number of connections to the PC kept open for reuse
+        - Parallel list queries and bulk operations use up to this many connections at a time
+        type: int
+        default: 10
+    pool_block:
+        description:
+        - Set value to C(True) to make requests wait for a free connection once C(pool_maxsize) connections are in use
+        - By default extra connections are opened and closed after the request
+        type: bool
+        default: False
+    keep_alive:
+        description:
+        - Set value to C(False) to close the connection after every request instead of reusing it
+        type: bool
+        default: True
+    compression:
+        description:
+        - Set value to C(False) to ask PC for uncompressed responses instead of gzip compressed ones
+        - Compression shrinks list pages of full VM specs several fold, which saves time on slow links to remote PCs
+        - C(api_stats) reports the bytes received as C(response_wire_bytes) next to the decompressed C(response_bytes)
+        - Can also be set by exporting NUTANIX_COMPRESSION
+        type: bool
+        default: True
+    api_stats:
+        description:
+        - Set value to C(True) to record every API request and return an aggregated C(api_stats) block
+        - C(api_stats) holds call counts, p50/p95/max latency, a latency histogram and byte totals per endpoint
+        - Can also be enabled by exporting NUTANIX_API_STATS=true
+        type: bool
+        default: False
+    cassette_path:
+        description:
+        - Path of a cassette file holding recorded API requests and responses, compressed if it ends with C(.gz)
+        - Only used when C(cassette_mode) is set
+        - Can also be set by exporting NUTANIX_CASSETTE_PATH
+        type: path
+    cassette_mode:
+        description:
+        - C(record) appends every API request and response of the run to C(cassette_path)
+        - Credentials and session cookies are not recorded
+        - C(replay) serves the responses from C(cassette_path) without contacting Prism Central
+        - Can also be set by exporting NUTANIX_CASSETTE_MODE
+        type: str
+        choices:
+        - record
+        - replay
+    cassette_time_scale:
+        description:
+        - Fraction of the recorded latency to wait before each replayed response
+        - C(1) replays the original timings, C(0.1) compresses them tenfold and C(0) replays without delay
+        - Can also be set by exporting NUTANIX_CASSETTE_TIME_SCALE
+        type: float
+        default: 0
+    profile:
+        description:
+        - Set value to C(True) to profile the module run with cProfile
+        - The report is returned as C(profile), holding the top functions by cumulative time and the base64 encoded pstats data
+        - Exporting NUTANIX_PROFILE=true also enables it and covers the whole module run including argument parsing
+        type: bool
+        default: False
+    profile_memory:
+        description:
+        - Set value to C(True) to add the peak memory and top allocation sites from tracemalloc to the profile
+        - Can also be enabled by exporting NUTANIX_PROFILE_MEMORY=true
+        type: bool
+        default: False
+    profile_path:
+        description:
+        - Directory to write the profile to instead of returning it, as a C(.pstats) file and a C(.txt) summary
+        - The written files are returned as C(profile_files)
+        - Can also be set by exporting NUTANIX_PROFILE_PATH
+        type: path
 author:
     - Sarat Kumar (@kumarsarath588)
 '''
@@ -447,30 +613,31 @@ RETURN = r'''
 #TO-DO
 '''
 
-import json
-import time
+import copy
 import base64
 import os
 # import yaml  # TO-DO figure out yaml import
 from ansible.module_utils.basic import AnsibleModule, env_fallback
 from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import (
     NutanixApiClient,
-    get_cluster_uuid,
+    task_poll
+)
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_vms import (
     get_vm_uuid,
     get_vm,
     create_vm,
     update_vm,
     delete_vm,
     update_powerstate_vm,
-    get_subnet_uuid,
-    get_image_uuid,
-    get_cluster_storage_container_map,
+    resolve_names,
     is_uuid,
     set_payload_keys,
-    task_poll,
     has_changed,
     read_file
 )
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_name_cache import use_name_cache
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_page_tuner import use_adaptive_paging
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_profiler import run_profiled
 
 
 VM_PAYLOAD = {
@@ -577,6 +744,29 @@ def main():
         pc_port=dict(default="9440", type='str'),
         validate_certs=dict(type="bool", default=True, fallback=(
             env_fallback, ["VALIDATE_CERTS"])),
+        profile=dict(type='bool', default=False, fallback=(
+            env_fallback, ['NUTANIX_PROFILE'])),
+        profile_memory=dict(type='bool', default=False, fallback=(
+            env_fallback, ['NUTANIX_PROFILE_MEMORY'])),
+        profile_path=dict(type='path', fallback=(
+            env_fallback, ['NUTANIX_PROFILE_PATH'])),
+        cassette_path=dict(type='path', fallback=(
+            env_fallback, ['NUTANIX_CASSETTE_PATH'])),
+        cassette_mode=dict(type='str', choices=['record', 'replay'], fallback=(
+            env_fallback, ['NUTANIX_CASSETTE_MODE'])),
+        cassette_time_scale=dict(type='float', default=0, fallback=(
+            env_fallback, ['NUTANIX_CASSETTE_TIME_SCALE'])),
+        api_stats=dict(type='bool', default=False, fallback=(
+            env_fallback, ['NUTANIX_API_STATS'])),
+        retries=dict(type='int', default=3),
+        retry_backoff=dict(type='float', default=1),
+        circuit_breaker_threshold=dict(type='int', default=5),
+        pool_maxsize=dict(type='int', default=10),
+        pool_block=dict(type='bool', default=False),
+        keep_alive=dict(type='bool', default=True),
+        compression=dict(type='bool', default=True, fallback=(
+            env_fallback, ['NUTANIX_COMPRESSION'])),
+        session_cache=dict(type='bool', default=True),
         state=dict(
             default="present",
             type='str',
@@ -595,6 +785,19 @@ def main():
         cluster=dict(type='str', required=True),
         power_state=dict(type='str', default="ON", choices=["ON", "OFF"]),
         dry_run=dict(default=False, type='bool'),
+        page_length=dict(default=250, type='int'),
+        pagination=dict(default='offset', type='str', choices=['offset', 'keyset'], fallback=(
+            env_fallback, ['NUTANIX_PAGINATION'])),
+        pagination_splits=dict(default=1, type='int'),
+        adaptive_paging=dict(default=False, type='bool', fallback=(
+            env_fallback, ['NUTANIX_ADAPTIVE_PAGING'])),
+        page_target_seconds=dict(default=1, type='float'),
+        name_cache=dict(default=True, type='bool'),
+        name_cache_ttl=dict(default=300, type='int'),
+        name_cache_path=dict(default="~/.ansible/tmp/nutanix_cache.db", type='path'),
+        invalidate_name_cache=dict(default=False, type='bool'),
+        task_poll_interval=dict(default=0.5, type='float'),
+        task_poll_max_interval=dict(default=10, type='float'),
         disk_list=dict(
             type='list',
             required=True,
@@ -817,8 +1020,10 @@ def main():
 
     # Create api client
     client = NutanixApiClient(module)
+    use_name_cache(client)
+    use_adaptive_paging(client)
     result = entry_point(module, client)
-    module.exit_json(**result)
+    module.exit_json(**client.update_result(result))
 
 
 def entry_point(module, client):
@@ -855,12 +1060,14 @@ def create_vm_spec(params, vm_spec, client):
     nic_list = []
     disk_list = []
 
+    resolved_names = resolve_names(get_spec_reference_names(params), client)
+
     if is_uuid(params['cluster']):
         cluster_uuid = params['cluster']
         cluster_name = None
     else:
         cluster_name = params['cluster']
-        cluster_uuid = get_cluster_uuid(params['cluster'], client)
+        cluster_uuid = resolved_names["clusters"].get(params['cluster'])
         if cluster_uuid:
             cluster_uuid = cluster_uuid[0]
         else:
@@ -877,7 +1084,7 @@ def create_vm_spec(params, vm_spec, client):
                 nic_uuid = nic["subnet_reference"]["uuid"]
             elif nic["subnet_reference"]["name"]:
                 nic_name = nic["subnet_reference"]["name"]
-                nic_uuids = get_subnet_uuid(nic_name, client)
+                nic_uuids = resolved_names["subnets"].get(nic_name)
                 if nic_uuids:
                     nic_uuid = nic_uuids[0]
                 else:
@@ -916,7 +1123,7 @@ def create_vm_spec(params, vm_spec, client):
                     image_uuid = disk["data_source_reference"]["uuid"]
                 elif disk["data_source_reference"]["name"]:
                     image_name = disk["data_source_reference"]["name"]
-                    image_uuids = get_image_uuid(image_name, client)
+                    image_uuids = resolved_names["images"].get(image_name)
                     if image_uuids:
                         image_uuid = image_uuids[0]
                     else:
@@ -937,7 +1144,7 @@ def create_vm_spec(params, vm_spec, client):
                         sc_uuid = disk["storage_config"]["storage_container_reference"]["uuid"]
                     elif disk["storage_config"]["storage_container_reference"]["name"]:
                         sc_name = disk["storage_config"]["storage_container_reference"]["name"]
-                        cluster_sc_uuid_map = get_cluster_storage_container_map(sc_name, client)
+                        cluster_sc_uuid_map = resolved_names["storage_containers"].get(sc_name)
                         if cluster_sc_uuid_map:
                             try:
                                 sc_uuid = cluster_sc_uuid_map[cluster_uuid]
@@ -1050,6 +1257,36 @@ def create_vm_spec(params, vm_spec, client):
     return vm_spec, None
 
 
+def get_spec_reference_names(params):
+    """
+    This routine helps to collect all entity names referenced by the vm params
+    Args:
+        params(obj): Ansible params object
+    Returns:
+        names(dict): map of kind : list of names to resolve
+    """
+    names = {"clusters": [], "subnets": [], "images": [], "storage_containers": []}
+
+    if not is_uuid(params['cluster']):
+        names["clusters"].append(params['cluster'])
+
+    for nic in params['nic_list'] or []:
+        subnet_reference = nic.get("subnet_reference")
+        if subnet_reference and not subnet_reference["uuid"] and subnet_reference["name"]:
+            names["subnets"].append(subnet_reference["name"])
+
+    for disk in params['disk_list'] or []:
+        data_source_reference = disk.get("data_source_reference")
+        if data_source_reference and not data_source_reference["uuid"] and data_source_reference["name"]:
+            names["images"].append(data_source_reference["name"])
+
+        sc_reference = (disk.get("storage_config") or {}).get("storage_container_reference")
+        if sc_reference and not sc_reference["uuid"] and sc_reference["name"]:
+            names["storage_containers"].append(sc_reference["name"])
+
+    return names
+
+
 def update_vm_spec(params, current_vm_payload, client):
     """
     This routine helps to generate update spec of vm
@@ -1167,7 +1404,7 @@ def _create(params, client):
         result["vm_uuid"] = vm_uuid_list
         return result
     elif len(vm_uuid_list) >= 1 or vm_uuid:
-        return _update(params, client, vm_uuid=vm_uuid)
+        return _update(params, client, vm_uuid=vm_uuid or vm_uuid_list[0])
 
     # Create VM Spec
     vm_payload, error = create_vm_spec(params, VM_PAYLOAD, client)
@@ -1189,6 +1426,9 @@ def _create(params, client):
 
     task_status = task_poll(task_uuid, client)
     if task_status:
+        # Drop cached references in case the failure was caused by a stale uuid
+        if client.name_cache:
+            client.name_cache.invalidate()
         result["failed"] = True
         result["msg"] = task_status
         return result
@@ -1196,7 +1436,8 @@ def _create(params, client):
     retries = 0
     while check_for_ip:
         response = client.request(api_endpoint="v3/vms/%s" % vm_uuid, method="GET", data=None)
-        json_content = json.loads(response.content)
+        client.add_stats(client.poll_stats, ip_polls=1)
+        json_content = response.json()
         result["vm_status"] = json_content["status"]
         result["vm_ip_address"] = ""
         if len(json_content["status"]["resources"]["nic_list"]) > 0:
@@ -1204,7 +1445,8 @@ def _create(params, client):
                 if json_content["status"]["resources"]["nic_list"][0]["ip_endpoint_list"][0]["ip"] != "":
                     result["vm_ip_address"] = json_content["status"]["resources"]["nic_list"][0]["ip_endpoint_list"][0]["ip"]
                     break
-        time.sleep(ip_poll_interval)
+        client.add_stats(client.poll_stats, ip_wait_seconds=ip_poll_interval)
+        client.clock.sleep(ip_poll_interval, "ip_wait")
         retries = (retries + 1)
         if retries > ip_poll_max_retries:
             break
@@ -1259,6 +1501,9 @@ def _update(params, client, vm_uuid=None):
     if "status" in current_vm_payload:
         del current_vm_payload["status"]
 
+    # update_vm_spec changes the current spec in place, keep a copy for the power off
+    power_off_payload = copy.deepcopy(current_vm_payload) if need_restart else None
+
     # Update VM spec
     updated_vm_payload, error = update_vm_spec(params, current_vm_payload, client)
     if error:
@@ -1280,7 +1525,7 @@ def _update(params, client, vm_uuid=None):
         mechanism = "HARD"
         power_state = "OFF"
 
-        task_uuid = update_powerstate_vm(vm_uuid, client, mechanism, power_state)
+        task_uuid = update_powerstate_vm(vm_uuid, client, mechanism, power_state, vm_payload=power_off_payload)
         task_status = task_poll(task_uuid, client)
         if task_status:
             result["failed"] = True
@@ -1296,6 +1541,8 @@ def _update(params, client, vm_uuid=None):
 
     task_status = task_poll(task_uuid, client)
     if task_status:
+        if client.name_cache:
+            client.name_cache.invalidate()
         result["failed"] = True
         result["msg"] = task_status
         return result
@@ -1462,4 +1709,4 @@ def _poweroff(params, client):
 
 
 if __name__ == '__main__':
-    main()
+    run_profiled('nutanix_vm', main)
@@ -87,6 +87,148 @@ options:
                 - ASCENDING
                 - DESCENDING
 
+    session_cache:
+        description:
+        - Reuse the PC session cookie across requests and module runs instead of sending credentials with every call
+        - The cookie is cached under ~/.ansible/tmp/nutanix_sessions, readable by the current user only
+        type: bool
+        default: True
+    retries:
+        description:
+        - Number of times a request is retried after a connection error or a 429, 502, 503 or 504 response
+        - Only idempotent requests are retried after connection errors, 502 and 504 responses
+        type: int
+        default: 3
+    retry_backoff:
+        description:
+        - Base delay in seconds of the jittered exponential backoff between retries
+        - A C(Retry-After) header sent by PC takes precedence
+        type: float
+        default: 1
+    circuit_breaker_threshold:
+        description:
+        - Number of consecutive failed requests after which requests to the PC fail fast for 60 seconds
+        - The failure count is shared by module runs on the same controller, set to C(0) to disable
+        type: int
+        default: 5
+    pool_maxsize:
+        description:
+        - Maximum number of connections to the PC kept open for reuse
+        - Parallel list queries and bulk operations use up to this many connections at a time
+        type: int
+        default: 10
+    pool_block:
+        description:
+        - Set value to C(True) to make requests wait for a free connection once C(pool_maxsize) connections are in use
+        - By default extra connections are opened and closed after the request
+        type: bool
+        default: False
+    keep_alive:
+        description:
+        - Set value to C(False) to close the connection after every request instead of reusing it
+        type: bool
+        default: True
+    compression:
+        description:
+        - Set value to C(False) to ask PC for uncompressed responses instead of gzip compressed ones
+        - Compression shrinks list pages of full VM specs several fold, which saves time on slow links to remote PCs
+        - C(api_stats) reports the bytes received as C(response_wire_bytes) next to the decompressed C(response_bytes)
+        - Can also be set by exporting NUTANIX_COMPRESSION
+        type: bool
+        default: True
+    api_engine:
+        description:
+        - C(requests) pages through the VMs with up to 4 list requests in flight
+        - C(asyncio) requests all remaining pages at once after the first one, with up to C(pool_maxsize) requests in flight on an asyncio event loop
+        - C(asyncio) requires the aiohttp package, C(requests) is used when C(cassette_mode) is set
+        - Can also be set by exporting NUTANIX_API_ENGINE
+        type: str
+        choices:
+        - requests
+        - asyncio
+        default: requests
+    pagination:
+        description:
+        - C(offset) pages through the VMs by increasing offset
+        - C(keyset) sorts them by uuid and asks for the uuids after the last one seen, so PC doesn't scan
+          the skipped VMs again for every page and VMs created or deleted meanwhile aren't skipped or repeated
+        - C(keyset) is used by the C(requests) engine when I(data) sets neither offset nor sort_attribute
+        - Can also be set by exporting NUTANIX_PAGINATION
+        type: str
+        choices:
+        - offset
+        - keyset
+        default: offset
+    pagination_splits:
+        description:
+        - Number of uuid ranges scanned in parallel with C(keyset) pagination
+        - VMs are then returned as their pages complete instead of in uuid order
+        type: int
+        default: 1
+    adaptive_paging:
+        description:
+        - Set value to C(True) to adapt the page length to the measured pages
+        - Starting from the I(data) length, the length moves toward pages taking I(page_target_seconds),
+          within 20 to 500 VMs and 4 MiB per page
+        - The length is remembered per PC under ~/.ansible/tmp/nutanix_page_lengths for later runs
+        - Used by the C(requests) engine, not when C(cassette_mode) is set
+        - Can also be enabled by exporting NUTANIX_ADAPTIVE_PAGING=true
+        type: bool
+        default: False
+    page_target_seconds:
+        description:
+        - Seconds a page should take PC to answer with I(adaptive_paging)
+        type: float
+        default: 1
+    api_stats:
+        description:
+        - Set value to C(True) to record every API request and return an aggregated C(api_stats) block
+        - C(api_stats) holds call counts, p50/p95/max latency, a latency histogram and byte totals per endpoint
+        - Can also be enabled by exporting NUTANIX_API_STATS=true
+        type: bool
+        default: False
+    cassette_path:
+        description:
+        - Path of a cassette file holding recorded API requests and responses, compressed if it ends with C(.gz)
+        - Only used when C(cassette_mode) is set
+        - Can also be set by exporting NUTANIX_CASSETTE_PATH
+        type: path
+    cassette_mode:
+        description:
+        - C(record) appends every API request and response of the run to C(cassette_path)
+        - Credentials and session cookies are not recorded
+        - C(replay) serves the responses from C(cassette_path) without contacting Prism Central
+        - Can also be set by exporting NUTANIX_CASSETTE_MODE
+        type: str
+        choices:
+        - record
+        - replay
+    cassette_time_scale:
+        description:
+        - Fraction of the recorded latency to wait before each replayed response
+        - C(1) replays the original timings, C(0.1) compresses them tenfold and C(0) replays without delay
+        - Can also be set by exporting NUTANIX_CASSETTE_TIME_SCALE
+        type: float
+        default: 0
+    profile:
+        description:
+        - Set value to C(True) to profile the module run with cProfile
+        - The report is returned as C(profile), holding the top functions by cumulative time and the base64 encoded pstats data
+        - Exporting NUTANIX_PROFILE=true also enables it and covers the whole module run including argument parsing
+        type: bool
+        default: False
+    profile_memory:
+        description:
+        - Set value to C(True) to add the peak memory and top allocation sites from tracemalloc to the profile
+        - Can also be enabled by exporting NUTANIX_PROFILE_MEMORY=true
+        type: bool
+        default: False
+    profile_path:
+        description:
+        - Directory to write the profile to instead of returning it, as a C(.pstats) file and a C(.txt) summary
+        - The written files are returned as C(profile_files)
+        - Can also be set by exporting NUTANIX_PROFILE_PATH
+        type: path
 author:
     - Balu George (@balugeorge)
 '''
@@ -116,8 +258,10 @@ from ansible.module_utils.basic import env_fallback
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_api_client import (
     NutanixApiClient,
-    list_entities
+    iter_entities
 )
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_page_tuner import use_adaptive_paging
+from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_profiler import run_profiled
 
 
 def set_list_payload(data):
@@ -176,6 +320,37 @@ def get_vm_list():
         ),
         validate_certs=dict(type="bool", default=True, fallback=(
             env_fallback, ["VALIDATE_CERTS"])),
+        profile=dict(type='bool', default=False, fallback=(
+            env_fallback, ['NUTANIX_PROFILE'])),
+        profile_memory=dict(type='bool', default=False, fallback=(
+            env_fallback, ['NUTANIX_PROFILE_MEMORY'])),
+        profile_path=dict(type='path', fallback=(
+            env_fallback, ['NUTANIX_PROFILE_PATH'])),
+        cassette_path=dict(type='path', fallback=(
+            env_fallback, ['NUTANIX_CASSETTE_PATH'])),
+        cassette_mode=dict(type='str', choices=['record', 'replay'], fallback=(
+            env_fallback, ['NUTANIX_CASSETTE_MODE'])),
+        cassette_time_scale=dict(type='float', default=0, fallback=(
+            env_fallback, ['NUTANIX_CASSETTE_TIME_SCALE'])),
+        api_stats=dict(type='bool', default=False, fallback=(
+            env_fallback, ['NUTANIX_API_STATS'])),
+        retries=dict(type='int', default=3),
+        retry_backoff=dict(type='float', default=1),
+        circuit_breaker_threshold=dict(type='int', default=5),
+        pool_maxsize=dict(type='int', default=10),
+        pool_block=dict(type='bool', default=False),
+        keep_alive=dict(type='bool', default=True),
+        compression=dict(type='bool', default=True, fallback=(
+            env_fallback, ['NUTANIX_COMPRESSION'])),
+        api_engine=dict(type='str', default='requests', choices=['requests', 'asyncio'], fallback=(
+            env_fallback, ['NUTANIX_API_ENGINE'])),
+        pagination=dict(type='str', default='offset', choices=['offset', 'keyset'], fallback=(
+            env_fallback, ['NUTANIX_PAGINATION'])),
+        pagination_splits=dict(type='int', default=1),
+        adaptive_paging=dict(type='bool', default=False, fallback=(
+            env_fallback, ['NUTANIX_ADAPTIVE_PAGING'])),
+        page_target_seconds=dict(type='float', default=1),
+        session_cache=dict(type='bool', default=True),
     )
 
     module = AnsibleModule(
@@ -199,29 +374,31 @@ def get_vm_list():
 
     # Create api client
     client = NutanixApiClient(module)
+    use_adaptive_paging(client)
 
     # List VMs
     vm_name = module.params.get("vm_name")
     spec_list, status_list, vm_name_list, meta_list = [], [], [], []
     data = set_list_payload(module.params['data'])
     result["data"] = data
-    length = data["length"]
-    offset = data["offset"]
-    total_matches = 99999
     if vm_name:
         data["filter"] = "vm_name=={0}".format(vm_name)
 
-    while offset < total_matches:
-        data["offset"] = offset
-        vms_list = list_entities('vms', data, client)
-        for entity in vms_list["entities"]:
-            spec_list.append(entity["spec"])
-            status_list.append(entity["status"])
-            vm_name_list.append(entity["status"]["name"])
-            meta_list.append(entity["metadata"])
+    if module.params.get("api_engine") == "asyncio" and not client.cassette_mode:
+        # Imported on first use, asyncio and aiohttp would slow down every module start
+        from ansible_collections.nutanix.nutanix.plugins.module_utils.nutanix_async import (
+            NutanixAsyncClient,
+            run_async
+        )
+        entities = run_async(client, NutanixAsyncClient.list_all_entities, 'vms', data)
+    else:
+        entities = iter_entities('vms', data, client)
 
-        total_matches = vms_list["metadata"]["total_matches"]
-        offset += length
+    for entity in entities:
+        spec_list.append(entity["spec"])
+        status_list.append(entity["status"])
+        vm_name_list.append(entity["status"]["name"])
+        meta_list.append(entity["metadata"])
 
     if spec_list:
         result["vms_spec"] = spec_list
@@ -231,7 +408,7 @@ def get_vm_list():
     else:
         module.fail_json("Could not find VM: {0}".format(vm_name))
 
-    module.exit_json(**result)
+    module.exit_json(**client.update_result(result))
 
 
 def main():
@@ -239,4 +416,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    run_profiled('nutanix_vm_info', main)